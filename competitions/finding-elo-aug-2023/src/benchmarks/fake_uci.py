@@ -0,0 +1,82 @@
+"""
+A tiny UCI engine for trying out the engine features without a real engine.
+
+It searches nothing: every position is scored by material from the side to
+move's point of view, and the first legal move is returned as the best one.
+The scores are deterministic, so runs can be compared. The `Sleep` option
+makes each search take that many milliseconds, like a slow or stuck engine.
+
+Usage, from the competition directory:
+
+    pool = EnginePool([sys.executable, "-m", "src.benchmarks.fake_uci"], n_engines=2)
+"""
+
+import sys
+import time
+
+import chess
+
+PIECE_VALUES = {
+    chess.PAWN: 100,
+    chess.KNIGHT: 300,
+    chess.BISHOP: 300,
+    chess.ROOK: 500,
+    chess.QUEEN: 900,
+    chess.KING: 0,
+}
+
+
+def material(board: chess.Board) -> int:
+    """
+    Scores a position by material, from the side to move's point of view.
+    """
+    return sum(
+        PIECE_VALUES[piece.piece_type] * (1 if piece.color == board.turn else -1)
+        for piece in board.piece_map().values()
+    )
+
+
+def parse_position(args: list) -> chess.Board:
+    """
+    Builds the board of a `position [startpos | fen <fen>] [moves ...]` command.
+    """
+    if args[0] == "startpos":
+        board, rest = chess.Board(), args[1:]
+    else:
+        board, rest = chess.Board(" ".join(args[1:7])), args[7:]
+    if rest and rest[0] == "moves":
+        for uci in rest[1:]:
+            board.push_uci(uci)
+    return board
+
+
+def main() -> None:
+    board = chess.Board()
+    sleep = 0
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        command, *args = line.split()
+        if command == "uci":
+            print("id name FakeUCI")
+            print("option name Sleep type spin default 0 min 0 max 600000")
+            print("uciok")
+        elif command == "isready":
+            print("readyok")
+        elif command == "setoption" and args[:2] == ["name", "Sleep"]:
+            sleep = int(args[3])
+        elif command == "position":
+            board = parse_position(args)
+        elif command == "go":
+            time.sleep(sleep / 1000)
+            moves = list(board.legal_moves)
+            best = moves[0].uci() if moves else "0000"
+            print(f"info depth 1 score cp {material(board)} nodes 1 pv {best}")
+            print(f"bestmove {best}")
+        elif command == "quit":
+            break
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Throughput benchmarks for the feature pipeline.
+
+Each benchmark runs in a fresh process on the same synthetic PGN, and reports
+games per second and the peak resident memory of that process. The opening
+features run against a stubbed explorer, so no request leaves the machine,
+and the evaluation features against the fake engine in `fake_uci`.
+
+Usage, from the competition directory:
+
+    python -m src.benchmarks.run --games 1000 --output reports/benchmarks.json
+    python -m src.benchmarks.run --baseline reports/benchmarks.json
+
+With `--baseline`, the run fails if any benchmark is slower than the
+baseline by more than `--tolerance`.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+from unittest import mock
+
+import chess
+import pandas as pd
+from chess.pgn import Game, read_game
+from src.data.synthetic import write_synthetic_pgn
+from src.features import game as game_features
+from src.features.engine_pool import EnginePool
+from src.features.evaluation import get_evaluation_features
+from src.features.main import pgn_to_dataframe
+from src.features.middlegame import identify_middlegame
+from src.features.opening import get_opening_features
+from src.features.players import get_player_ratings
+
+# The stubbed explorer knows every position up to this full move number.
+STUB_BOOK_MOVES = 8
+
+# Stands in for a real UCI engine, so the benchmark measures the pool itself.
+FAKE_ENGINE = [sys.executable, "-m", "src.benchmarks.fake_uci"]
+
+
+def stub_opening_name(fen, database="lichess", until="2012", sleep_time=5, cache=None):
+    """
+    Stands in for `get_opening_name`: answers instantly, and deterministically,
+    with a known position for the first `STUB_BOOK_MOVES` moves.
+    """
+    board = chess.Board(fen)
+    if board.fullmove_number > STUB_BOOK_MOVES:
+        return None, {"moves": []}
+    name = f"Stub Opening {board.fullmove_number}"
+    return name, {"opening": {"name": name}, "moves": [{"uci": "0000"}]}
+
+
+def stubbed_explorer():
+    return mock.patch("src.features.opening.get_opening_name", stub_opening_name)
+
+
+def per_game(extractor: Callable[[Game], object]) -> Callable[[List[Game], str], int]:
+    def run(games: List[Game], pgn_file: str) -> int:
+        for game in games:
+            extractor(game)
+        return len(games)
+
+    return run
+
+
+def run_opening_features(games: List[Game], pgn_file: str) -> int:
+    with stubbed_explorer():
+        for game in games:
+            get_opening_features(game)
+    return len(games)
+
+
+def run_evaluation_features(games: List[Game], pgn_file: str) -> int:
+    with EnginePool(FAKE_ENGINE, depth=1) as engine_pool:
+        for game in games:
+            get_evaluation_features(game, engine_pool)
+    return len(games)
+
+
+def run_pgn_to_dataframe(
+    include_opening_cols: bool,
+) -> Callable[[List[Game], str], int]:
+    def run(games: List[Game], pgn_file: str) -> int:
+        with stubbed_explorer():
+            df = pgn_to_dataframe(
+                pgn_file, include_opening_cols=include_opening_cols, save_to_file=False
+            )
+        return len(df)
+
+    return run
+
+
+# Benchmarks on pre-parsed games measure the extractor alone; the
+# pgn_to_dataframe ones include parsing.
+BENCHMARKS: Dict[str, Callable[[List[Game], str], int]] = {
+    "get_game_info": per_game(game_features.get_game_info),
+    "get_piece_moves": per_game(game_features.get_piece_moves),
+    "get_checks": per_game(game_features.get_checks),
+    "get_captures": per_game(game_features.get_captures),
+    "get_promotions": per_game(game_features.get_promotions),
+    "get_castling": per_game(game_features.get_castling),
+    "get_game_features": per_game(game_features.get_game_features),
+    "identify_middlegame": per_game(identify_middlegame),
+    "get_player_ratings": per_game(get_player_ratings),
+    "get_opening_features": run_opening_features,
+    "get_evaluation_features": run_evaluation_features,
+    "pgn_to_dataframe": run_pgn_to_dataframe(include_opening_cols=False),
+    "pgn_to_dataframe_openings": run_pgn_to_dataframe(include_opening_cols=True),
+}
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def run_benchmark(name: str, pgn_file: str) -> Dict[str, float]:
+    """
+    Runs a single benchmark in the current process.
+
+    :param name: The name of the benchmark in `BENCHMARKS`.
+    :param pgn_file: The PGN file to benchmark on.
+    :return: The number of games, elapsed seconds, games per second and peak
+    RSS in MB.
+    """
+    games = []
+    if not name.startswith("pgn_to_dataframe"):
+        with open(pgn_file) as pgn:
+            games = list(iter(lambda: read_game(pgn), None))
+
+    start = time.perf_counter()
+    n_games = BENCHMARKS[name](games, pgn_file)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "benchmark": name,
+        "games": n_games,
+        "seconds": round(elapsed, 3),
+        "games_per_sec": round(n_games / elapsed, 1) if elapsed else float("inf"),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def run_benchmarks(pgn_file: str, names: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Runs benchmarks, each in a fresh process so their peak RSS is their own.
+
+    :param pgn_file: The PGN file to benchmark on.
+    :param names: The benchmarks to run. Default is all of them.
+    :return: One row per benchmark.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for name in names or BENCHMARKS:
+        with context.Pool(1) as pool:
+            results.append(pool.apply(run_benchmark, (name, pgn_file)))
+        print(results[-1])
+    return pd.DataFrame(results)
+
+
+def find_regressions(
+    results: pd.DataFrame, baseline: pd.DataFrame, tolerance: float
+) -> pd.DataFrame:
+    """
+    Compares throughput with a previous run.
+
+    :param results: The current results.
+    :param baseline: The results to compare with.
+    :param tolerance: The accepted slowdown, e.g. 0.2 for 20%.
+    :return: The benchmarks slower than the baseline beyond the tolerance.
+    """
+    merged = results.merge(baseline, on="benchmark", suffixes=("", "_baseline"))
+    merged["change"] = merged["games_per_sec"] / merged["games_per_sec_baseline"] - 1
+    return merged[merged["change"] < -tolerance][
+        ["benchmark", "games_per_sec_baseline", "games_per_sec", "change"]
+    ]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--games", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pgn", help="Benchmark an existing PGN file instead.")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS))
+    parser.add_argument("--output", help="Write the results to a JSON file.")
+    parser.add_argument("--baseline", help="Results JSON to compare with.")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        pgn_file = args.pgn or write_synthetic_pgn(
+            os.path.join(workdir, "synthetic.pgn"), args.games, seed=args.seed
+        )
+        results = run_benchmarks(pgn_file, args.only)
+
+    print(results.to_string(index=False))
+    if args.output:
+        results.to_json(args.output, orient="records", indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = pd.DataFrame(json.load(file))
+        regressions = find_regressions(results, baseline, args.tolerance)
+        if not regressions.empty:
+            print("Regressions:")
+            print(regressions.to_string(index=False))
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
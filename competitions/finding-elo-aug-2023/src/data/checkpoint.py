@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+CHECKPOINT_SUFFIX = ".ckpt.json"
+
+
+def write_checkpoint(
+    save_location: str,
+    pgn_file: str,
+    games_processed: int,
+    pgn_offset: int,
+    output_size: int,
+    last_game_offset: int = 0,
+) -> None:
+    """
+    Records how far a PGN has been processed into an output file.
+
+    The manifest is written to a temporary file and renamed over the previous
+    one, so a crash leaves either the old or the new checkpoint, never a
+    partial one. It is meant to be written right after each flush.
+
+    Besides the size and modification time of the PGN, it holds a watermark:
+    a hash of the bytes of the last processed game, which `read_checkpoint`
+    uses to accept a PGN that was appended to since.
+
+    :param save_location: The location of the output file.
+    :param pgn_file: The file path of the PGN file being processed.
+    :param games_processed: The number of games saved to the output so far.
+    :param pgn_offset: The byte offset in the PGN where the next game starts.
+    :param output_size: The position of the output after the flush, as
+    reported by its sink.
+    :param last_game_offset: The byte offset in the PGN where the last
+    processed game starts. Default is 0, which hashes every processed byte.
+    """
+    pgn_stat = os.stat(pgn_file)
+    checkpoint = {
+        "pgn_file": os.path.abspath(pgn_file),
+        "pgn_size": pgn_stat.st_size,
+        "pgn_mtime_ns": pgn_stat.st_mtime_ns,
+        "games_processed": games_processed,
+        "pgn_offset": pgn_offset,
+        "output_size": output_size,
+        "last_game_offset": last_game_offset,
+        "last_game_hash": hash_bytes(pgn_file, last_game_offset, pgn_offset),
+    }
+
+    checkpoint_file = save_location + CHECKPOINT_SUFFIX
+    temp_file = checkpoint_file + ".tmp"
+    with open(temp_file, "w") as file:
+        json.dump(checkpoint, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_file, checkpoint_file)
+
+
+def read_checkpoint(
+    save_location: str, pgn_file: str, appended: bool = False
+) -> Optional[Dict[str, int]]:
+    """
+    Reads the checkpoint of an output file if it belongs to the given PGN.
+
+    :param save_location: The location of the output file.
+    :param pgn_file: The file path of the PGN file being processed.
+    :param appended: Whether to accept a PGN that was modified since, as long
+    as it was only appended to, see `is_appended`.
+    :return: The checkpoint, or None if it is missing, unreadable, or was
+    written for a different or modified PGN file.
+    """
+    checkpoint_file = save_location + CHECKPOINT_SUFFIX
+    if not os.path.exists(checkpoint_file):
+        return None
+
+    try:
+        with open(checkpoint_file) as file:
+            checkpoint = json.load(file)
+    except (OSError, ValueError) as e:
+        print(f"Error reading checkpoint: {e}")
+        return None
+
+    pgn_stat = os.stat(pgn_file)
+    if checkpoint.get("pgn_file") != os.path.abspath(pgn_file):
+        return None
+    if (
+        checkpoint.get("pgn_size") == pgn_stat.st_size
+        and checkpoint.get("pgn_mtime_ns") == pgn_stat.st_mtime_ns
+    ):
+        return checkpoint
+    if appended and is_appended(pgn_file, checkpoint):
+        return checkpoint
+    return None
+
+
+def is_appended(pgn_file: str, checkpoint: Dict[str, int]) -> bool:
+    """
+    Checks that a PGN was only appended to since a checkpoint was written.
+
+    The last processed game must still hash the same and be followed by the
+    start of a new game, or nothing. Earlier games are not read, so a file
+    rewritten before its last processed game goes unnoticed: the check is
+    meant to catch truncated files and whole dumps written over the old one.
+
+    :param pgn_file: The file path of the PGN file.
+    :param checkpoint: A checkpoint read from its output.
+    :return: Whether new games can be processed from the checkpoint on.
+    """
+    if "last_game_hash" not in checkpoint:
+        return False
+
+    start, end = checkpoint["last_game_offset"], checkpoint["pgn_offset"]
+    if os.path.getsize(pgn_file) < end:
+        return False
+    if hash_bytes(pgn_file, start, end) != checkpoint["last_game_hash"]:
+        return False
+
+    # Anything else means the last game was cut short when it was processed.
+    with open(pgn_file, "rb") as pgn:
+        pgn.seek(end)
+        following = pgn.read(1024).lstrip()
+    return not following or following.startswith(b"[")
+
+
+def hash_bytes(pgn_file: str, start: int, end: int) -> str:
+    """
+    Hashes a byte range of a file.
+
+    :param pgn_file: The file path of the PGN file.
+    :param start: The first byte of the range.
+    :param end: The byte after the last one.
+    :return: The hex digest.
+    """
+    with open(pgn_file, "rb") as pgn:
+        pgn.seek(start)
+        return hashlib.blake2b(pgn.read(end - start), digest_size=16).hexdigest()
@@ -0,0 +1,176 @@
+import bz2
+import gzip
+import queue
+import threading
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+GAME_START = b"\n[Event "
+COMPRESSED_SUFFIXES = (".gz", ".bz2", ".zst")
+
+
+def is_compressed(pgn_file: str) -> bool:
+    """
+    Whether a PGN file is compressed, judging by its extension.
+    """
+    return pgn_file.endswith(COMPRESSED_SUFFIXES)
+
+
+def open_decompressed(raw: BinaryIO, pgn_file: str) -> BinaryIO:
+    """
+    Wraps a compressed file opened in binary mode with a decompressing reader.
+
+    :param raw: The compressed file.
+    :param pgn_file: The file path, whose extension picks the codec.
+    :return: A binary file-like object with the decompressed content.
+    """
+    if pgn_file.endswith(".gz"):
+        return gzip.GzipFile(fileobj=raw)
+    if pgn_file.endswith(".bz2"):
+        return bz2.BZ2File(raw)
+    if pgn_file.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstandard is required for .zst input") from None
+        # Lichess database dumps are compressed with a long window.
+        return zstandard.ZstdDecompressor(max_window_size=2**31).stream_reader(
+            raw, read_across_frames=True
+        )
+    raise ValueError(f"Unsupported compression: {pgn_file}")
+
+
+class CompressedPgnReader:
+    """
+    Decompresses a PGN file in a background thread, in chunks of whole games.
+
+    The thread reads the compressed file, decompresses it, and cuts the text
+    at the last game start of every chunk, so each item holds complete games
+    only. Items go through a bounded queue: decompression runs ahead of
+    parsing (the codecs release the GIL) by at most `max_chunks` chunks.
+
+    `position` is the number of compressed bytes behind the chunks handed out
+    so far, for progress reporting without a counting pass. Games start at
+    lines beginning with `[Event `, as in `PgnIndex`.
+
+    :param pgn_file: The file path of the compressed PGN file.
+    :param skip_games: The number of games to skip at the start, e.g. when
+    resuming. Skipped games are decompressed but not returned.
+    :param chunk_size: The number of decompressed bytes read at a time.
+    :param max_chunks: The maximum number of chunks waiting to be parsed.
+    """
+
+    def __init__(
+        self,
+        pgn_file: str,
+        skip_games: int = 0,
+        chunk_size: int = 1 << 20,
+        max_chunks: int = 16,
+    ):
+        self.pgn_file = pgn_file
+        self.skip_games = skip_games
+        self.chunk_size = chunk_size
+        self.position = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_chunks)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __iter__(self) -> Iterator[str]:
+        """
+        Yields the text of consecutive complete games, a chunk at a time.
+        """
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                text, self.position = item
+                yield text
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """
+        Stops the reader thread, e.g. when the consumer stops early.
+        """
+        self._stop.set()
+        while self._thread is not None and self._thread.is_alive():
+            try:
+                self._queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _read(self) -> None:
+        try:
+            with open(self.pgn_file, "rb") as raw:
+                with open_decompressed(raw, self.pgn_file) as stream:
+                    for text in self._chunks(stream, raw):
+                        if not self._put(text):
+                            return
+            self._put(None)
+        except Exception as e:
+            self._put(e)
+
+    def _chunks(self, stream: BinaryIO, raw: BinaryIO) -> Iterator[Tuple[str, int]]:
+        to_skip = self.skip_games
+        buffer = b""
+
+        while True:
+            chunk = stream.read(self.chunk_size)
+            buffer += chunk
+            if chunk:
+                # Keep the last, possibly incomplete, game for the next chunk.
+                cut = buffer.rfind(GAME_START) + 1
+                if cut <= 0:
+                    continue
+            else:
+                cut = len(buffer)
+            games, buffer = buffer[:cut], buffer[cut:]
+
+            if to_skip:
+                games, to_skip = skip_games(games, to_skip)
+            if games.strip():
+                yield games.decode("utf-8", errors="replace"), raw.tell()
+            if not chunk:
+                return
+
+
+def skip_games(games: bytes, n_games: int) -> Tuple[bytes, int]:
+    """
+    Drops up to `n_games` games from the start of a chunk of whole games.
+
+    :return: The rest of the chunk, and the number of games still to skip.
+    """
+    # The first game of a chunk starts without a preceding newline.
+    data = b"\n" + games
+    position = data.find(GAME_START)
+    while n_games and position != -1:
+        n_games -= 1
+        position = data.find(GAME_START, position + 1)
+    return (b"" if position == -1 else games[position:]), n_games
+
+
+def count_games_compressed(pgn_file: str) -> int:
+    """
+    Counts the games of a compressed PGN file by streaming through it.
+    """
+    games = 0
+    tail = b"\n"
+    with open(pgn_file, "rb") as raw, open_decompressed(raw, pgn_file) as stream:
+        while chunk := stream.read(1 << 20):
+            data = tail + chunk
+            games += data.count(GAME_START)
+            tail = data[-len(GAME_START) + 1 :]
+    return games
@@ -0,0 +1,240 @@
+import json
+import logging
+import os
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+import chess
+import numpy as np
+from chess.pgn import SKIP, BaseVisitor, Game, Headers, SkipType, read_game
+from src.data.pgn_index import PgnIndex
+from tqdm import tqdm
+
+LOGGER = logging.getLogger("chess.pgn")
+
+# The seven tag roster, the ratings, and the starting position of games that
+# don't start from the standard one.
+DEFAULT_TAGS = (
+    "Event",
+    "Site",
+    "Date",
+    "Round",
+    "White",
+    "Black",
+    "Result",
+    "WhiteElo",
+    "BlackElo",
+    "FEN",
+)
+
+MOVES_FILE = "moves.npy"
+OFFSETS_FILE = "offsets.npy"
+META_FILE = "meta.json"
+HEADER_PREFIX = "header_"
+
+
+def encode_move(move: chess.Move) -> int:
+    """
+    Packs a move into a 16-bit code: the from square in bits 0-5, the to square
+    in bits 6-11 and the promotion piece type (0 for none) in bits 12-14.
+    """
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+
+def decode_move(code: int) -> chess.Move:
+    """
+    Unpacks a move packed by `encode_move`.
+    """
+    return chess.Move(code & 63, code >> 6 & 63, code >> 12 or None)
+
+
+class GameView:
+    """
+    Read-only view of a game in a `MoveStore`.
+
+    Provides the `headers`, `board()` and `mainline_moves()` that the feature
+    extractors use from a `chess.pgn.Game`, decoding them from the store on
+    demand. No move tree is built.
+    """
+
+    __slots__ = ("store", "game_idx")
+
+    def __init__(self, store: "MoveStore", game_idx: int):
+        self.store = store
+        self.game_idx = game_idx
+
+    @property
+    def headers(self) -> Headers:
+        return self.store.headers(self.game_idx)
+
+    def board(self) -> chess.Board:
+        fen = self.store.header(self.game_idx, "FEN")
+        return chess.Board(fen) if fen else chess.Board()
+
+    def mainline_moves(self) -> List[chess.Move]:
+        return [
+            decode_move(code) for code in self.store.move_codes(self.game_idx).tolist()
+        ]
+
+    def __repr__(self) -> str:
+        return f"<GameView {self.game_idx} of {self.store.path!r}>"
+
+
+# Anything the feature extractors accept as a game.
+GameLike = Union[Game, GameView]
+
+
+class MoveEncoder(BaseVisitor[Optional[Dict]]):
+    """
+    PGN visitor that collects the headers and encoded mainline moves of a
+    game, without building the game tree.
+    """
+
+    def __init__(self):
+        self.game_headers = Headers()
+        self.codes: List[int] = []
+
+    def begin_headers(self) -> Headers:
+        return self.game_headers
+
+    def visit_header(self, tagname: str, tagvalue: str) -> None:
+        self.game_headers[tagname] = tagvalue
+
+    def begin_variation(self) -> SkipType:
+        return SKIP
+
+    def visit_move(self, board: chess.Board, move: chess.Move) -> None:
+        self.codes.append(encode_move(move))
+
+    def visit_result(self, result: str) -> None:
+        if self.game_headers.get("Result", "*") == "*":
+            self.game_headers["Result"] = result
+
+    def handle_error(self, error: Exception) -> None:
+        # Same as `GameBuilder`: log and keep the moves parsed so far.
+        LOGGER.error("%s while parsing %r", error, self.game_headers)
+
+    def result(self) -> Dict:
+        return {"headers": self.game_headers, "codes": self.codes}
+
+
+class MoveStore:
+    """
+    Compact, memory-mapped copy of the games of a PGN file.
+
+    `compile` parses the PGN once and writes a directory holding every
+    mainline move as a uint16 code (see `encode_move`), an int64 array with
+    the offset of each game's first move (plus the total at the end), and one
+    fixed-width byte string column per header tag. `open` memory-maps those
+    arrays, so feature experiments can read millions of games through
+    `GameView`s without re-parsing the PGN text.
+
+    :param path: The directory holding the store.
+    :param moves: The move codes of every game, one after the other.
+    :param offsets: The position in `moves` where each game starts.
+    :param columns: The header columns, by tag.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        moves: np.ndarray,
+        offsets: np.ndarray,
+        columns: Dict[str, np.ndarray],
+    ):
+        self.path = path
+        self.moves = moves
+        self.offsets = offsets
+        self.columns = columns
+
+    @classmethod
+    def compile(
+        cls, pgn_file: str, path: str, tags: Iterable[str] = DEFAULT_TAGS
+    ) -> "MoveStore":
+        """
+        Parses a PGN file into a new store.
+
+        :param pgn_file: The file path of the PGN file.
+        :param path: The directory to write the store to.
+        :param tags: The header tags to keep. Tags missing from a game are
+        stored as empty strings.
+        :return: The store, memory-mapped from `path`.
+        """
+        tags = list(tags)
+        moves = array("H")
+        offsets = array("q", [0])
+        values: Dict[str, List[bytes]] = {tag: [] for tag in tags}
+
+        total_games = len(PgnIndex.open(pgn_file))
+        with open(pgn_file) as pgn:
+            games = iter(lambda: read_game(pgn, Visitor=MoveEncoder), None)
+            for game in tqdm(games, total=total_games, desc="Compiling moves"):
+                moves.extend(game["codes"])
+                offsets.append(len(moves))
+                for tag in tags:
+                    values[tag].append(game["headers"].get(tag, "").encode())
+
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, MOVES_FILE), np.frombuffer(moves, np.uint16))
+        np.save(os.path.join(path, OFFSETS_FILE), np.frombuffer(offsets, np.int64))
+        for tag in tags:
+            np.save(
+                os.path.join(path, HEADER_PREFIX + tag + ".npy"),
+                np.array(values[tag], dtype=bytes),
+            )
+        with open(os.path.join(path, META_FILE), "w") as file:
+            json.dump({"pgn_file": os.path.abspath(pgn_file), "tags": tags}, file)
+
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path: str) -> "MoveStore":
+        """
+        Memory-maps a store written by `compile`.
+
+        :param path: The directory holding the store.
+        :return: The store.
+        """
+        with open(os.path.join(path, META_FILE)) as file:
+            meta = json.load(file)
+
+        def load(name: str) -> np.ndarray:
+            return np.load(os.path.join(path, name), mmap_mode="r")
+
+        return cls(
+            path,
+            load(MOVES_FILE),
+            load(OFFSETS_FILE),
+            {tag: load(HEADER_PREFIX + tag + ".npy") for tag in meta["tags"]},
+        )
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, game_idx: int) -> GameView:
+        if not 0 <= game_idx < len(self):
+            raise IndexError(f"Game {game_idx} out of range for {len(self)} games")
+        return GameView(self, game_idx)
+
+    def __iter__(self) -> Iterator[GameView]:
+        return (GameView(self, game_idx) for game_idx in range(len(self)))
+
+    def move_codes(self, game_idx: int) -> np.ndarray:
+        """
+        Returns the move codes of a game, as a view into the store.
+        """
+        return self.moves[self.offsets[game_idx] : self.offsets[game_idx + 1]]
+
+    def header(self, game_idx: int, tag: str) -> str:
+        """
+        Returns a header of a game, or an empty string if it is not stored.
+        """
+        column = self.columns.get(tag)
+        return "" if column is None else column[game_idx].decode()
+
+    def headers(self, game_idx: int) -> Headers:
+        """
+        Returns the stored, non-empty headers of a game.
+        """
+        headers = {tag: self.header(game_idx, tag) for tag in self.columns}
+        return Headers({tag: value for tag, value in headers.items() if value})
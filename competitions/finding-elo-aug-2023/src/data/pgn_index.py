@@ -0,0 +1,225 @@
+import mmap
+import os
+from array import array
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+from chess.pgn import Game, read_game
+
+INDEX_SUFFIX = ".idx.npy"
+GAME_START = b"[Event "
+BOM = b"\xef\xbb\xbf"
+
+
+class PgnIndex:
+    """
+    Byte offsets of the games stored in a PGN file.
+
+    The index is persisted next to the PGN as a single int64 `.npy` array laid
+    out as `[file_size, mtime_ns, offset_0, offset_1, ...]`, so reruns load it
+    memory-mapped instead of scanning the file again. It is rebuilt whenever
+    the size or modification time of the PGN changes, or only extended over
+    the new bytes of a PGN that is known to have been appended to.
+    """
+
+    def __init__(
+        self, pgn_file: str, offsets: np.ndarray, file_size: int, mtime_ns: int
+    ):
+        self.pgn_file = pgn_file
+        self.offsets = offsets
+        self.file_size = file_size
+        self.mtime_ns = mtime_ns
+
+    @classmethod
+    def open(
+        cls, pgn_file: str, persist: bool = True, unchanged_prefix: int = 0
+    ) -> "PgnIndex":
+        """
+        Loads the index of a PGN file, building it first if it is missing or stale.
+
+        :param pgn_file: The file path of the PGN file.
+        :param persist: Whether to save a freshly built index next to the PGN.
+        :param unchanged_prefix: The number of leading bytes of the PGN known
+        to be unchanged since its index was last saved, e.g. because the file
+        is only ever appended to. A stale index keeps its games within them
+        and only the rest of the file is scanned. Default is 0.
+        :return: The index of the PGN file.
+        """
+        index = cls.load(pgn_file)
+        if index is None:
+            previous = cls.load(pgn_file, stale=True) if unchanged_prefix else None
+            index = cls.build(pgn_file, previous, unchanged_prefix)
+            if persist:
+                try:
+                    index.save()
+                except OSError as e:
+                    print(f"Error saving PGN index: {e}")
+        return index
+
+    @classmethod
+    def build(
+        cls,
+        pgn_file: str,
+        previous: Optional["PgnIndex"] = None,
+        unchanged_prefix: int = 0,
+    ) -> "PgnIndex":
+        """
+        Scans a memory-mapped PGN file for the start of every game.
+
+        A game starts at every line beginning with `[Event `, the same rule
+        used to count games before the index existed.
+
+        :param pgn_file: The file path of the PGN file.
+        :param previous: Optional index of an earlier version of the file.
+        :param unchanged_prefix: The number of leading bytes of the file that
+        are the same as in that version. Its games within them are kept
+        without scanning.
+        :return: The index of the PGN file.
+        """
+        stat = os.stat(pgn_file)
+        kept = np.empty(0, dtype=np.int64)
+        boundary = 0
+        if previous is not None:
+            boundary = min(unchanged_prefix, previous.file_size, stat.st_size)
+            kept = np.asarray(previous.offsets[previous.offsets < boundary])
+        offsets = array("q")
+
+        if stat.st_size:
+            with open(pgn_file, "rb") as pgn, mmap.mmap(
+                pgn.fileno(), 0, access=mmap.ACCESS_READ
+            ) as content:
+                if boundary == 0:
+                    if content[: len(GAME_START)] == GAME_START:
+                        offsets.append(0)
+                    elif content[: len(BOM + GAME_START)] == BOM + GAME_START:
+                        offsets.append(len(BOM))
+
+                position = content.find(b"\n" + GAME_START, max(boundary - 1, 0))
+                while position != -1:
+                    offsets.append(position + 1)
+                    position = content.find(b"\n" + GAME_START, position + 1)
+
+        return cls(
+            pgn_file,
+            np.concatenate((kept, np.frombuffer(offsets, dtype=np.int64))),
+            stat.st_size,
+            stat.st_mtime_ns,
+        )
+
+    @classmethod
+    def load(cls, pgn_file: str, stale: bool = False) -> Optional["PgnIndex"]:
+        """
+        Loads a persisted index if it still matches the PGN file.
+
+        :param pgn_file: The file path of the PGN file.
+        :param stale: Whether to return an index saved for an earlier version
+        of the file as well.
+        :return: The index, or None if it is missing or out of date.
+        """
+        index_file = pgn_file + INDEX_SUFFIX
+        if not os.path.exists(index_file):
+            return None
+
+        try:
+            content = np.load(index_file, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            print(f"Error reading PGN index: {e}")
+            return None
+
+        stat = os.stat(pgn_file)
+        if len(content) < 2:
+            return None
+        if not stale and (content[0], content[1]) != (stat.st_size, stat.st_mtime_ns):
+            return None
+
+        return cls(pgn_file, content[2:], int(content[0]), int(content[1]))
+
+    def save(self) -> None:
+        """
+        Writes the index next to the PGN file, replacing any previous one.
+        """
+        index_file = self.pgn_file + INDEX_SUFFIX
+        temp_file = index_file + ".tmp"
+        content = np.concatenate(
+            ([self.file_size, self.mtime_ns], self.offsets)
+        ).astype(np.int64)
+
+        with open(temp_file, "wb") as file:
+            np.save(file, content)
+        os.replace(temp_file, index_file)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def offset(self, game_idx: int) -> int:
+        """
+        Returns the byte offset where a game starts.
+
+        :param game_idx: The position of the game in the file. Passing the
+        number of games returns the file size.
+        :return: The byte offset of the game.
+        """
+        if game_idx == len(self):
+            return self.file_size
+        if not 0 <= game_idx < len(self):
+            raise IndexError(f"Game {game_idx} out of range for {len(self)} games")
+        return int(self.offsets[game_idx])
+
+    def byte_range(self, start: int = 0, stop: Optional[int] = None) -> Tuple[int, int]:
+        """
+        Returns the bytes spanned by a range of games.
+
+        :param start: The position of the first game in the range.
+        :param stop: The position after the last game. Defaults to the end of the file.
+        :return: The (start, end) byte offsets of the range.
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        start = min(start, stop)
+        return self.offset(start), self.offset(stop)
+
+    def read_game(self, game_idx: int) -> Optional[Game]:
+        """
+        Parses a single game without reading the ones before it.
+
+        :param game_idx: The position of the game in the file.
+        :return: The parsed game.
+        """
+        with open(self.pgn_file) as pgn:
+            pgn.seek(self.offset(game_idx))
+            return read_game(pgn)
+
+    def read_games(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Game]:
+        """
+        Parses a range of games.
+
+        :param start: The position of the first game in the range.
+        :param stop: The position after the last game. Defaults to the end of the file.
+        :return: An iterator over the parsed games.
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        with open(self.pgn_file) as pgn:
+            if start < stop:
+                pgn.seek(self.offset(start))
+            for _ in range(start, stop):
+                game = read_game(pgn)
+                if game is None:
+                    break
+                yield game
+
+    def split(
+        self, n_shards: int, start: int = 0, stop: Optional[int] = None
+    ) -> List[Tuple[int, int]]:
+        """
+        Splits a range of games into shards holding about the same number of games.
+
+        :param n_shards: The number of shards to aim for.
+        :param start: The position of the first game to include.
+        :param stop: The position after the last game. Defaults to the end of the file.
+        :return: The (first_game, stop_game) positions of each non-empty shard.
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        total_games = max(stop - start, 0)
+        boundaries = [
+            start + total_games * shard // n_shards for shard in range(n_shards + 1)
+        ]
+        return [(a, b) for a, b in zip(boundaries, boundaries[1:]) if b > a]
@@ -0,0 +1,247 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+MANIFEST_FILE = "manifest.json"
+LEASE_DIR = "leases"
+DONE_DIR = "done"
+OUTPUT_DIR = "output"
+TEMP_DIR = "tmp"
+
+
+def make_owner() -> str:
+    """
+    Returns a name for this worker that is unique across nodes.
+    """
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def shard_name(shard: int) -> str:
+    return f"shard-{shard:06d}"
+
+
+def write_json(path: str, content: Dict, exclusive: bool = False) -> bool:
+    """
+    Writes a JSON file atomically, through a uniquely named temporary file.
+
+    Exclusive writes hard-link the temporary file into place, which fails if
+    the file exists, even on NFS where `O_EXCL` can't be relied on. A link
+    whose reply was lost is still detected through the link count.
+
+    :param path: The file path to write.
+    :param content: The content to write.
+    :param exclusive: Whether to fail if the file exists instead of replacing it.
+    :return: Whether the file was written.
+    """
+    temp_file = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_file, "w") as file:
+        json.dump(content, file)
+        file.flush()
+        os.fsync(file.fileno())
+
+    if not exclusive:
+        os.replace(temp_file, path)
+        return True
+
+    try:
+        os.link(temp_file, path)
+    except OSError:
+        pass
+    try:
+        return os.stat(temp_file).st_nlink == 2
+    finally:
+        os.remove(temp_file)
+
+
+def read_json(path: str) -> Optional[Dict]:
+    """
+    Reads a JSON file, or returns None if it is missing or unreadable.
+    """
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def create_manifest(work_dir: str, manifest: Dict) -> Dict:
+    """
+    Creates the shard manifest of a run, unless one already exists.
+
+    :param work_dir: The shared directory of the run.
+    :param manifest: The manifest, with the PGN file, its size and
+    modification time, the output options and the list of shards.
+    :return: The manifest of the run, which is the existing one if another
+    node created it first.
+    """
+    for directory in (LEASE_DIR, DONE_DIR, OUTPUT_DIR, TEMP_DIR):
+        os.makedirs(os.path.join(work_dir, directory), exist_ok=True)
+    path = os.path.join(work_dir, MANIFEST_FILE)
+    write_json(path, manifest, exclusive=True)
+    return read_manifest(work_dir)
+
+
+def read_manifest(work_dir: str) -> Dict:
+    """
+    Reads the shard manifest of a run.
+
+    :param work_dir: The shared directory of the run.
+    :return: The manifest.
+    """
+    manifest = read_json(os.path.join(work_dir, MANIFEST_FILE))
+    if manifest is None:
+        raise ValueError(f"No shard manifest in {work_dir}")
+    return manifest
+
+
+def output_path(work_dir: str, manifest: Dict, shard: int) -> str:
+    """
+    Returns where the output of a shard is saved.
+    """
+    return os.path.join(
+        work_dir, OUTPUT_DIR, shard_name(shard) + manifest["output_extension"]
+    )
+
+
+def mark_done(work_dir: str, shard: int, record: Dict) -> None:
+    """
+    Records that the output of a shard is complete.
+
+    :param work_dir: The shared directory of the run.
+    :param shard: The position of the shard in the manifest.
+    :param record: What the merge checks the output against, e.g. the games
+    and rows of the shard.
+    """
+    write_json(os.path.join(work_dir, DONE_DIR, shard_name(shard) + ".json"), record)
+
+
+def read_done(work_dir: str, shard: int) -> Optional[Dict]:
+    """
+    Returns the record of a finished shard, or None if it is not done yet.
+    """
+    return read_json(os.path.join(work_dir, DONE_DIR, shard_name(shard) + ".json"))
+
+
+def pending_shards(work_dir: str, manifest: Dict) -> List[int]:
+    """
+    Returns the shards of a run that are not done yet, in file order.
+    """
+    return [
+        shard["shard"]
+        for shard in manifest["shards"]
+        if read_done(work_dir, shard["shard"]) is None
+    ]
+
+
+class ShardLease:
+    """
+    A time-limited claim of one worker on one shard, stored as a lock file in
+    the shared directory of the run.
+
+    A lease is taken by creating its file exclusively, and lasts `seconds`
+    from its last renewal. While held, a daemon thread renews it every third
+    of that time. A worker that crashes stops renewing, and once the lease
+    has expired any other worker breaks it and takes the shard over.
+    Expiry times are compared across nodes, so their clocks must agree to
+    well within the lease duration.
+
+    Leases keep workers from doing the same shard twice, but outputs don't
+    rely on them: a shard processed twice, e.g. by a worker that was only
+    stalled, produces the same output.
+
+    :param work_dir: The shared directory of the run.
+    :param shard: The position of the shard in the manifest.
+    :param owner: The name of the worker, see `make_owner`.
+    :param seconds: How long the lease lasts without renewal.
+    """
+
+    def __init__(self, work_dir: str, shard: int, owner: str, seconds: float = 600):
+        self.path = os.path.join(work_dir, LEASE_DIR, shard_name(shard) + ".lease")
+        self.shard = shard
+        self.owner = owner
+        self.seconds = seconds
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    def _content(self) -> Dict:
+        return {"owner": self.owner, "expires": time.time() + self.seconds}
+
+    def acquire(self) -> bool:
+        """
+        Takes the lease if it is free or expired, and starts renewing it.
+
+        :return: Whether the lease is now held by this worker.
+        """
+        if not write_json(self.path, self._content(), exclusive=True):
+            current = read_json(self.path)
+            if current is not None and current.get("expires", 0) > time.time():
+                return False
+            self._break(current)
+            if not write_json(self.path, self._content(), exclusive=True):
+                return False
+
+        self._stop.clear()
+        self._heartbeat = threading.Thread(
+            target=self._renew_until_stopped, name="shard-lease", daemon=True
+        )
+        self._heartbeat.start()
+        return True
+
+    def _break(self, expired: Optional[Dict]) -> None:
+        # Only one worker can move the file aside. If it was renewed since it
+        # was read, it is put back.
+        stale_file = f"{self.path}.{self.owner}.stale"
+        try:
+            os.rename(self.path, stale_file)
+        except FileNotFoundError:
+            return
+        try:
+            if read_json(stale_file) != expired:
+                os.link(stale_file, self.path)
+        except OSError:
+            pass
+        finally:
+            os.remove(stale_file)
+
+    def renew(self) -> bool:
+        """
+        Extends the lease, unless another worker has taken it over.
+
+        :return: Whether the lease is still held by this worker.
+        """
+        current = read_json(self.path)
+        if current is None or current.get("owner") != self.owner:
+            return False
+        write_json(self.path, self._content())
+        return True
+
+    def _renew_until_stopped(self) -> None:
+        while not self._stop.wait(self.seconds / 3):
+            if not self.renew():
+                print(f"Lost the lease on {shard_name(self.shard)}")
+                return
+
+    def release(self) -> None:
+        """
+        Stops renewing the lease and gives it up.
+        """
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+        current = read_json(self.path)
+        if current is not None and current.get("owner") == self.owner:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self) -> "ShardLease":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
@@ -0,0 +1,338 @@
+import glob
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, List, Union
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+class OutputSink(ABC):
+    """
+    Destination for the rows produced by `pgn_to_dataframe`.
+
+    Rows are written in batches of one `save_interval` each. Every sink
+    reports its current size as an opaque position that the checkpoint
+    stores, and can truncate back to it when a run is resumed. Sinks may hold
+    written rows back until they can be saved for good, see `committed`.
+    """
+
+    def __init__(self, save_location: str):
+        self.save_location = save_location
+
+    def exists(self) -> bool:
+        return os.path.exists(self.save_location)
+
+    @abstractmethod
+    def write(
+        self, games: Union[pd.DataFrame, List[Dict[str, Union[str, int, float]]]]
+    ) -> None:
+        """Appends a batch of rows. Raises if they could not be written."""
+
+    @property
+    def committed(self) -> bool:
+        """Whether every row written so far is saved, so it can be checkpointed."""
+        return True
+
+    def close(self) -> None:
+        """Saves the rows held back, if any. Call it after the last batch."""
+
+    @abstractmethod
+    def size(self) -> int:
+        """Returns the current position of the output."""
+
+    @abstractmethod
+    def truncate(self, size: int) -> None:
+        """Discards everything written after a position returned by `size`."""
+
+    @abstractmethod
+    def count_rows(self) -> int:
+        """Counts the rows saved so far."""
+
+    @abstractmethod
+    def read(self) -> pd.DataFrame:
+        """Reads every saved row back."""
+
+
+class CsvSink(OutputSink):
+    """
+    Appends rows to a single CSV file. Its position is the file size in bytes.
+    """
+
+    def write(
+        self, games: Union[pd.DataFrame, List[Dict[str, Union[str, int, float]]]]
+    ) -> None:
+        exists = self.exists()
+        size = self.size()
+        try:
+            pd.DataFrame(games).to_csv(
+                self.save_location,
+                mode="a" if exists else "w",
+                header=not size,
+                index=False,
+            )
+        except Exception:
+            # Drop a partially appended batch, so the file ends on a row.
+            if exists:
+                self.truncate(size)
+            elif self.exists():
+                os.remove(self.save_location)
+            raise
+
+    def size(self) -> int:
+        return os.path.getsize(self.save_location) if self.exists() else 0
+
+    def truncate(self, size: int) -> None:
+        with open(self.save_location, "r+b") as output:
+            output.truncate(size)
+
+    def count_rows(self) -> int:
+        with open(self.save_location, "rb") as output:
+            return max(sum(1 for _ in output) - 1, 0)
+
+    def read(self) -> pd.DataFrame:
+        return pd.read_csv(self.save_location)
+
+
+class ParquetSink(OutputSink):
+    """
+    Writes typed rows to a directory of Parquet files, one row group per batch.
+
+    Batches are appended as row groups to an open part until it holds
+    `part_rows` rows. The part is then closed and renamed into place as
+    `part-NNNNNN`, so an interrupted run never leaves a half-written file
+    behind. Rows of the open part are not `committed` until then, and are
+    dropped if the run is interrupted. The position is the number of closed
+    parts. Reading memory-maps every part.
+
+    :param save_location: The directory to write to.
+    :param part_rows: The number of rows after which a part is closed.
+    Default is 100,000, so resuming redoes at most that many rows.
+    """
+
+    extension = ".parquet"
+
+    def __init__(self, save_location: str, part_rows: int = 100_000):
+        if pa is None:
+            raise ImportError("pyarrow is required for Parquet and Arrow output")
+        super().__init__(save_location)
+        self.part_rows = part_rows
+        self._writer = None
+        self._schema = None
+        self._open_rows = 0
+
+    def _part_path(self, part: int) -> str:
+        return os.path.join(self.save_location, f"part-{part:06d}{self.extension}")
+
+    def _parts(self) -> List[str]:
+        pattern = os.path.join(self.save_location, f"part-*{self.extension}")
+        return sorted(glob.glob(pattern))
+
+    def _to_table(
+        self, games: Union[pd.DataFrame, List[Dict[str, Union[str, int, float]]]]
+    ) -> "pa.Table":
+        return widen_dictionaries(
+            pa.Table.from_pandas(pd.DataFrame(games), preserve_index=False)
+        )
+
+    def _open_writer(self, path: str, schema: "pa.Schema"):
+        return pq.ParquetWriter(path, schema)
+
+    def _write_table(self, table: "pa.Table") -> None:
+        self._writer.write_table(table, row_group_size=max(table.num_rows, 1))
+
+    def _read_table(self, path: str) -> "pa.Table":
+        return pq.read_table(path, memory_map=True)
+
+    def _count_rows(self, path: str) -> int:
+        return pq.ParquetFile(path, memory_map=True).metadata.num_rows
+
+    def write(
+        self, games: Union[pd.DataFrame, List[Dict[str, Union[str, int, float]]]]
+    ) -> None:
+        table = self._to_table(games)
+        if self._writer is not None and not table.schema.equals(
+            self._schema, check_metadata=False
+        ):
+            try:
+                table = table.cast(self._schema)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                # E.g. a column that was all missing, and typed as null, in
+                # the open part.
+                self.close()
+
+        try:
+            if self._writer is None:
+                os.makedirs(self.save_location, exist_ok=True)
+                self._writer = self._open_writer(self._temp_path(), table.schema)
+                self._schema = table.schema
+            self._write_table(table)
+        except Exception:
+            self._discard()
+            raise
+
+        self._open_rows += table.num_rows
+        if self._open_rows >= self.part_rows:
+            self.close()
+
+    @property
+    def committed(self) -> bool:
+        return self._writer is None
+
+    def close(self) -> None:
+        if self._writer is None:
+            return
+        try:
+            self._writer.close()
+            os.replace(self._temp_path(), self._part_path(self.size()))
+        except Exception:
+            self._discard()
+            raise
+        self._writer = None
+        self._open_rows = 0
+
+    def _temp_path(self) -> str:
+        return os.path.join(self.save_location, f"open{self.extension}.tmp")
+
+    def _discard(self) -> None:
+        """Drops the open part, e.g. after a failed write."""
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+        self._writer = None
+        self._open_rows = 0
+        if os.path.exists(self._temp_path()):
+            os.remove(self._temp_path())
+
+    def size(self) -> int:
+        return len(self._parts()) if self.exists() else 0
+
+    def truncate(self, size: int) -> None:
+        self._discard()
+        for path in self._parts()[size:]:
+            os.remove(path)
+        for path in glob.glob(os.path.join(self.save_location, "*.tmp")):
+            os.remove(path)
+
+    def count_rows(self) -> int:
+        return sum(self._count_rows(path) for path in self._parts())
+
+    def read(self) -> pd.DataFrame:
+        tables = [self._read_table(path) for path in self._parts()]
+        if not tables:
+            return pd.DataFrame()
+        return concat_tables(tables).to_pandas()
+
+
+class ArrowSink(ParquetSink):
+    """
+    Writes typed rows to a directory of Arrow IPC files, one record batch per batch.
+
+    An IPC file holds a single dictionary per column, while the categories
+    of each batch differ, so categorical columns are saved as plain values.
+    """
+
+    extension = ".arrow"
+
+    def _to_table(
+        self, games: Union[pd.DataFrame, List[Dict[str, Union[str, int, float]]]]
+    ) -> "pa.Table":
+        table = super()._to_table(games)
+        fields = [
+            (
+                field.with_type(field.type.value_type)
+                if pa.types.is_dictionary(field.type)
+                else field
+            )
+            for field in table.schema
+        ]
+        return table.cast(pa.schema(fields, metadata=table.schema.metadata))
+
+    def _open_writer(self, path: str, schema: "pa.Schema"):
+        return pa.ipc.new_file(path, schema)
+
+    def _write_table(self, table: "pa.Table") -> None:
+        self._writer.write_table(table, max_chunksize=max(table.num_rows, 1))
+
+    def _read_table(self, path: str) -> "pa.Table":
+        with pa.memory_map(path) as source:
+            return pa.ipc.open_file(source).read_all()
+
+    def _count_rows(self, path: str) -> int:
+        return self._read_table(path).num_rows
+
+
+def widen_dictionaries(table: "pa.Table") -> "pa.Table":
+    """
+    Gives every dictionary column of a table int32 indices.
+
+    Pandas stores categorical codes in the narrowest integer type that fits
+    the categories, so batches of the same categorical column can have
+    different index types, which can't be concatenated when read back.
+    """
+    fields = [
+        (
+            field.with_type(pa.dictionary(pa.int32(), field.type.value_type))
+            if pa.types.is_dictionary(field.type)
+            else field
+        )
+        for field in table.schema
+    ]
+    return table.cast(pa.schema(fields, metadata=table.schema.metadata))
+
+
+def concat_tables(tables: List["pa.Table"]) -> "pa.Table":
+    """
+    Concatenates tables whose schemas may differ in null columns: columns that
+    were all missing in a batch are typed as null there.
+
+    pyarrow < 14 only has the `promote` flag for this.
+    """
+    try:
+        return pa.concat_tables(tables, promote_options="default")
+    except TypeError:
+        return pa.concat_tables(tables, promote=True)
+
+
+def make_sink(save_location: str) -> OutputSink:
+    """
+    Picks an output sink from the extension of the save location.
+
+    :param save_location: The location to save to. `.parquet` writes Parquet,
+    `.arrow` and `.feather` write Arrow IPC, anything else writes CSV.
+    :return: The output sink.
+    """
+    extension = os.path.splitext(save_location)[1].lower()
+    if extension == ".parquet":
+        return ParquetSink(save_location)
+    if extension in (".arrow", ".feather"):
+        return ArrowSink(save_location)
+    return CsvSink(save_location)
+
+
+def save_games_to_csv(
+    games: Union[pd.DataFrame, List[Dict[str, Union[str, int, float]]]],
+    save_location: str,
+) -> None:
+    """
+    Saves a list of games to a CSV file. Errors are printed, not raised, so
+    use `CsvSink` wherever a failed write must stop the run.
+
+    Parameters:
+    games (Union[pd.DataFrame, List[Dict[str, Union[str, int, float]]]]):
+        A list of games represented as dic, or a DataFrame of them.
+    save_location (str):
+        The location to save the CSV file.
+    """
+
+    try:
+        CsvSink(save_location).write(games)
+    except Exception as e:
+        print(f"Error writing to CSV: {e}")
@@ -0,0 +1,86 @@
+import random
+from typing import Iterator, Tuple
+
+import chess
+from chess.pgn import Game
+
+RESULTS = ("1-0", "0-1", "1/2-1/2")
+
+
+def generate_games(
+    n_games: int,
+    seed: int = 0,
+    plies: Tuple[int, int] = (20, 160),
+    promotion_rate: float = 0.9,
+    castling_rate: float = 0.9,
+    capture_rate: float = 0.3,
+    ratings: Tuple[int, int] = (1800, 2800),
+) -> Iterator[Game]:
+    """
+    Generates random legal games, always the same ones for the same arguments.
+
+    Moves are drawn uniformly from the legal moves, except that available
+    promotions, castling moves and captures are preferred with the given
+    probabilities, so those features show up far more often than in purely
+    random play. Games stop early on checkmate or stalemate.
+
+    :param n_games: The number of games to generate.
+    :param seed: The seed of the random generator.
+    :param plies: The (min, max) number of plies to aim for in each game.
+    :param promotion_rate: The probability of promoting when possible.
+    :param castling_rate: The probability of castling when possible.
+    :param capture_rate: The probability of capturing when possible.
+    :param ratings: The (min, max) WhiteElo and BlackElo.
+    :return: An iterator over the games.
+    """
+    rng = random.Random(seed)
+
+    for game_idx in range(n_games):
+        game = Game()
+        game.headers["Event"] = str(game_idx + 1)
+        game.headers["Site"] = "Synthetic"
+        game.headers["WhiteElo"] = str(rng.randint(*ratings))
+        game.headers["BlackElo"] = str(rng.randint(*ratings))
+
+        board = chess.Board()
+        node = game
+        for _ in range(rng.randint(*plies)):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+
+            move = None
+            for rate, preferred in (
+                (promotion_rate, lambda m: m.promotion is not None),
+                (castling_rate, board.is_castling),
+                (capture_rate, board.is_capture),
+            ):
+                candidates = [m for m in moves if preferred(m)]
+                if candidates and rng.random() < rate:
+                    move = rng.choice(candidates)
+                    break
+            if move is None:
+                move = rng.choice(moves)
+
+            node = node.add_variation(move)
+            board.push(move)
+
+        game.headers["Result"] = (
+            board.result() if board.is_game_over() else rng.choice(RESULTS)
+        )
+        yield game
+
+
+def write_synthetic_pgn(pgn_file: str, n_games: int, **kwargs) -> str:
+    """
+    Writes games from `generate_games` to a PGN file.
+
+    :param pgn_file: The file path to write to.
+    :param n_games: The number of games to generate.
+    :param kwargs: Passed on to `generate_games`.
+    :return: The file path of the PGN file.
+    """
+    with open(pgn_file, "w") as pgn:
+        for game in generate_games(n_games, **kwargs):
+            print(game, file=pgn, end="\n\n")
+    return pgn_file
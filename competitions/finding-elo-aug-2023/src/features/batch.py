@@ -0,0 +1,162 @@
+from array import array
+from typing import Dict, Iterable, List
+
+import chess
+import numpy as np
+import pandas as pd
+from src.data.move_store import GameLike
+from src.features.game import MoveCounters
+
+# Per-move flags recorded by `MoveArrays.from_games`.
+FLAGS = ("capture", "check", "promotion", "castle")
+
+
+class MoveArrays:
+    """
+    Flat per-move arrays for a batch of games.
+
+    Every mainline move of every game is one entry: the type of the piece
+    moved (0 if the from square is empty), whether White moved it, and its
+    capture, check, promotion and castling flags. `offsets[i]` is the
+    position of the first move of game `i`, and `offsets[-1]` the total
+    number of moves, so per-game counts are reductions over these arrays
+    rather than Python loops.
+
+    :param offsets: The start of each game, plus the total number of moves.
+    :param piece: The piece type of each move.
+    :param white: Whether White made each move.
+    :param flags: The arrays of `FLAGS`, by name.
+    :param results: The Result header of each game.
+    """
+
+    def __init__(
+        self,
+        offsets: np.ndarray,
+        piece: np.ndarray,
+        white: np.ndarray,
+        flags: Dict[str, np.ndarray],
+        results: List[str],
+    ):
+        self.offsets = offsets
+        self.piece = piece
+        self.white = white
+        self.flags = flags
+        self.results = results
+
+    @classmethod
+    def from_games(cls, games: Iterable[GameLike]) -> "MoveArrays":
+        """
+        Replays each game once, recording the flags of every move.
+
+        :param games: Chess game objects, or `GameView`s of a move store.
+        :return: The move arrays of the batch.
+        """
+        offsets = array("q", [0])
+        piece = array("B")
+        white = array("B")
+        flags = {flag: array("B") for flag in FLAGS}
+        results = []
+
+        for game in games:
+            board = game.board()
+            for move in game.mainline_moves():
+                piece.append(board.piece_type_at(move.from_square) or 0)
+                white.append(board.turn)
+                flags["capture"].append(board.is_capture(move))
+                flags["promotion"].append(move.promotion is not None)
+                flags["castle"].append(board.is_castling(move))
+                board.push(move)
+                flags["check"].append(board.is_check())
+            offsets.append(len(piece))
+            results.append(game.headers["Result"])
+
+        return cls(
+            np.frombuffer(offsets, dtype=np.int64),
+            np.frombuffer(piece, dtype=np.uint8),
+            np.frombuffer(white, dtype=np.uint8),
+            {
+                flag: np.frombuffer(values, dtype=np.uint8)
+                for flag, values in flags.items()
+            },
+            results,
+        )
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def game_ids(self) -> np.ndarray:
+        """
+        Returns the position of the game each move belongs to.
+        """
+        return np.repeat(np.arange(len(self)), np.diff(self.offsets))
+
+    def per_player(self, values: np.ndarray, width: int = 1) -> np.ndarray:
+        """
+        Sums per-move values, or counts per-move categories, by game and player.
+
+        :param values: The per-move values to sum when `width` is 1, or the
+        category of each move, below `width`, to count.
+        :param width: The number of categories.
+        :return: An array of shape (games, 2, width) with Black first.
+        """
+        if width == 1:
+            keys = self.game_ids() * 2 + self.white
+            counts = np.bincount(keys, weights=values, minlength=len(self) * 2)
+        else:
+            keys = (self.game_ids() * 2 + self.white) * width + values
+            counts = np.bincount(keys, minlength=len(self) * 2 * width)
+        return counts.astype(np.int64).reshape(len(self), 2, width)
+
+
+def batch_game_features(arrays: MoveArrays) -> pd.DataFrame:
+    """
+    Computes the `get_game_features` columns of a whole batch with NumPy.
+
+    :param arrays: The move arrays of the batch.
+    :return: One row per game, with the same columns and values as
+    `get_game_features`.
+    """
+    total_moves = np.diff(arrays.offsets)
+    results = np.array(arrays.results, dtype=object)
+    white_moves = total_moves // 2 + total_moves % 2
+    black_moves = white_moves - (results == "1-0")
+
+    pieces = arrays.per_player(arrays.piece, len(chess.PIECE_TYPES) + 1)
+    flags = {
+        flag: arrays.per_player(values)[:, :, 0]
+        for flag, values in arrays.flags.items()
+    }
+
+    columns = {
+        "result": results,
+        "total_moves": total_moves,
+        "wp_total_moves": white_moves,
+        "bp_total_moves": black_moves,
+    }
+    players = (("wp", int(chess.WHITE)), ("bp", int(chess.BLACK)))
+    for player, color in players:
+        for piece_type, col in zip(chess.PIECE_TYPES, MoveCounters.cols):
+            columns[f"{player}_total_{col}_moves"] = pieces[:, color, piece_type]
+    for name, counts in (
+        ("total_checks", flags["check"]),
+        ("total_captures", flags["capture"]),
+        ("total_promotions", flags["promotion"]),
+        ("bool_castles", flags["castle"] > 0),
+    ):
+        for player, color in players:
+            columns[f"{player}_{name}"] = counts[:, color]
+
+    return pd.DataFrame(columns)
+
+
+def get_batch_features(games: Iterable[GameLike]) -> pd.DataFrame:
+    """
+    Extracts the `get_game_features` columns of many games at once.
+
+    Each game is replayed a single time to fill the flat move arrays; all the
+    counting is then done by NumPy over the whole batch.
+
+    :param games: Chess game objects, or a `MoveStore` and its `GameView`s.
+    :return: One row per game.
+    """
+    return batch_game_features(MoveArrays.from_games(games))
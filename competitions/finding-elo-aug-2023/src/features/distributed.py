@@ -0,0 +1,403 @@
+"""
+Runs `pgn_to_dataframe` across several nodes that share a directory, e.g.
+over NFS.
+
+One node plans the run, splitting the PGN into shards of whole games listed
+in a manifest. Workers on every node then claim shards through leases,
+process them and save one output per shard. The shards of a worker that
+crashes are taken over once its leases expire. When every shard is done, one
+node merges the outputs in game order into a single output.
+
+Usage, from the competition directory, with the PGN and the work directory
+at the same path on every node:
+
+    python -m src.features.distributed plan data/raw/games.pgn /shared/run
+    python -m src.features.distributed work /shared/run  # on every node
+    python -m src.features.distributed merge /shared/run data/interim/output.parquet
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import time
+from typing import Dict, Optional
+
+from src.data.checkpoint import write_checkpoint
+from src.data.pgn_index import PgnIndex
+from src.data.shard_manifest import (
+    TEMP_DIR,
+    ShardLease,
+    create_manifest,
+    make_owner,
+    mark_done,
+    output_path,
+    pending_shards,
+    read_done,
+    read_manifest,
+)
+from src.data.sinks import OutputSink, make_sink
+from src.features.eco import EcoTrie
+from src.features.engine_pool import EnginePool
+from src.features.explorer_cache import ExplorerCache
+from src.features.main import PipelineOptions, extract_shard_data, get_output_dtypes
+from src.features.schema import FrameBuilder, apply_dtypes
+
+
+def plan_shards(
+    pgn_file: str,
+    work_dir: str,
+    shard_games: int = 10_000,
+    include_opening_cols: bool = True,
+    include_evaluation_cols: bool = False,
+    output_extension: str = ".parquet",
+) -> Dict:
+    """
+    Splits a PGN file into shards and writes the manifest of the run.
+
+    Planning is idempotent: if the work directory already has a manifest,
+    e.g. because another node planned the run first, it is kept.
+
+    Parameters:
+    pgn_file (str):
+        The file path of the PGN file. Must be uncompressed and reachable at
+        the same path from every node.
+    work_dir (str):
+        The shared directory of the run.
+    shard_games (int):
+        The number of games per shard. Default is 10,000.
+    include_opening_cols (bool):
+        Flag to determine whether to include opening features. Default is True.
+    include_evaluation_cols (bool):
+        Flag to determine whether to include the evaluation features, which
+        need every worker to have an engine pool. Default is False.
+    output_extension (str):
+        The extension of the shard outputs, which picks their sink. Default
+        is ".parquet".
+
+    Returns:
+    Dict: The manifest of the run.
+    """
+
+    index = PgnIndex.open(pgn_file)
+    n_shards = max(-(-len(index) // shard_games), 1)
+    manifest = {
+        "pgn_file": os.path.abspath(pgn_file),
+        "pgn_size": index.file_size,
+        "pgn_mtime_ns": index.mtime_ns,
+        "games": len(index),
+        "include_opening_cols": include_opening_cols,
+        "include_evaluation_cols": include_evaluation_cols,
+        "output_extension": output_extension,
+        "shards": [
+            {
+                "shard": shard,
+                "first_game": first_game,
+                "stop_game": stop_game,
+                "start": index.offset(first_game),
+                "end": index.offset(stop_game),
+            }
+            for shard, (first_game, stop_game) in enumerate(index.split(n_shards))
+        ],
+    }
+    return create_manifest(work_dir, manifest)
+
+
+def run_worker(
+    work_dir: str,
+    lease_seconds: float = 600,
+    poll_seconds: float = 10,
+    options: Optional[PipelineOptions] = None,
+) -> int:
+    """
+    Processes shards of a planned run until all of them are done.
+
+    Shards are claimed in file order. When every remaining shard is leased
+    by another worker, this one waits for them to finish, and takes over
+    those whose lease expires.
+
+    Parameters:
+    work_dir (str):
+        The shared directory of the run.
+    lease_seconds (float):
+        How long a lease lasts without renewal. A crashed worker's shards
+        are taken over after this long. Default is 600.
+    poll_seconds (float):
+        How often to look for expired leases while waiting. Default is 10.
+    options (Optional[PipelineOptions]):
+        The optional resources of the run, see `PipelineOptions`. Every
+        worker must use the same header filter and opening source. Default
+        is None.
+
+    Returns:
+    int: The number of shards processed by this worker.
+    """
+
+    options = PipelineOptions() if options is None else options
+    manifest = read_manifest(work_dir)
+    if manifest["include_evaluation_cols"] and options.engine_pool is None:
+        raise ValueError("The run includes evaluation features: pass an engine pool")
+
+    owner = make_owner()
+    dtypes = get_output_dtypes(
+        manifest["include_opening_cols"], manifest["include_evaluation_cols"]
+    )
+    failed = set()
+    processed = 0
+
+    while True:
+        pending = [
+            shard for shard in pending_shards(work_dir, manifest) if shard not in failed
+        ]
+        if not pending:
+            shutil.rmtree(os.path.join(work_dir, TEMP_DIR, owner), ignore_errors=True)
+            return processed
+
+        claimed = False
+        for shard in pending:
+            lease = ShardLease(work_dir, shard, owner, lease_seconds)
+            if read_done(work_dir, shard) is not None or not lease.acquire():
+                continue
+            claimed = True
+            with lease:
+                # Another worker may have finished it and released the lease
+                # since the check above.
+                if read_done(work_dir, shard) is not None:
+                    continue
+                try:
+                    process_shard(work_dir, manifest, shard, owner, dtypes, options)
+                    processed += 1
+                except Exception as e:
+                    print(f"Error processing shard {shard}: {e}")
+                    failed.add(shard)
+
+        if not claimed:
+            time.sleep(poll_seconds)
+
+
+def process_shard(
+    work_dir: str,
+    manifest: Dict,
+    shard: int,
+    owner: str,
+    dtypes: Dict,
+    options: Optional[PipelineOptions] = None,
+) -> None:
+    """
+    Extracts the features of one shard and saves them as its output.
+
+    The output is written under a temporary name and moved into place, and
+    the shard is only marked done once the saved output holds every row, so
+    neither a crash nor a failed write leaves a shard done without its output.
+    """
+
+    info = manifest["shards"][shard]
+    rows = extract_shard_data(
+        manifest["pgn_file"],
+        info["start"],
+        info["end"],
+        manifest["include_opening_cols"],
+        options,
+    )
+    games = FrameBuilder(dtypes, capacity=max(len(rows), 1))
+    for row in rows:
+        if row is not None:
+            games.append(row)
+    frame = games.to_frame()
+
+    final_path = output_path(work_dir, manifest, shard)
+    temp_dir = os.path.join(work_dir, TEMP_DIR, owner)
+    temp_path = os.path.join(temp_dir, os.path.basename(final_path))
+    os.makedirs(temp_dir, exist_ok=True)
+    sink = make_sink(temp_path)
+    sink.write(frame)
+    sink.close()
+    try:
+        os.replace(temp_path, final_path)
+    except OSError:
+        # Only benign when a worker that lost its lease already saved the
+        # same output as a directory, which can't be replaced.
+        if not os.path.isdir(final_path):
+            raise
+        shutil.rmtree(temp_path, ignore_errors=True)
+
+    saved_rows = make_sink(final_path).count_rows()
+    if saved_rows != len(frame):
+        raise ValueError(
+            f"The output of shard {shard} has {saved_rows} rows instead of "
+            f"{len(frame)}"
+        )
+
+    mark_done(
+        work_dir,
+        shard,
+        {
+            "first_game": info["first_game"],
+            "stop_game": info["stop_game"],
+            "games": len(rows),
+            "rows": len(frame),
+            "owner": owner,
+        },
+    )
+
+
+def merge_shards(
+    work_dir: str,
+    save_location: str,
+    sink: Optional[OutputSink] = None,
+) -> int:
+    """
+    Checks that every shard of a run is done and merges their outputs.
+
+    The shards must cover every game of the PGN exactly once, in order, and
+    each output must hold the rows recorded when its shard was done. The
+    merged output gets a checkpoint like one saved by `pgn_to_dataframe`,
+    so it can later be refreshed with `incremental=True`.
+
+    Parameters:
+    work_dir (str):
+        The shared directory of the run.
+    save_location (str):
+        The location of the merged output. Anything there is replaced.
+    sink (Optional[OutputSink]):
+        The sink to save to. Default is None, which picks one from the
+        extension of save_location.
+
+    Returns:
+    int: The number of rows merged.
+    """
+
+    manifest = read_manifest(work_dir)
+    pgn_stat = os.stat(manifest["pgn_file"])
+    if (pgn_stat.st_size, pgn_stat.st_mtime_ns) != (
+        manifest["pgn_size"],
+        manifest["pgn_mtime_ns"],
+    ):
+        raise ValueError(f"{manifest['pgn_file']} changed since the run was planned")
+
+    pending = pending_shards(work_dir, manifest)
+    if pending:
+        raise ValueError(f"{len(pending)} shards are not done, e.g. shard {pending[0]}")
+
+    next_game = 0
+    for info in manifest["shards"]:
+        done = read_done(work_dir, info["shard"])
+        if (done["first_game"], done["stop_game"]) != (
+            info["first_game"],
+            info["stop_game"],
+        ) or info["first_game"] != next_game:
+            raise ValueError(f"Shard {info['shard']} is out of order")
+        if done["games"] != info["stop_game"] - info["first_game"]:
+            raise ValueError(f"Shard {info['shard']} is missing games")
+        next_game = info["stop_game"]
+    if next_game != manifest["games"]:
+        raise ValueError(f"The shards stop at game {next_game} of {manifest['games']}")
+
+    dtypes = get_output_dtypes(
+        manifest["include_opening_cols"], manifest["include_evaluation_cols"]
+    )
+    sink = make_sink(save_location) if sink is None else sink
+    if sink.exists():
+        sink.truncate(0)
+
+    rows = 0
+    for info in manifest["shards"]:
+        frame = make_sink(output_path(work_dir, manifest, info["shard"])).read()
+        if len(frame) != read_done(work_dir, info["shard"])["rows"]:
+            raise ValueError(f"The output of shard {info['shard']} is incomplete")
+        sink.write(apply_dtypes(frame, dtypes))
+        rows += len(frame)
+    sink.close()
+
+    index = PgnIndex.open(manifest["pgn_file"])
+    write_checkpoint(
+        sink.save_location,
+        manifest["pgn_file"],
+        len(index),
+        index.offset(len(index)),
+        sink.size(),
+        index.offset(max(len(index) - 1, 0)),
+    )
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    plan = commands.add_parser("plan", help="Split a PGN into shards.")
+    plan.add_argument("pgn_file")
+    plan.add_argument("work_dir")
+    plan.add_argument("--shard-games", type=int, default=10_000)
+    plan.add_argument("--no-opening-cols", action="store_true")
+    plan.add_argument("--evaluation-cols", action="store_true")
+    plan.add_argument("--output-extension", default=".parquet")
+
+    work = commands.add_parser("work", help="Process shards until all are done.")
+    work.add_argument("work_dir")
+    work.add_argument("--lease-seconds", type=float, default=600)
+    work.add_argument("--poll-seconds", type=float, default=10)
+    work.add_argument("--opening-book", nargs="+", help="ECO TSV files.")
+    work.add_argument("--opening-cache", help="SQLite explorer cache.")
+    work.add_argument("--engine", help="UCI engine command.")
+    work.add_argument("--n-engines", type=int)
+    work.add_argument("--depth", type=int)
+
+    merge = commands.add_parser("merge", help="Merge the outputs of every shard.")
+    merge.add_argument("work_dir")
+    merge.add_argument("save_location")
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == "plan":
+            manifest = plan_shards(
+                args.pgn_file,
+                args.work_dir,
+                args.shard_games,
+                not args.no_opening_cols,
+                args.evaluation_cols,
+                args.output_extension,
+            )
+            print(f"{len(manifest['shards'])} shards of {manifest['games']} games")
+        elif args.command == "work":
+            engine_pool = None
+            if args.engine:
+                engine_pool = EnginePool(
+                    args.engine, n_engines=args.n_engines, depth=args.depth
+                )
+            try:
+                processed = run_worker(
+                    args.work_dir,
+                    args.lease_seconds,
+                    args.poll_seconds,
+                    PipelineOptions(
+                        opening_cache=(
+                            ExplorerCache(args.opening_cache)
+                            if args.opening_cache
+                            else None
+                        ),
+                        opening_book=(
+                            EcoTrie.from_tsv(*args.opening_book)
+                            if args.opening_book
+                            else None
+                        ),
+                        engine_pool=engine_pool,
+                    ),
+                )
+            finally:
+                if engine_pool is not None:
+                    engine_pool.close()
+            print(f"Processed {processed} shards")
+        else:
+            rows = merge_shards(args.work_dir, args.save_location)
+            print(f"Merged {rows} rows into {args.save_location}")
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
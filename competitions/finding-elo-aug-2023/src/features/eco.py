@@ -0,0 +1,110 @@
+import csv
+import hashlib
+import io
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import chess
+from chess.pgn import read_game
+
+
+class EcoNode:
+    """A position in the opening trie, reached by the moves leading to it."""
+
+    __slots__ = ("children", "name")
+
+    def __init__(self):
+        self.children: Dict[str, "EcoNode"] = {}
+        self.name: Optional[str] = None
+
+
+class EcoTrie:
+    """
+    Offline opening book built from an ECO-style table.
+
+    Each line of the table is stored as a path of UCI moves from the starting
+    position, with the opening name on the node where the line ends. Walking
+    a game through the trie answers the same questions as the Lichess
+    explorer (the opening name of a position, and whether any known line
+    continues from it) without touching the network.
+    """
+
+    def __init__(self):
+        self.root = EcoNode()
+
+    @property
+    def key(self) -> str:
+        """
+        Identifies the answers of this book in a `FeatureCache`: a digest of
+        every line and name in the trie.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        stack = [("", self.root)]
+        while stack:
+            line, node = stack.pop()
+            digest.update(f"{line}\t{node.name or ''}\n".encode())
+            for uci in sorted(node.children, reverse=True):
+                stack.append((f"{line} {uci}", node.children[uci]))
+        return f"eco:{digest.hexdigest()}"
+
+    @classmethod
+    def from_tsv(cls, *paths: str) -> "EcoTrie":
+        """
+        Loads one or more tab-separated ECO tables.
+
+        The tables need a `name` column and either a `uci` column with space
+        separated UCI moves or a `pgn` column with SAN movetext, as in the
+        lichess-org/chess-openings files.
+
+        :param paths: The file paths of the tables.
+        :return: The opening trie.
+        """
+        trie = cls()
+        for path in paths:
+            with open(path, newline="") as file:
+                for row in csv.DictReader(file, delimiter="\t"):
+                    trie.add_line(row["name"], row.get("uci") or row["pgn"])
+        return trie
+
+    def add_line(self, name: str, line: str) -> None:
+        """
+        Adds a named opening line.
+
+        :param name: The opening name.
+        :param line: The moves of the line, either as space separated UCI
+        moves or as SAN movetext (with or without move numbers).
+        """
+        node = self.root
+        for uci in self._parse_line(line):
+            node = node.children.setdefault(uci, EcoNode())
+        node.name = name
+
+    @staticmethod
+    def _parse_line(line: str) -> List[str]:
+        tokens = line.split()
+        try:
+            return [chess.Move.from_uci(token).uci() for token in tokens]
+        except ValueError:
+            game = read_game(io.StringIO(line))
+            return [move.uci() for move in game.mainline_moves()]
+
+    def walk(
+        self, moves: Iterable[chess.Move]
+    ) -> Iterator[Tuple[Optional[str], Dict[str, List[str]]]]:
+        """
+        Follows a sequence of moves through the trie.
+
+        For every position before a move, yields the opening name of that
+        position and the known continuations, shaped like the `(name, data)`
+        tuples returned by `get_opening_name`. Once the game leaves the book,
+        positions have no name and no continuations.
+
+        :param moves: The moves of the game, in order.
+        :return: An iterator over the (name, data) of each position.
+        """
+        node = self.root
+        for move in moves:
+            if node is None:
+                yield None, {"moves": []}
+                continue
+            yield node.name, {"moves": list(node.children)}
+            node = node.children.get(move.uci())
@@ -0,0 +1,270 @@
+import asyncio
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import chess
+import chess.engine
+import chess.polyglot
+from src.features.evaluation_cache import EvaluationCache
+from src.features.position_memo import PositionMemo
+from src.features.profiling import active_stats, timed
+
+# Centipawn score given to forced mates, so they stay comparable to material.
+MATE_SCORE = 10_000
+
+# The event loop driving the engines and the idle engines, by process and
+# pool. Every copy of a pool that a process unpickles, e.g. one per task sent
+# to a worker, shares the same engines.
+_RUNNING: Dict[
+    Tuple[int, str, int], Tuple[asyncio.AbstractEventLoop, asyncio.Queue]
+] = {}
+
+
+def terminal_score(board: chess.Board) -> Optional[int]:
+    """
+    Scores a finished position without an engine, from white's point of view.
+
+    :param board: The position.
+    :return: +/-`MATE_SCORE` for checkmate, 0 for other finished games, or
+    None if the game isn't over.
+    """
+    if board.is_checkmate():
+        return -MATE_SCORE if board.turn == chess.WHITE else MATE_SCORE
+    if board.is_game_over():
+        return 0
+    return None
+
+
+class EnginePool:
+    """
+    A pool of local UCI engine processes evaluating positions in parallel.
+
+    `evaluate` takes a batch of positions, e.g. every position of one or
+    more games, drops duplicates and positions already evaluated, and hands
+    the rest to the engines, which are driven concurrently from one event
+    loop. Each engine takes the next position as soon as it is done, so all
+    of them stay busy while the batch has more positions than engines. Run
+    one engine per core, with the engine's own `Threads` option left at 1.
+
+    Evaluations are remembered by the Zobrist hash of the position, in a
+    `PositionMemo` of the last `memory_size` positions and in an optional
+    `EvaluationCache` across runs.
+
+    An engine that fails, dies or takes longer than `timeout` on a position
+    is replaced by a new one, and that position gets no score.
+
+    The engines start on first use. Instances can be pickled: each process
+    that unpickles one, e.g. a worker of `pgn_to_dataframe` with `n_jobs` >
+    1, starts its own engines once and keeps them until `close` or until it
+    exits, so split the cores between workers and engines. The pipeline
+    refuses to run several workers with the default `n_engines`.
+
+    :param command: The command running the engine, e.g. "stockfish", or a
+    list of arguments.
+    :param n_engines: The number of engine processes. Default is None, which
+    runs one per core.
+    :param depth: The search depth of each evaluation.
+    :param nodes: The node budget of each evaluation. Default is a depth of
+    12 when neither is given.
+    :param options: UCI options set on every engine, e.g. {"Hash": 64}.
+    :param cache: Optional persistent evaluation cache.
+    :param memory_size: The number of evaluations remembered in memory.
+    :param timeout: The number of seconds an engine gets per position.
+    """
+
+    def __init__(
+        self,
+        command: Union[str, List[str]],
+        n_engines: Optional[int] = None,
+        depth: Optional[int] = None,
+        nodes: Optional[int] = None,
+        options: Optional[Dict[str, Union[str, int, bool]]] = None,
+        cache: Optional[EvaluationCache] = None,
+        memory_size: int = 100_000,
+        timeout: float = 60.0,
+    ):
+        if depth is None and nodes is None:
+            depth = 12
+        self.command = command
+        self.n_engines = n_engines
+        self.limit = chess.engine.Limit(depth=depth, nodes=nodes)
+        self.options = dict(options or {})
+        self.cache = cache
+        self.timeout = timeout
+        self.evaluations = PositionMemo(memory_size, name="engine.memory")
+        self.hits = 0
+        self.misses = 0
+
+    def __enter__(self) -> "EnginePool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def key(self) -> str:
+        """
+        Identifies the evaluations of this pool in an `EvaluationCache`: the
+        engine command, search limit and options.
+        """
+        command = (
+            self.command if isinstance(self.command, str) else " ".join(self.command)
+        )
+        return json.dumps(
+            [command, self.limit.depth, self.limit.nodes, self.options], sort_keys=True
+        )
+
+    def _running(self) -> Tuple[asyncio.AbstractEventLoop, asyncio.Queue]:
+        """
+        Returns the event loop driving the engines of this process, and the
+        queue of idle engines. Starts them on first use.
+        """
+        running_key = (os.getpid(), self.key, self.n_engines)
+        if running_key not in _RUNNING:
+            # A daemon thread, unlike `SimpleEngine`'s, so worker processes
+            # that never call `close` can still exit. The engines quit when
+            # their input is closed with the process.
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever, name="engine-pool", daemon=True
+            ).start()
+            engines = asyncio.run_coroutine_threadsafe(
+                self._start_engines(), loop
+            ).result()
+            _RUNNING[running_key] = loop, engines
+        return _RUNNING[running_key]
+
+    async def _start_engines(self) -> asyncio.Queue:
+        engines = asyncio.Queue()
+        n_engines = self.n_engines or os.cpu_count() or 1
+        for engine in await asyncio.gather(
+            *(self._start_engine() for _ in range(n_engines))
+        ):
+            engines.put_nowait(engine)
+        return engines
+
+    async def _start_engine(self) -> chess.engine.UciProtocol:
+        _, engine = await chess.engine.popen_uci(self.command)
+        if self.options:
+            await engine.configure(self.options)
+        return engine
+
+    async def _analyse(
+        self, engines: asyncio.Queue, board: chess.Board
+    ) -> Optional[int]:
+        engine = await engines.get()
+        try:
+            info = await asyncio.wait_for(
+                engine.analyse(board, self.limit), self.timeout
+            )
+        except (
+            asyncio.TimeoutError,
+            chess.engine.EngineError,
+            chess.engine.EngineTerminatedError,
+        ) as e:
+            print(f"Error evaluating {board.fen()}: {e!r}")
+            # The engine may be stuck, so it is killed rather than asked to
+            # quit.
+            try:
+                engine.transport.kill()
+            except ProcessLookupError:
+                pass
+            # Only a live engine goes back. If none can be started, the
+            # error ends the batch.
+            engines.put_nowait(await self._start_engine())
+            return None
+
+        engines.put_nowait(engine)
+        score = info.get("score")
+        return None if score is None else score.white().score(mate_score=MATE_SCORE)
+
+    async def _analyse_all(
+        self, engines: asyncio.Queue, boards: Sequence[chess.Board]
+    ) -> List[Optional[int]]:
+        return await asyncio.gather(
+            *(self._analyse(engines, board) for board in boards)
+        )
+
+    def evaluate(self, boards: Sequence[chess.Board]) -> List[Optional[int]]:
+        """
+        Evaluates a batch of positions.
+
+        :param boards: The positions. They are not modified.
+        :return: The score of each position in centipawns from white's point
+        of view, with mates as +/-`MATE_SCORE`, or None where the engine
+        failed.
+        """
+        stats = active_stats()
+        keys = [chess.polyglot.zobrist_hash(board) for board in boards]
+        scores: Dict[int, Optional[int]] = {}
+        missing: Dict[int, chess.Board] = {}
+
+        for key, board in zip(keys, boards):
+            if key in scores or key in missing:
+                continue
+            score = self.evaluations.get(key)
+            if score is not None:
+                scores[key] = score
+                continue
+            score = terminal_score(board)
+            if score is not None:
+                scores[key] = score
+            else:
+                missing[key] = board
+
+        if missing and self.cache is not None:
+            cached = self.cache.get_many(self.key, missing)
+            scores.update(cached)
+            for key in cached:
+                del missing[key]
+
+        self.hits += len(scores)
+        self.misses += len(missing)
+        if stats is not None:
+            stats.count("engine.cache_hits", len(scores))
+            stats.count("engine.evaluations", len(missing))
+
+        if missing:
+            loop, engines = self._running()
+            with timed(stats, "engine.evaluate"):
+                missing_scores = asyncio.run_coroutine_threadsafe(
+                    self._analyse_all(engines, list(missing.values())), loop
+                ).result()
+            computed = {
+                key: score
+                for key, score in zip(missing, missing_scores)
+                if score is not None
+            }
+            if self.cache is not None and computed:
+                self.cache.set_many(self.key, computed)
+            scores.update(computed)
+
+        for key, score in scores.items():
+            if score is not None:
+                self.evaluations.set(key, score)
+
+        return [scores.get(key) for key in keys]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the number of positions answered without and with the engines
+        in this process.
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        """
+        Stops the engines of this process. The pool starts new ones if used
+        again.
+        """
+        running = _RUNNING.pop((os.getpid(), self.key, self.n_engines), None)
+        if running is not None:
+            loop, engines = running
+            asyncio.run_coroutine_threadsafe(self._quit(engines), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+
+    async def _quit(self, engines: asyncio.Queue) -> None:
+        while not engines.empty():
+            await engines.get_nowait().quit()
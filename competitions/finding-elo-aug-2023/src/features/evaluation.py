@@ -0,0 +1,96 @@
+from statistics import fmean
+from typing import Dict, List, Optional, Sequence
+
+import chess
+from src.data.move_store import GameLike
+from src.features.engine_pool import EnginePool
+
+# Evaluations are clamped to this many centipawns before measuring losses,
+# so a move that only shortens a mate, or misses one in a won position,
+# doesn't dominate the average.
+MAX_SCORE = 1_000
+MISTAKE_LOSS = 100
+BLUNDER_LOSS = 300
+
+
+def get_evaluation_features(
+    game: GameLike, engine_pool: Optional[EnginePool] = None
+) -> Dict[str, Optional[float] | int]:
+    """
+    Extracts the average centipawn loss, mistakes and blunders of each player
+    from engine evaluations of every position of the game.
+
+    :param game: A chess game object, or a `GameView` of a compiled move store.
+    :param engine_pool: The engines evaluating the positions.
+    :return: A dictionary containing the extracted features.
+    """
+    return get_batch_evaluation_features([game], engine_pool)[0]
+
+
+def get_batch_evaluation_features(
+    games: Sequence[GameLike], engine_pool: Optional[EnginePool] = None
+) -> List[Dict[str, Optional[float] | int]]:
+    """
+    Extracts the evaluation features of several games, sending the positions
+    of all of them to the engines as one batch.
+
+    :param games: Chess game objects, or `GameView`s of a compiled move store.
+    :param engine_pool: The engines evaluating the positions.
+    :return: The features of each game, as in `get_evaluation_features`.
+    """
+    if engine_pool is None:
+        raise ValueError("Evaluation features need an engine pool")
+
+    positions = []
+    first_turns = []
+    for game in games:
+        board = game.board()
+        first_turns.append(board.turn)
+        game_positions = [board.copy(stack=False)]
+        for move in game.mainline_moves():
+            board.push(move)
+            game_positions.append(board.copy(stack=False))
+        positions.append(game_positions)
+
+    scores = iter(engine_pool.evaluate([board for game in positions for board in game]))
+    return [
+        get_loss_features([next(scores) for _ in game_positions], turn)
+        for game_positions, turn in zip(positions, first_turns)
+    ]
+
+
+def get_loss_features(
+    scores: Sequence[Optional[int]], turn: chess.Color = chess.WHITE
+) -> Dict[str, Optional[float] | int]:
+    """
+    Turns the evaluations of consecutive positions into per-player losses.
+
+    The loss of a move is how much it worsens the evaluation for the player
+    making it, in centipawns, and never negative. Moves next to a position
+    the engine failed to evaluate are left out.
+
+    :param scores: The score of each position from white's point of view,
+    starting with the position before the first move.
+    :param turn: The side to move in the first position.
+    :return: A dictionary with the average centipawn loss of each player (None
+    if they have no evaluated move) and their mistakes and blunders.
+    """
+    losses = {chess.WHITE: [], chess.BLACK: []}
+
+    for before, after in zip(scores, scores[1:]):
+        if before is not None and after is not None:
+            before = max(-MAX_SCORE, min(MAX_SCORE, before))
+            after = max(-MAX_SCORE, min(MAX_SCORE, after))
+            loss = before - after if turn == chess.WHITE else after - before
+            losses[turn].append(max(loss, 0))
+        turn = not turn
+
+    white, black = losses[chess.WHITE], losses[chess.BLACK]
+    return {
+        "wp_acpl": fmean(white) if white else None,
+        "bp_acpl": fmean(black) if black else None,
+        "wp_mistakes": sum(MISTAKE_LOSS <= loss < BLUNDER_LOSS for loss in white),
+        "bp_mistakes": sum(MISTAKE_LOSS <= loss < BLUNDER_LOSS for loss in black),
+        "wp_blunders": sum(loss >= BLUNDER_LOSS for loss in white),
+        "bp_blunders": sum(loss >= BLUNDER_LOSS for loss in black),
+    }
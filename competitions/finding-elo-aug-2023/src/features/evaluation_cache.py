@@ -0,0 +1,74 @@
+from typing import Dict, Iterable
+
+from src.features.sqlite_cache import SqliteCache, chunked
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS evaluations (
+    engine TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    PRIMARY KEY (engine, position)
+) WITHOUT ROWID;
+"""
+
+
+def to_signed(key: int) -> int:
+    """
+    Maps an unsigned 64-bit Zobrist hash to the signed integers SQLite stores.
+    """
+    return key - 2**64 if key >= 2**63 else key
+
+
+class EvaluationCache(SqliteCache):
+    """
+    Persistent cache of engine evaluations stored in SQLite.
+
+    Rows are keyed by (engine key, Zobrist hash of the position) and hold
+    the score in centipawns from white's point of view. The engine key
+    describes the engine and its search limit, so evaluations at different
+    depths never mix.
+
+    :param path: The file path of the SQLite database.
+    """
+
+    schema = SCHEMA
+
+    def get_many(self, engine: str, positions: Iterable[int]) -> Dict[int, int]:
+        """
+        Looks up the cached evaluations of many positions.
+
+        :param engine: The engine key, see `EnginePool.key`.
+        :param positions: The Zobrist hashes of the positions.
+        :return: A dictionary mapping the hashes found to their scores.
+        """
+        positions = list(dict.fromkeys(positions))
+        signed = {to_signed(position): position for position in positions}
+        found = {}
+        for chunk in chunked(list(signed)):
+            rows = self.connection.execute(
+                "SELECT position, score FROM evaluations "
+                f"WHERE engine = ? AND position IN ({', '.join('?' * len(chunk))})",
+                (engine, *chunk),
+            )
+            found.update((signed[position], score) for position, score in rows)
+
+        self.hits += len(found)
+        self.misses += len(positions) - len(found)
+        return found
+
+    def set_many(self, engine: str, scores: Dict[int, int]) -> None:
+        """
+        Stores the evaluations of many positions.
+
+        :param engine: The engine key, see `EnginePool.key`.
+        :param scores: A dictionary mapping Zobrist hashes to scores.
+        """
+        with self.connection:
+            self.connection.execute("BEGIN")
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO evaluations VALUES (?, ?, ?)",
+                (
+                    (engine, to_signed(position), score)
+                    for position, score in scores.items()
+                ),
+            )
@@ -0,0 +1,137 @@
+import json
+import time
+from typing import Dict, Optional, Tuple
+
+from src.features.sqlite_cache import SqliteCache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS explorer (
+    fen TEXT NOT NULL,
+    database TEXT NOT NULL,
+    until TEXT NOT NULL,
+    name TEXT,
+    data TEXT NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (fen, database, until)
+);
+CREATE INDEX IF NOT EXISTS explorer_last_used ON explorer (last_used);
+"""
+
+
+def normalize_fen(fen: str) -> str:
+    """
+    Drops the halfmove clock and fullmove number from a FEN string.
+
+    The explorer answer only depends on the position, side to move, castling
+    rights and en passant square, so positions reached at different move
+    numbers share a cache entry.
+
+    :param fen: The FEN notation string.
+    :return: The first four fields of the FEN.
+    """
+    return " ".join(fen.split(" ")[:4])
+
+
+class ExplorerCache(SqliteCache):
+    """
+    Persistent cache of Lichess explorer answers stored in SQLite.
+
+    Entries are keyed by (normalized FEN, database, until). Once the cache
+    holds more than `max_entries` rows, the least recently used ones are
+    evicted. A hit only records its use when the last one is older than
+    `touch_interval` seconds, so lookups of hot positions don't each take
+    the write lock.
+
+    :param path: The file path of the SQLite database.
+    :param max_entries: The maximum number of cached answers.
+    :param evict_every: The number of inserts between size checks.
+    :param touch_interval: How stale the last use of an entry may get before a
+    hit updates it.
+    """
+
+    schema = SCHEMA
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 1_000_000,
+        evict_every: int = 1_000,
+        touch_interval: float = 3600,
+    ):
+        super().__init__(path)
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self.touch_interval = touch_interval
+        self._inserts = 0
+
+    def get(
+        self, fen: str, database: str, until: str
+    ) -> Optional[Tuple[Optional[str], Dict]]:
+        """
+        Looks up a cached explorer answer.
+
+        :param fen: The FEN notation string.
+        :param database: The explorer database.
+        :param until: The cut-off year for data.
+        :return: The cached (name, data) tuple, or None on a miss.
+        """
+        key = (normalize_fen(fen), database, str(until))
+        row = self.connection.execute(
+            "SELECT name, data, last_used FROM explorer "
+            "WHERE fen = ? AND database = ? AND until = ?",
+            key,
+        ).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        now = time.time()
+        if now - row[2] > self.touch_interval:
+            self.connection.execute(
+                "UPDATE explorer SET last_used = ? "
+                "WHERE fen = ? AND database = ? AND until = ?",
+                (now, *key),
+            )
+        return row[0], json.loads(row[1])
+
+    def set(
+        self, fen: str, database: str, until: str, name: Optional[str], data: Dict
+    ) -> None:
+        """
+        Stores an explorer answer, evicting old entries if the cache is full.
+
+        :param fen: The FEN notation string.
+        :param database: The explorer database.
+        :param until: The cut-off year for data.
+        :param name: The opening name.
+        :param data: The full explorer response.
+        """
+        self.connection.execute(
+            "INSERT OR REPLACE INTO explorer VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                normalize_fen(fen),
+                database,
+                str(until),
+                name,
+                json.dumps(data),
+                time.time(),
+            ),
+        )
+
+        self._inserts += 1
+        if self._inserts % self.evict_every == 0:
+            self.evict()
+
+    def evict(self) -> None:
+        """
+        Deletes the least recently used entries above `max_entries`.
+        """
+        (entries,) = self.connection.execute("SELECT COUNT(*) FROM explorer").fetchone()
+        if entries > self.max_entries:
+            self.connection.execute(
+                "DELETE FROM explorer WHERE rowid IN "
+                "(SELECT rowid FROM explorer ORDER BY last_used LIMIT ?)",
+                (entries - self.max_entries,),
+            )
@@ -0,0 +1,245 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from src.features.explorer_cache import ExplorerCache
+from src.features.opening import BASE_URL, parse_explorer_response
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def retry_after_seconds(value: Optional[str], default: float) -> float:
+    """
+    Reads the wait asked for by a `Retry-After` header.
+
+    :param value: The header, either a number of seconds or an HTTP date.
+    :param default: Returned when the header is missing or unreadable.
+    :return: The number of seconds to wait.
+    """
+    if not value:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max((date - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class TokenBucket:
+    """
+    Asyncio token bucket that spaces requests to a sustained rate.
+
+    Up to `capacity` requests can go out back to back; after that, tokens
+    refill at `rate` per second. `pause` blocks every caller for a while,
+    which is how a 429 from the server slows the whole client down.
+
+    :param rate: The number of requests allowed per second.
+    :param capacity: The maximum burst size.
+    """
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+        # Tokens refill from the end of the pause, not from before it.
+        self.updated = self.paused_until
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ExplorerClient:
+    """
+    Concurrent, rate-limited client for the Lichess opening explorer.
+
+    Requests share one keep-alive `requests.Session` whose connection pool
+    is sized to `max_concurrency`, and run on a thread pool driven by
+    asyncio. The token bucket keeps the client at `rate` requests per second
+    instead of sleeping a fixed time before each one. Responses with status
+    429 or 5xx, and connection errors, are retried with exponential backoff,
+    honouring `Retry-After` when the server sends it. A position that still
+    fails is answered with `(None, {})` and counted in `failures`, so it
+    doesn't sink the rest of its batch.
+
+    :param database: The database to query, default is 'master' as used by
+    `get_opening_features`.
+    :param until: The cut-off year for data, default is '2012'.
+    :param rate: The sustained number of requests per second.
+    :param burst: The number of requests that may be sent back to back.
+    :param max_concurrency: The maximum number of requests in flight.
+    :param max_retries: The number of retries before giving up on a position.
+    :param backoff: The initial retry delay in seconds, doubled on each retry.
+    :param timeout: The timeout of each request in seconds.
+    :param base_url: The explorer URL template, e.g. a local stub server.
+    :param cache: Optional explorer cache checked before, and filled after,
+    every request.
+    """
+
+    def __init__(
+        self,
+        database: str = "master",
+        until: str = "2012",
+        rate: float = 2.0,
+        burst: int = 4,
+        max_concurrency: int = 4,
+        max_retries: int = 5,
+        backoff: float = 1.0,
+        timeout: float = 30.0,
+        base_url: str = BASE_URL,
+        cache: Optional[ExplorerCache] = None,
+    ):
+        self.url = base_url.format(database=database)
+        self.database = database
+        self.until = until
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = cache
+        self.requests_sent = 0
+        self.failures = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def _get(self, fen: str) -> requests.Response:
+        return self.session.get(
+            self.url, params={"fen": fen, "until": self.until}, timeout=self.timeout
+        )
+
+    async def fetch(
+        self,
+        fen: str,
+        bucket: TokenBucket,
+        executor: ThreadPoolExecutor,
+    ) -> Tuple[Optional[str], Dict]:
+        """
+        Resolves a single position, waiting for the rate limiter and retrying.
+
+        :param fen: The FEN notation string.
+        :param bucket: The rate limiter shared by the batch.
+        :param executor: The thread pool that performs the requests.
+        :return: tuple containing the opening name and the full data.
+        """
+        loop = asyncio.get_running_loop()
+        delay = self.backoff
+
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            self.requests_sent += 1
+            try:
+                response = await loop.run_in_executor(executor, self._get, fen)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(delay)
+                delay *= 2
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                wait = retry_after_seconds(response.headers.get("Retry-After"), delay)
+                if response.status_code == 429:
+                    bucket.pause(wait)
+                else:
+                    await asyncio.sleep(wait)
+                delay *= 2
+                continue
+
+            response.raise_for_status()
+            return parse_explorer_response(response)
+
+    async def resolve(
+        self, fens: Iterable[str]
+    ) -> Dict[str, Tuple[Optional[str], Dict]]:
+        """
+        Resolves many positions concurrently.
+
+        Cached positions are answered without a request; the rest are
+        fetched with at most `max_concurrency` requests in flight.
+
+        :param fens: The FEN notation strings. Duplicates are fetched once.
+        :return: A dictionary mapping each FEN to its (name, data) tuple, which
+        is (None, {}) for the positions that could not be fetched.
+        """
+        results = {}
+        pending = []
+        for fen in dict.fromkeys(fens):
+            cached = (
+                self.cache.get(fen, self.database, self.until)
+                if self.cache is not None
+                else None
+            )
+            if cached is not None:
+                results[fen] = cached
+            else:
+                pending.append(fen)
+
+        bucket = TokenBucket(self.rate, self.burst)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def fetch_one(fen: str) -> None:
+            async with semaphore:
+                try:
+                    name, data = await self.fetch(fen, bucket, executor)
+                except requests.RequestException as e:
+                    print(f"Error fetching {fen}: {e}")
+                    self.failures += 1
+                    name, data = None, {}
+            if self.cache is not None and data:
+                self.cache.set(fen, self.database, self.until, name, data)
+            results[fen] = (name, data)
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            await asyncio.gather(*(fetch_one(fen) for fen in pending))
+
+        return results
+
+    def resolve_many(
+        self, fens: Iterable[str]
+    ) -> Dict[str, Tuple[Optional[str], Dict]]:
+        """
+        Blocking wrapper around `resolve` for code that is not async.
+
+        :param fens: The FEN notation strings.
+        :return: A dictionary mapping each FEN to its (name, data) tuple.
+        """
+        return asyncio.run(self.resolve(fens))
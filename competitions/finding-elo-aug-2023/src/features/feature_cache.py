@@ -0,0 +1,99 @@
+import json
+from typing import Dict, Iterable, List
+
+from src.features.sqlite_cache import SqliteCache, chunked
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS features (
+    feature_group TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    options TEXT NOT NULL,
+    game_hash TEXT NOT NULL,
+    features TEXT NOT NULL,
+    PRIMARY KEY (feature_group, version, options, game_hash)
+) WITHOUT ROWID;
+"""
+
+
+class FeatureCache(SqliteCache):
+    """
+    Persistent cache of computed feature groups stored in SQLite.
+
+    Rows are keyed by (feature group, version, options key, game content
+    hash) and hold the values of the group's columns, in order, as JSON. The
+    options key tells apart values computed with different run options, e.g.
+    two opening books, see `FeatureGroup.options_key`. Bumping the version
+    of a group makes its old rows invisible, so they are recomputed; `prune`
+    deletes them.
+
+    :param path: The file path of the SQLite database.
+    """
+
+    schema = SCHEMA
+
+    def get_many(
+        self,
+        group: str,
+        version: int,
+        game_hashes: Iterable[str],
+        options: str = "",
+    ) -> Dict[str, List]:
+        """
+        Looks up the cached values of a feature group for many games.
+
+        :param group: The name of the feature group.
+        :param version: The current version of the group.
+        :param game_hashes: The content hashes of the games.
+        :param options: The options key the values were computed with.
+        :return: A dictionary mapping the hashes found to their column values.
+        """
+        game_hashes = list(dict.fromkeys(game_hashes))
+        found = {}
+        for chunk in chunked(game_hashes):
+            rows = self.connection.execute(
+                "SELECT game_hash, features FROM features "
+                "WHERE feature_group = ? AND version = ? AND options = ? "
+                f"AND game_hash IN ({', '.join('?' * len(chunk))})",
+                (group, version, options, *chunk),
+            )
+            found.update((game_hash, json.loads(values)) for game_hash, values in rows)
+
+        self.hits += len(found)
+        self.misses += len(game_hashes) - len(found)
+        return found
+
+    def set_many(
+        self, group: str, version: int, values: Dict[str, List], options: str = ""
+    ) -> None:
+        """
+        Stores the values of a feature group for many games.
+
+        :param group: The name of the feature group.
+        :param version: The current version of the group.
+        :param values: A dictionary mapping game hashes to column values.
+        :param options: The options key the values were computed with.
+        """
+        with self.connection:
+            self.connection.execute("BEGIN")
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?, ?)",
+                (
+                    (group, version, options, game_hash, json.dumps(row))
+                    for game_hash, row in values.items()
+                ),
+            )
+
+    def prune(self, versions: Dict[str, int]) -> int:
+        """
+        Deletes the rows of outdated group versions.
+
+        :param versions: The current version of each feature group.
+        :return: The number of rows deleted.
+        """
+        deleted = 0
+        for group, version in versions.items():
+            deleted += self.connection.execute(
+                "DELETE FROM features WHERE feature_group = ? AND version != ?",
+                (group, version),
+            ).rowcount
+        return deleted
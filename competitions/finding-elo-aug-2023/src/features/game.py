@@ -1,6 +1,11 @@
-from typing import Dict
+from typing import TYPE_CHECKING, Dict, Optional
 
+import chess
 from chess.pgn import Game
+from src.data.move_store import GameLike
+
+if TYPE_CHECKING:
+    from src.features.ngrams import MoveNgrams
 
 
 def get_game_info(game: Game) -> Dict[str, str | int]:
@@ -135,3 +140,159 @@ def get_castling(game: Game) -> Dict[str, bool]:
         board.push(move)
 
     return {"wp_bool_castles": wp_castles, "bp_bool_castles": bp_castles}
+
+
+class MoveCounters:
+    """
+    Per-player move counters behind `get_game_features`, updated one move at
+    a time.
+
+    Call `count_move` with the board before each mainline move is played and
+    `count_check` with the board after it, then `features` once the game is
+    over. Keeping the counters outside the replay loop lets a PGN visitor
+    fill them while the moves are parsed.
+    """
+
+    __slots__ = (
+        "wp_moves",
+        "bp_moves",
+        "wp_checks",
+        "bp_checks",
+        "wp_captures",
+        "bp_captures",
+        "wp_promotions",
+        "bp_promotions",
+        "wp_castles",
+        "bp_castles",
+        "total_moves",
+        "turn",
+    )
+
+    cols = ["P", "N", "B", "R", "Q", "K"]
+
+    def __init__(self):
+        self.wp_moves = {col: 0 for col in self.cols}
+        self.bp_moves = {col: 0 for col in self.cols}
+        self.wp_checks = self.bp_checks = 0
+        self.wp_captures = self.bp_captures = 0
+        self.wp_promotions = self.bp_promotions = 0
+        self.wp_castles = self.bp_castles = False
+        self.total_moves = 0
+        self.turn = True
+
+    def count_move(self, board: chess.Board, move: chess.Move) -> None:
+        """
+        Counts a move before it is played.
+
+        :param board: The board before the move.
+        :param move: The move about to be played.
+        """
+        turn = self.turn = board.turn
+        piece_entity = board.piece_at(move.from_square)
+        if piece_entity:  # Check to ensure a piece exists at the square
+            piece = piece_entity.symbol().upper()
+            if turn:
+                self.wp_moves[piece] += 1
+            else:
+                self.bp_moves[piece] += 1
+
+        if board.is_capture(move):
+            self.wp_captures += turn
+            self.bp_captures += not turn
+
+        if move.promotion is not None:
+            self.wp_promotions += turn
+            self.bp_promotions += not turn
+
+        if board.is_castling(move):
+            self.wp_castles |= turn
+            self.bp_castles |= not turn
+
+        self.total_moves += 1
+
+    def count_check(self, board: chess.Board) -> None:
+        """
+        Counts a check given by the last counted move.
+
+        :param board: The board after the move.
+        """
+        if board.is_check():
+            self.wp_checks += self.turn
+            self.bp_checks += not self.turn
+
+    def features(self, result: str) -> Dict[str, str | int | bool]:
+        """
+        Builds the feature columns of `get_game_features`.
+
+        :param result: The result of the game, e.g. "1-0".
+        :return: A dictionary containing the extracted features.
+        """
+        white_won = None
+        if result == "1-0":
+            white_won = True
+        elif result == "0-1":
+            white_won = False
+
+        total_moves = self.total_moves
+        white_moves = (total_moves // 2) + (total_moves % 2)
+        black_moves = white_moves if white_won is None else white_moves - int(white_won)
+
+        return {
+            "result": result,
+            "total_moves": total_moves,
+            "wp_total_moves": white_moves,
+            "bp_total_moves": black_moves,
+        } | self.counts()
+
+    def counts(self) -> Dict[str, int | bool]:
+        """
+        Builds the piece move, check, capture, promotion and castling columns,
+        which don't depend on the result.
+
+        :return: A dictionary containing the counters.
+        """
+        return (
+            {f"wp_total_{col}_moves": self.wp_moves[col] for col in self.cols}
+            | {f"bp_total_{col}_moves": self.bp_moves[col] for col in self.cols}
+            | {
+                "wp_total_checks": self.wp_checks,
+                "bp_total_checks": self.bp_checks,
+                "wp_total_captures": self.wp_captures,
+                "bp_total_captures": self.bp_captures,
+                "wp_total_promotions": self.wp_promotions,
+                "bp_total_promotions": self.bp_promotions,
+                "wp_bool_castles": self.wp_castles,
+                "bp_bool_castles": self.bp_castles,
+            }
+        )
+
+
+def get_game_features(
+    game: GameLike, ngrams: Optional["MoveNgrams"] = None
+) -> Dict[str, str | int | bool]:
+    """
+    Extracts the general information, piece moves, checks, captures, promotions
+    and castling features in a single replay of the game.
+
+    Returns the same columns as calling `get_game_info`, `get_piece_moves`,
+    `get_checks`, `get_captures`, `get_promotions` and `get_castling` one after
+    the other, but only walks the mainline once.
+
+    :param game: A chess game object, or a `GameView` of a compiled move store.
+    :param ngrams: Optional move n-grams, which get a row for the game from
+    the same replay.
+    :return: A dictionary containing the extracted features.
+    """
+    counters = MoveCounters()
+    board = game.board()
+
+    for move in game.mainline_moves():
+        counters.count_move(board, move)
+        if ngrams is not None:
+            ngrams.add_move(board, move)
+        board.push(move)
+        counters.count_check(board)
+
+    if ngrams is not None:
+        ngrams.end_game()
+    return counters.features(game.headers["Result"])
@@ -0,0 +1,181 @@
+import re
+from functools import partial
+from typing import Callable, Dict, Iterable, Iterator, Optional, TextIO, Tuple, Union
+
+import pandas as pd
+from chess.pgn import (
+    SKIP,
+    Game,
+    GameBuilder,
+    Headers,
+    SkipType,
+    read_game,
+    read_headers,
+)
+from src.data.pgn_index import PgnIndex
+from tqdm import tqdm
+
+HeaderPredicate = Callable[[Headers], bool]
+
+# Returned by `read_filtered_game` for games rejected by the header filter.
+SKIPPED = object()
+
+DEFAULT_TAGS = ("Event", "Site", "Date", "Result")
+
+
+def rating_between(
+    low: Optional[int] = None, high: Optional[int] = None
+) -> HeaderPredicate:
+    """
+    Accepts games where both players are rated within a range.
+
+    :param low: The lowest accepted rating, inclusive. Default is no limit.
+    :param high: The highest accepted rating, inclusive. Default is no limit.
+    :return: The header predicate. Games with a missing or non-numeric
+    rating are rejected.
+    """
+    return partial(_rating_between, low, high)
+
+
+def result_in(*results: str) -> HeaderPredicate:
+    """
+    Accepts games with one of the given results, e.g. "1-0" or "1/2-1/2".
+    """
+    return partial(_result_in, results)
+
+
+def event_matches(pattern: str) -> HeaderPredicate:
+    """
+    Accepts games whose Event tag matches a regular expression.
+    """
+    return partial(_event_matches, re.compile(pattern))
+
+
+def all_of(*predicates: HeaderPredicate) -> HeaderPredicate:
+    """
+    Accepts games accepted by every given predicate.
+    """
+    return partial(_all_of, predicates)
+
+
+# The predicates are partials of module-level functions, rather than
+# closures, so they can be pickled and sent to worker processes.
+def _rating_between(low: Optional[int], high: Optional[int], headers: Headers) -> bool:
+    for tag in ("WhiteElo", "BlackElo"):
+        try:
+            rating = int(headers.get(tag, ""))
+        except ValueError:
+            return False
+        if (low is not None and rating < low) or (high is not None and rating > high):
+            return False
+    return True
+
+
+def _result_in(results: Tuple[str, ...], headers: Headers) -> bool:
+    return headers.get("Result") in results
+
+
+def _event_matches(regex: re.Pattern, headers: Headers) -> bool:
+    return regex.search(headers.get("Event", "")) is not None
+
+
+def _all_of(predicates: Tuple[HeaderPredicate, ...], headers: Headers) -> bool:
+    return all(predicate(headers) for predicate in predicates)
+
+
+class FilteredGameBuilder(GameBuilder):
+    """
+    Game builder that only parses the movetext of games passing a header filter.
+
+    Rejected games are skipped by the fast path of `chess.pgn.read_game`,
+    which scans the movetext without parsing moves or building nodes.
+    """
+
+    def __init__(self, predicate: HeaderPredicate):
+        super().__init__()
+        self.predicate = predicate
+        self.skipped = False
+
+    def end_headers(self) -> Optional[SkipType]:
+        if not self.predicate(self.game.headers):
+            self.skipped = True
+            return SKIP
+        return None
+
+    def result(self) -> Union[Game, object]:
+        return SKIPPED if self.skipped else self.game
+
+
+def read_filtered_game(
+    handle: TextIO, predicate: Optional[HeaderPredicate]
+) -> Union[Game, object, None]:
+    """
+    Reads the next game, parsing its moves only if its headers pass a filter.
+
+    :param handle: The PGN file opened in text mode.
+    :param predicate: The header filter. None accepts every game.
+    :return: The game, `SKIPPED` if it was rejected, or None at the end of the file.
+    """
+    if predicate is None:
+        return read_game(handle)
+    return read_game(handle, Visitor=lambda: FilteredGameBuilder(predicate))
+
+
+def iter_headers(
+    handle: TextIO, predicate: Optional[HeaderPredicate] = None
+) -> Iterator[Headers]:
+    """
+    Yields the headers of every game without parsing any movetext.
+
+    :param handle: The PGN file opened in text mode.
+    :param predicate: Optional header filter.
+    :return: An iterator over the headers of the accepted games.
+    """
+    for headers in iter(lambda: read_headers(handle), None):
+        if predicate is None or predicate(headers):
+            yield headers
+
+
+def headers_to_row(headers: Headers, tags: Iterable[str]) -> Dict[str, str]:
+    """
+    Builds a row with the rating columns of `get_player_ratings` plus other tags.
+    """
+    row = {
+        "wp_rating": headers.get("WhiteElo"),
+        "bp_rating": headers.get("BlackElo"),
+    }
+    row.update({tag: headers.get(tag) for tag in tags})
+    return row
+
+
+def scan_headers(
+    pgn_file: str,
+    tags: Iterable[str] = DEFAULT_TAGS,
+    predicate: Optional[HeaderPredicate] = None,
+) -> pd.DataFrame:
+    """
+    Reads the rating and metadata columns of a PGN file without parsing moves.
+
+    Parameters:
+    pgn_file (str):
+        The file path of the PGN file.
+    tags (Iterable[str]):
+        The header tags to include as columns, besides wp_rating and bp_rating.
+    predicate (Optional[HeaderPredicate]):
+        Optional header filter. Only accepted games are returned.
+
+    Returns:
+    pd.DataFrame: One row per accepted game.
+    """
+
+    tags = list(tags)
+    total_games = len(PgnIndex.open(pgn_file))
+    with open(pgn_file) as pgn:
+        rows = [
+            headers_to_row(headers, tags)
+            for headers in tqdm(
+                iter_headers(pgn), total=total_games, desc="Scanning headers"
+            )
+            if predicate is None or predicate(headers)
+        ]
+    return pd.DataFrame(rows, columns=["wp_rating", "bp_rating", *tags])
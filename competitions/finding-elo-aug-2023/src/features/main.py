@@ -1,22 +1,108 @@
-import gc
+import io
 import os
-from typing import Dict, List, Optional, Union
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass, replace
+from functools import partial
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Optional, TextIO, Tuple, Union
 
+import numpy as np
 import pandas as pd
-from chess.pgn import Game, read_game
-from src.features.game import (
-    get_captures,
-    get_castling,
-    get_checks,
-    get_game_info,
-    get_piece_moves,
-    get_promotions,
+from src.data.checkpoint import read_checkpoint, write_checkpoint
+from src.data.compressed import CompressedPgnReader, is_compressed, open_decompressed
+from src.data.move_store import GameLike
+from src.data.pgn_index import PgnIndex
+from src.data.sinks import OutputSink, make_sink, pa
+from src.features.eco import EcoTrie
+from src.features.engine_pool import EnginePool
+from src.features.evaluation import get_batch_evaluation_features
+from src.features.explorer_cache import ExplorerCache
+from src.features.headers import SKIPPED, HeaderPredicate, read_filtered_game
+from src.features.ngrams import MoveNgrams, sp
+from src.features.opening_table import OpeningTable
+from src.features.position_memo import PositionMemo
+from src.features.profiling import PipelineStats, activated, timed
+from src.features.registry import (
+    FeatureGroup,
+    extract_features,
+    get_dtypes,
+    get_feature_groups,
 )
-from src.features.opening import get_opening_features
-from src.features.players import get_player_ratings
-from src.features.utils import count_games_in_pgn
+from src.features.schema import Dtype, FrameBuilder, apply_dtypes
+from src.features.utils import split_pgn
+from src.features.visitor import read_game_features
 from tqdm import tqdm
 
+BATCH_FORMATS = ("pandas", "arrow", "numpy")
+
+# The number of games whose positions are sent to the engines together.
+EVALUATION_BATCH_GAMES = 64
+
+
+@dataclass
+class PipelineOptions:
+    """
+    The optional resources of a run, passed as one through every stage of the
+    pipeline, from `pgn_to_dataframe` down to `extract_game_data`.
+
+    Workers started with n_jobs > 1 get a copy of them. Caches open their own
+    connections there, engine pools start their own engines, and the stats of
+    each worker are merged into the parent's.
+
+    Attributes:
+    opening_cache (Optional[ExplorerCache]):
+        Persistent cache for the explorer lookups behind the opening features.
+        Default is None, which queries the explorer for every position.
+    opening_book (Optional[EcoTrie]):
+        Offline opening book used for the opening features instead of the
+        Lichess explorer. Default is None.
+    opening_table (Optional[OpeningTable]):
+        Explorer answers resolved once for the whole corpus, used for the
+        opening features instead of per-game explorer calls. Default is None.
+    header_filter (Optional[HeaderPredicate]):
+        Predicate on the game headers, e.g. `rating_between(2000, 2400)`.
+        Games it rejects are skipped without parsing their moves and produce
+        no row. Default is None, which keeps every game.
+    stats (Optional[PipelineStats]):
+        Optional stats collecting the time spent parsing, in each feature
+        group, in explorer requests and writing the output, plus explorer
+        cache hits. `pgn_to_dataframe` shows them in the progress bar at
+        every save interval, and `stats.dump("report.json")` writes them out
+        after the run. Default is None.
+    engine_pool (Optional[EnginePool]):
+        Local UCI engines evaluating every position, for the average
+        centipawn loss, mistakes and blunders of each player. With n_jobs >
+        1, each worker starts n_engines of them, which must be set. Default
+        is None, which leaves these columns out.
+    position_memo (Optional[PositionMemo]):
+        Memo of the FEN and SAN of opening positions, shared across
+        games. Pays off when openings repeat often, e.g. on large
+        corpora. Default is None, which computes them for every game.
+    """
+
+    opening_cache: Optional[ExplorerCache] = None
+    opening_book: Optional[EcoTrie] = None
+    opening_table: Optional[OpeningTable] = None
+    header_filter: Optional[HeaderPredicate] = None
+    stats: Optional[PipelineStats] = None
+    engine_pool: Optional[EnginePool] = None
+    position_memo: Optional[PositionMemo] = None
+
+    def feature_options(self) -> Dict:
+        """
+        Returns the run options of the feature groups, see `FeatureGroup`.
+        """
+
+        return {
+            "cache": self.opening_cache,
+            "opening_book": self.opening_book,
+            "opening_table": self.opening_table,
+            "engine_pool": self.engine_pool,
+            "position_memo": self.position_memo,
+        }
+
 
 def pgn_to_dataframe(
     pgn_file: str,
@@ -24,10 +110,24 @@ def pgn_to_dataframe(
     save_to_file: bool = True,
     save_interval: int = 100,
     save_location: str = "./data/interim/output.csv",
+    n_jobs: int = 1,
+    sink: Optional[OutputSink] = None,
+    options: Optional[PipelineOptions] = None,
+    incremental: bool = False,
 ) -> Optional[pd.DataFrame]:
     """
     Converts a PGN file to a Pandas DataFrame with
-    an option to save intermittently to CSV.
+    an option to save intermittently to CSV, Parquet or Arrow.
+
+    Every save also writes a checkpoint next to the output, so an interrupted
+    run resumes from the next unprocessed game without re-reading the output
+    or re-parsing the games before it. Parquet and Arrow outputs are only
+    checkpointed when a save closes one of their parts, see `ParquetSink`.
+
+    With `incremental`, the same holds for a PGN that was appended to since
+    the last run: only the new games are processed, their rows are appended
+    to the output, and only the new bytes are scanned for the game index. A
+    PGN that was truncated or rewritten is processed again from scratch.
 
     Parameters:
     pgn_file (str):
@@ -35,51 +135,124 @@ def pgn_to_dataframe(
     save_interval (int):
         The number of games processed before saving to CSV. Default is 100.
     save_location (str):
-        The location to save the DataFrame as CSV. Default is "./../../output.csv".
+        The location to save the DataFrame. A `.parquet` location saves typed
+        Parquet row groups and `.arrow`/`.feather` saves Arrow IPC batches
+        instead of CSV. Default is "./data/interim/output.csv".
     include_opening_cols (bool):
         Flag to determine whether to include opening features. Default is True.
     save_to_file (bool):
         Flag to control whether to write the DataFrame to a CSV file. Default is True.
+    n_jobs (int):
+        The number of worker processes. With more than one, the PGN is split
+        into game-aligned byte ranges that are processed in parallel and merged
+        back in the original game order. Default is 1.
+    sink (Optional[OutputSink]):
+        The sink to save to. Default is None, which picks one from the
+        extension of save_location.
+    options (Optional[PipelineOptions]):
+        The caches, opening book or table, header filter, stats, engines and
+        memo of the run, see `PipelineOptions`. Default is None, which uses
+        none of them.
+    incremental (bool):
+        Whether to treat the PGN as append-only, e.g. a dump that grows every
+        day, and pick up the games added since the last run instead of
+        starting over when it changes. Only for uncompressed PGN files saved
+        to a file. Default is False.
 
     Returns:
     Optional[pd.DataFrame]: The resulting DataFrame if successful, None otherwise.
     """
 
-    games = []
     start_game = 0
-
-    # Check if save_location already has data and find out where we left off.
-    if os.path.exists(save_location):
-        try:
-            existing_df = pd.read_csv(save_location)
-            start_game = len(existing_df)
-        except Exception as e:
-            print(f"Error reading existing DataFrame: {e}")
+    options = PipelineOptions() if options is None else options
+    stats = options.stats
 
     try:
-        with open(pgn_file) as pgn:
-            total_games = count_games_in_pgn(pgn_file)
-            remaining_games = total_games - start_game
-            progress_bar = tqdm(
-                iter(lambda: read_game(pgn), None),
-                total=remaining_games,
-                desc="Processing games",
+        sink = make_sink(save_location) if sink is None else sink
+        compressed = is_compressed(pgn_file)
+        if incremental and compressed:
+            raise ValueError("Incremental runs need an uncompressed PGN file")
+        index = None if compressed or incremental else PgnIndex.open(pgn_file)
+        pgn_offset = 0
+
+        # Check if save_location already has data and find out where we left off.
+        if save_to_file and sink.exists():
+            start_game, pgn_offset = find_resume_point(
+                pgn_file, sink, index, incremental
             )
+        if incremental:
+            # Games before the watermark are indexed already.
+            index = PgnIndex.open(pgn_file, unchanged_prefix=pgn_offset)
 
-            for game_idx, game in enumerate(progress_bar, start=start_game):
-                game_data = extract_game_data(game, include_opening_cols)
-                games.append(game_data)
+        # Rows go straight into typed column buffers: one save interval at a
+        # time, or the whole table when nothing is saved.
+        dtypes = get_output_dtypes(
+            include_opening_cols, options.engine_pool is not None
+        )
+        if save_to_file:
+            games = FrameBuilder(dtypes, capacity=save_interval)
+        else:
+            remaining_games = None if index is None else len(index) - start_game
+            games = FrameBuilder(dtypes, capacity=remaining_games or 1_024)
 
-                if save_to_file and (
-                    (game_idx + 1) % save_interval == 0 or game_idx == total_games - 1
-                ):
-                    save_games_to_csv(games, save_location)
-                    games.clear()
-                    gc.collect()
+        with ExitStack() as stack:
+            reader = None
+            if compressed:
+                # Compressed files are decompressed in a pipeline and never
+                # counted up front, so progress is in compressed bytes.
+                reader = CompressedPgnReader(pgn_file, skip_games=start_game)
+                game_rows = iter_compressed_game_data(
+                    reader, include_opening_cols, n_jobs, options
+                )
+                progress_bar = stack.enter_context(
+                    tqdm(
+                        total=os.path.getsize(pgn_file),
+                        unit="B",
+                        unit_scale=True,
+                        desc="Processing games",
+                    )
+                )
+            else:
+                if n_jobs > 1:
+                    game_rows = iter_game_data_parallel(
+                        pgn_file, include_opening_cols, n_jobs, start_game, options
+                    )
+                else:
+                    pgn = stack.enter_context(open(pgn_file))
+                    pgn.seek(pgn_offset)
+                    game_rows = iter_game_rows(pgn, include_opening_cols, options)
+                game_rows = progress_bar = tqdm(
+                    game_rows,
+                    total=len(index) - start_game,
+                    desc="Processing games",
+                )
 
-            final_df = (
-                pd.DataFrame(games) if not save_to_file else pd.read_csv(save_location)
-            )
+            games_processed = saved_games = start_game
+            for games_processed, game_data in enumerate(
+                game_rows, start=start_game + 1
+            ):
+                if game_data is not None:
+                    games.append(game_data)
+                if reader is not None:
+                    progress_bar.update(reader.position - progress_bar.n)
+
+                if games_processed % save_interval == 0:
+                    if save_to_file:
+                        save_games(sink, games, pgn_file, games_processed, index, stats)
+                        saved_games = games_processed
+                    if stats is not None:
+                        progress_bar.set_postfix(stats.postfix(), refresh=False)
+
+            if save_to_file and (games_processed > saved_games or not sink.committed):
+                save_games(
+                    sink, games, pgn_file, games_processed, index, stats, final=True
+                )
+            if stats is not None:
+                progress_bar.set_postfix(stats.postfix(), refresh=False)
+
+            if not save_to_file:
+                return games.to_frame()
+            final_df = apply_dtypes(sink.read(), dtypes)
             return final_df
 
     except Exception as e:
@@ -87,65 +260,627 @@ def pgn_to_dataframe(
         return None
 
 
+def save_games(
+    sink: OutputSink,
+    games: FrameBuilder,
+    pgn_file: str,
+    games_processed: int,
+    index: Optional[PgnIndex] = None,
+    stats: Optional[PipelineStats] = None,
+    final: bool = False,
+) -> None:
+    """
+    Writes the pending rows to a sink, checkpoints the run and clears them.
+
+    Write errors are raised before the checkpoint moves, so a failed save
+    ends the run and the next one resumes from the last saved game. Rows the
+    sink holds back are checkpointed by the save that commits them.
+
+    Parameters:
+    sink (OutputSink):
+        The sink to write to.
+    games (FrameBuilder):
+        The rows extracted since the last save. Emptied once written.
+    pgn_file (str):
+        The file path of the PGN file being converted.
+    games_processed (int):
+        The number of games read from the PGN so far, including the games
+        rejected by the header filter.
+    index (Optional[PgnIndex]):
+        The game index of the PGN file, which gives the byte offset to resume
+        from. Default is None, for compressed files, which are resumed by
+        skipping games instead.
+    stats (Optional[PipelineStats]):
+        Optional stats collecting the write time. Default is None.
+    final (bool):
+        Whether this is the last save of the run, which closes the sink.
+        Default is False.
+    """
+
+    with timed(stats, "write"):
+        if games:
+            sink.write(games.to_frame())
+        if final:
+            sink.close()
+        # Only reached once the rows are saved.
+        if not sink.committed:
+            return
+        pgn_offset = last_game_offset = 0
+        if index is not None:
+            indexed_games = min(games_processed, len(index))
+            pgn_offset = index.offset(indexed_games)
+            last_game_offset = index.offset(max(indexed_games - 1, 0))
+        write_checkpoint(
+            sink.save_location,
+            pgn_file,
+            games_processed,
+            pgn_offset,
+            sink.size(),
+            last_game_offset,
+        )
+
+
+def iter_game_features(
+    pgn_file: str,
+    batch_size: int = 10_000,
+    include_opening_cols: bool = True,
+    batch_format: str = "pandas",
+    n_jobs: int = 1,
+    options: Optional[PipelineOptions] = None,
+) -> Iterator[Union[pd.DataFrame, "pa.RecordBatch", Dict[str, np.ndarray]]]:
+    """
+    Yields the features of a PGN file in batches, without saving them or
+    building the full table.
+
+    At most `batch_size` rows are held at a time (plus, with several jobs,
+    the shards being processed ahead), so the batches can be fed straight
+    into model training or a writer.
+
+    Parameters:
+    pgn_file (str):
+        The file path of the PGN file to be converted.
+    batch_size (int):
+        The number of rows per batch. The last batch may be smaller.
+        Default is 10,000.
+    include_opening_cols (bool):
+        Flag to determine whether to include opening features. Default is True.
+    batch_format (str):
+        "pandas" for DataFrames, "arrow" for `pyarrow.RecordBatch`es or
+        "numpy" for dictionaries of arrays by column. Default is "pandas".
+    n_jobs (int):
+        The number of worker processes. Default is 1.
+    options (Optional[PipelineOptions]):
+        The optional resources of the run, see `PipelineOptions`. Default is
+        None.
+
+    Returns:
+    Iterator[Union[pd.DataFrame, pa.RecordBatch, Dict[str, np.ndarray]]]: The
+    feature batches, in game order.
+    """
+
+    if batch_format not in BATCH_FORMATS:
+        raise ValueError(f"batch_format must be one of {BATCH_FORMATS}")
+    if batch_format == "arrow" and pa is None:
+        raise ImportError("pyarrow is required for Arrow batches")
+
+    options = PipelineOptions() if options is None else options
+    rows = FrameBuilder(
+        get_output_dtypes(include_opening_cols, options.engine_pool is not None),
+        capacity=batch_size,
+    )
+    with ExitStack() as stack:
+        if is_compressed(pgn_file):
+            game_rows = iter_compressed_game_data(
+                CompressedPgnReader(pgn_file), include_opening_cols, n_jobs, options
+            )
+        elif n_jobs > 1:
+            game_rows = iter_game_data_parallel(
+                pgn_file,
+                include_opening_cols,
+                n_jobs,
+                0,
+                options,
+                max_shard_games=batch_size,
+            )
+        else:
+            game_rows = iter_game_rows(
+                stack.enter_context(open(pgn_file)), include_opening_cols, options
+            )
+
+        for game_data in game_rows:
+            if game_data is None:
+                continue
+            rows.append(game_data)
+            if len(rows) == batch_size:
+                yield make_batch(rows.to_frame(), batch_format)
+
+    if rows:
+        yield make_batch(rows.to_frame(), batch_format)
+
+
+def iter_ngram_features(
+    pgn_file: str,
+    ngrams: Optional[MoveNgrams] = None,
+    batch_size: int = 10_000,
+    header_filter: Optional[HeaderPredicate] = None,
+    stats: Optional[PipelineStats] = None,
+) -> Iterator[Tuple[pd.DataFrame, "sp.csr_matrix"]]:
+    """
+    Yields the game features of a PGN file in batches, along with the hashed
+    move n-grams of the same games as a sparse matrix.
+
+    Games are parsed with `GameFeatureVisitor`, so the counters and the
+    n-grams come from a single pass over the moves, and no vocabulary is
+    kept between batches. Save each matrix as it comes, e.g. with
+    `scipy.sparse.save_npz`, to keep memory bounded by the batch size.
+
+    Parameters:
+    pgn_file (str):
+        The file path of the PGN file, which may be compressed.
+    ngrams (Optional[MoveNgrams]):
+        The n-gram settings. Default is None, which hashes UCI unigrams and
+        bigrams into 2**20 columns.
+    batch_size (int):
+        The number of rows per batch. Default is 10,000.
+    header_filter (Optional[HeaderPredicate]):
+        Predicate on the game headers. Rejected games have no row in either
+        output. Default is None.
+    stats (Optional[PipelineStats]):
+        Optional stats collecting the parse time. Default is None.
+
+    Returns:
+    Iterator[Tuple[pd.DataFrame, sp.csr_matrix]]: The player and game
+    features of each batch, and its n-gram counts with one row per game.
+    """
+
+    ngrams = MoveNgrams() if ngrams is None else ngrams
+    rows = FrameBuilder(get_output_dtypes(False), capacity=batch_size)
+
+    with ExitStack() as stack:
+        if is_compressed(pgn_file):
+            raw = stack.enter_context(open(pgn_file, "rb"))
+            pgn = io.TextIOWrapper(open_decompressed(raw, pgn_file))
+        else:
+            pgn = stack.enter_context(open(pgn_file))
+
+        while True:
+            with timed(stats, "parse"):
+                parsed = read_game_features(pgn, header_filter, ngrams)
+            if parsed is None:
+                break
+            if parsed is SKIPPED:
+                continue
+            rows.append(parsed)
+            if len(rows) == batch_size:
+                yield rows.to_frame(), ngrams.to_csr()
+
+    if rows:
+        yield rows.to_frame(), ngrams.to_csr()
+
+
+def make_batch(
+    df: pd.DataFrame, batch_format: str
+) -> Union[pd.DataFrame, "pa.RecordBatch", Dict[str, np.ndarray]]:
+    """
+    Converts a typed batch of rows to one of the `BATCH_FORMATS`.
+    """
+
+    if batch_format == "arrow":
+        return pa.RecordBatch.from_pandas(df, preserve_index=False)
+    if batch_format == "numpy":
+        return {col: df[col].to_numpy() for col in df.columns}
+    return df
+
+
+def find_resume_point(
+    pgn_file: str,
+    sink: OutputSink,
+    index: Optional[PgnIndex],
+    incremental: bool = False,
+) -> Tuple[int, int]:
+    """
+    Finds the first game that is not saved in an existing output yet.
+
+    Uses the checkpoint written with the last save when it matches the PGN,
+    truncating any rows appended after it. Outputs without a valid
+    checkpoint fall back to counting their rows, or are emptied in
+    incremental runs, since the PGN they came from may be gone.
+
+    Parameters:
+    pgn_file (str):
+        The file path of the PGN file being converted.
+    sink (OutputSink):
+        The sink holding the existing output.
+    index (Optional[PgnIndex]):
+        The game index of the PGN file, or None for compressed files, which
+        have no byte offsets to resume from.
+    incremental (bool):
+        Whether to accept a checkpoint written before the PGN was appended
+        to. Default is False.
+
+    Returns:
+    Tuple[int, int]: The position of the next game and its byte offset in the PGN.
+    """
+
+    checkpoint = read_checkpoint(sink.save_location, pgn_file, incremental)
+    if checkpoint is not None and checkpoint["output_size"] <= sink.size():
+        # Drop rows that were written after the checkpoint, e.g. by a crash
+        # between saving the output and writing the checkpoint.
+        sink.truncate(checkpoint["output_size"])
+        return checkpoint["games_processed"], checkpoint["pgn_offset"]
+
+    if incremental:
+        print("PGN file was truncated or rewritten, rebuilding the output")
+        sink.truncate(0)
+        return 0, 0
+
+    if index is None:
+        return sink.count_rows(), 0
+
+    start_game = min(sink.count_rows(), len(index))
+    return start_game, index.offset(start_game)
+
+
 def extract_game_data(
-    game: Game, include_opening_cols: bool
+    game: GameLike,
+    include_opening_cols: bool,
+    options: Optional[PipelineOptions] = None,
 ) -> Dict[str, Union[str, int, float]]:
     """
     Extracts relevant information from a chess game.
 
     Parameters:
-    game (Game):
-        A chess game object.
+    game (GameLike):
+        A chess game object, or a `GameView` of a compiled `MoveStore`.
     include_opening_cols (bool):
         Flag to determine whether to include opening features.
+    options (Optional[PipelineOptions]):
+        The optional resources of the run, see `PipelineOptions`. The header
+        filter is not applied here. Default is None.
 
     Returns:
     Dict[str, Union[str, int, float]]: A dictionary containing extracted game data.
     """
 
-    player_ratings = get_player_ratings(game)
-    game_info = get_game_info(game)
-    piece_moves = get_piece_moves(game)
-    check_counts = get_checks(game)
-    capture_counts = get_captures(game)
-    promotion_counts = get_promotions(game)
-    castling_counts = get_castling(game)
-
-    game_data = {
-        **player_ratings,
-        **game_info,
-        **piece_moves,
-        **check_counts,
-        **capture_counts,
-        **promotion_counts,
-        **castling_counts,
-    }
+    options = PipelineOptions() if options is None else options
+    groups = get_output_groups(include_opening_cols, options.engine_pool is not None)
+
+    with activated(options.stats):
+        return extract_features(game, groups, options.feature_options(), options.stats)
 
+
+def get_output_groups(
+    include_opening_cols: bool, include_evaluation_cols: bool = False
+) -> List[FeatureGroup]:
+    """
+    Returns the feature groups behind the rows of `extract_game_data`.
+    """
+
+    groups = ["players", "game"]
     if include_opening_cols:
-        opening_features = get_opening_features(game)
-        game_data = {**game_data, **opening_features}
+        groups.append("opening")
+    if include_evaluation_cols:
+        groups.append("evaluation")
+    return get_feature_groups(groups)
 
-    return game_data
 
+def get_output_dtypes(
+    include_opening_cols: bool, include_evaluation_cols: bool = False
+) -> Dict[str, Dtype]:
+    """
+    Returns the declared dtype of every output column, in column order.
+    """
 
-def save_games_to_csv(
-    games: List[Dict[str, Union[str, int, float]]], save_location: str
-) -> None:
+    return get_dtypes(get_output_groups(include_opening_cols, include_evaluation_cols))
+
+
+def iter_game_rows(
+    handle: TextIO,
+    include_opening_cols: bool,
+    options: Optional[PipelineOptions] = None,
+) -> Iterator[Optional[Dict[str, Union[str, int, float]]]]:
     """
-    Saves a list of games to a CSV file.
+    Extracts the data of every game read from an open PGN file.
+
+    Without opening or evaluation features, games are parsed with
+    `GameFeatureVisitor`, which computes the row while reading the moves
+    instead of building the game tree first. The opening and evaluation
+    features need the full game. With evaluation features, the positions of
+    `EVALUATION_BATCH_GAMES` games at a time are sent to the engines as one
+    batch, so they stay busy across game boundaries and positions shared by
+    several games are evaluated once.
 
     Parameters:
-    games (List[Dict[str, Union[str, int, float]]]):
-        A list of games represented as dic.
-    save_location (str):
-        The location to save the CSV file.
+    handle (TextIO):
+        The PGN file opened in text mode.
+    include_opening_cols (bool):
+        Flag to determine whether to include opening features.
+    options (Optional[PipelineOptions]):
+        The optional resources of the run, see `PipelineOptions`. Without
+        opening features, the game features are computed while parsing and
+        their time is part of the `parse` stats. Default is None.
+
+    Returns:
+    Iterator[Optional[Dict[str, Union[str, int, float]]]]: The extracted data
+    of each game, or None for games rejected by the header filter.
     """
 
-    temp_df = pd.DataFrame(games)
-    mode = "a" if os.path.exists(save_location) else "w"
-    header = not os.path.exists(save_location)
+    options = PipelineOptions() if options is None else options
+    stats, engine_pool = options.stats, options.engine_pool
+    full_game = include_opening_cols or engine_pool is not None
+    read_next = partial(
+        read_filtered_game if full_game else read_game_features,
+        handle,
+        options.header_filter,
+    )
 
-    try:
-        temp_df.to_csv(save_location, mode=mode, header=header, index=False)
-    except Exception as e:
-        print(f"Error writing to CSV: {e}")
+    def read_timed():
+        with timed(stats, "parse"):
+            return read_next()
+
+    parsed_games = iter(read_timed, None)
+    batch_games = EVALUATION_BATCH_GAMES if engine_pool is not None else 1
+    # The evaluations are added per batch below.
+    game_options = replace(options, engine_pool=None)
+
+    for batch in iter(lambda: list(islice(parsed_games, batch_games)), []):
+        evaluations = None
+        if engine_pool is not None:
+            with activated(stats), timed(stats, "features.evaluation"):
+                evaluations = iter(
+                    get_batch_evaluation_features(
+                        [parsed for parsed in batch if parsed is not SKIPPED],
+                        engine_pool,
+                    )
+                )
+
+        for parsed in batch:
+            if parsed is SKIPPED:
+                yield None
+            elif full_game:
+                row = extract_game_data(parsed, include_opening_cols, game_options)
+                # The evaluation columns come last.
+                if evaluations is not None:
+                    row.update(next(evaluations))
+                yield row
+            else:
+                yield parsed
+
+
+def extract_shard_data(
+    pgn_file: str,
+    start: int,
+    end: int,
+    include_opening_cols: bool,
+    options: Optional[PipelineOptions] = None,
+) -> List[Optional[Dict[str, Union[str, int, float]]]]:
+    """
+    Extracts the data of every game stored in a byte range of a PGN file.
+
+    Parameters:
+    pgn_file (str):
+        The file path of the PGN file.
+    start (int):
+        The byte offset where the range starts. Must be the start of a game.
+    end (int):
+        The byte offset where the range ends. Must be the start of a game or
+        the end of the file.
+    include_opening_cols (bool):
+        Flag to determine whether to include opening features.
+    options (Optional[PipelineOptions]):
+        The optional resources of the run, see `PipelineOptions`. Default is
+        None.
+
+    Returns:
+    List[Optional[Dict[str, Union[str, int, float]]]]: The extracted data, in
+    file order, with None for games rejected by the header filter.
+    """
+
+    with open(pgn_file, "rb") as pgn:
+        pgn.seek(start)
+        shard = io.TextIOWrapper(io.BytesIO(pgn.read(end - start)))
+
+    return list(iter_game_rows(shard, include_opening_cols, options))
+
+
+def extract_text_data(
+    text: str,
+    include_opening_cols: bool,
+    options: Optional[PipelineOptions] = None,
+) -> List[Optional[Dict[str, Union[str, int, float]]]]:
+    """
+    Extracts the data of every game in a chunk of PGN text, e.g. a chunk
+    decompressed by `CompressedPgnReader`.
+
+    Parameters:
+    text (str):
+        The PGN text. Must hold whole games only.
+    include_opening_cols (bool):
+        Flag to determine whether to include opening features.
+    options (Optional[PipelineOptions]):
+        The optional resources of the run, see `PipelineOptions`. Default is
+        None.
+
+    Returns:
+    List[Optional[Dict[str, Union[str, int, float]]]]: The extracted data, in
+    text order, with None for games rejected by the header filter.
+    """
+
+    return list(iter_game_rows(io.StringIO(text), include_opening_cols, options))
+
+
+def extract_profiled(
+    extract: Callable[..., List[Optional[Dict[str, Union[str, int, float]]]]],
+    *args,
+    options: PipelineOptions,
+    **kwargs,
+) -> Tuple[List[Optional[Dict[str, Union[str, int, float]]]], PipelineStats]:
+    """
+    Runs `extract_shard_data` or `extract_text_data` in a worker with its own
+    stats, and returns them along with the data so the parent process can
+    merge them.
+    """
+
+    stats = PipelineStats()
+    return extract(*args, options=replace(options, stats=stats), **kwargs), stats
+
+
+def check_engine_pool(engine_pool: Optional[EnginePool], n_jobs: int) -> None:
+    """
+    Refuses to run several workers with an engine pool sized for the whole
+    machine: each worker starts its own engines, so the default of one per
+    core would start n_jobs engines per core.
+    """
+
+    if engine_pool is not None and n_jobs > 1 and engine_pool.n_engines is None:
+        raise ValueError(
+            "Set n_engines on the engine pool when n_jobs > 1, e.g. to "
+            "os.cpu_count() // n_jobs: each worker starts its own engines"
+        )
+
+
+def iter_game_data_parallel(
+    pgn_file: str,
+    include_opening_cols: bool,
+    n_jobs: int,
+    start_game: int = 0,
+    options: Optional[PipelineOptions] = None,
+    max_shard_games: Optional[int] = None,
+) -> Iterator[Optional[Dict[str, Union[str, int, float]]]]:
+    """
+    Extracts game data with a pool of worker processes.
+
+    The PGN is split into several game-aligned byte ranges per worker so that
+    slow shards don't leave the rest of the pool idle. Results are yielded in
+    the original game order, and at most two shards per worker are processed
+    ahead of the consumer.
+
+    Parameters:
+    pgn_file (str):
+        The file path of the PGN file.
+    include_opening_cols (bool):
+        Flag to determine whether to include opening features.
+    n_jobs (int):
+        The number of worker processes.
+    start_game (int):
+        The position of the first game to process. Default is 0.
+    options (Optional[PipelineOptions]):
+        The optional resources of the run, see `PipelineOptions`. The stats
+        of each shard are merged as the shard is yielded, so they add up the
+        time of every worker. Default is None.
+    max_shard_games (Optional[int]):
+        The maximum number of games per shard, which bounds the memory held
+        by shards waiting to be consumed. Default is None, which only splits
+        the file in four ranges per worker.
+
+    Returns:
+    Iterator[Optional[Dict[str, Union[str, int, float]]]]: The extracted data
+    of each game, or None for games rejected by the header filter.
+    """
+
+    options = PipelineOptions() if options is None else options
+    stats = options.stats
+    check_engine_pool(options.engine_pool, n_jobs)
+    n_shards = n_jobs * 4
+    if max_shard_games is not None:
+        remaining_games = len(PgnIndex.open(pgn_file)) - start_game
+        n_shards = max(n_shards, -(-remaining_games // max_shard_games))
+    shards = split_pgn(pgn_file, n_shards, start_game)
+    extract_shard = partial(
+        (
+            extract_shard_data
+            if stats is None
+            else partial(extract_profiled, extract_shard_data)
+        ),
+        pgn_file,
+        include_opening_cols=include_opening_cols,
+        options=replace(options, stats=None),
+    )
+
+    # Only a couple of shards per worker are in flight, so finished shards
+    # don't pile up in memory while the consumer is behind.
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        shards = iter(shards)
+        pending = deque(
+            executor.submit(extract_shard, start, end)
+            for start, end in islice(shards, n_jobs * 2)
+        )
+        while pending:
+            shard_data = pending.popleft().result()
+            for start, end in islice(shards, 1):
+                pending.append(executor.submit(extract_shard, start, end))
+
+            if stats is not None:
+                shard_data, shard_stats = shard_data
+                stats.merge(shard_stats)
+            yield from shard_data
+
+
+def iter_compressed_game_data(
+    reader: CompressedPgnReader,
+    include_opening_cols: bool,
+    n_jobs: int = 1,
+    options: Optional[PipelineOptions] = None,
+) -> Iterator[Optional[Dict[str, Union[str, int, float]]]]:
+    """
+    Extracts game data from a compressed PGN file while it is decompressed.
+
+    The reader thread decompresses the file into chunks of whole games ahead
+    of the parsing. With one job the chunks are parsed in this process;
+    with more, each chunk goes to a worker process and, as with shards, at
+    most two chunks per worker are in flight.
+
+    Parameters:
+    reader (CompressedPgnReader):
+        The reader of the compressed PGN file. Its `position` tells how many
+        compressed bytes are behind the games yielded so far.
+    include_opening_cols (bool):
+        Flag to determine whether to include opening features.
+    n_jobs (int):
+        The number of worker processes. Default is 1.
+    options (Optional[PipelineOptions]):
+        The optional resources of the run, see `PipelineOptions`. Time spent
+        waiting for decompressed text is recorded in the stats as
+        `decompress`. Default is None.
+
+    Returns:
+    Iterator[Optional[Dict[str, Union[str, int, float]]]]: The extracted data
+    of each game, or None for games rejected by the header filter.
+    """
+
+    options = PipelineOptions() if options is None else options
+    stats = options.stats
+    extract_chunk = partial(
+        extract_text_data
+        if stats is None
+        else partial(extract_profiled, extract_text_data),
+        include_opening_cols=include_opening_cols,
+        options=replace(options, stats=None),
+    )
+    chunks = iter(reader)
+
+    def next_chunks(n: int) -> List[str]:
+        with timed(stats, "decompress"):
+            return list(islice(chunks, n))
+
+    if n_jobs <= 1:
+        for text in iter(lambda: next_chunks(1), []):
+            yield from iter_game_rows(
+                io.StringIO(text[0]), include_opening_cols, options
+            )
+        return
+
+    check_engine_pool(options.engine_pool, n_jobs)
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        pending = deque(
+            executor.submit(extract_chunk, text) for text in next_chunks(n_jobs * 2)
+        )
+        while pending:
+            chunk_data = pending.popleft().result()
+            for text in next_chunks(1):
+                pending.append(executor.submit(extract_chunk, text))
+
+            if stats is not None:
+                chunk_data, chunk_stats = chunk_data
+                stats.merge(chunk_stats)
+            yield from chunk_data
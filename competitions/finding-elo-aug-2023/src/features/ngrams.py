@@ -0,0 +1,104 @@
+import zlib
+from array import array
+from collections import deque
+from typing import Tuple
+
+import chess
+import numpy as np
+
+try:
+    import scipy.sparse as sp
+except ImportError:
+    sp = None
+
+NOTATIONS = ("uci", "san")
+
+
+class MoveNgrams:
+    """
+    Hashed n-grams of the mainline moves of a batch of games, one sparse row
+    per game.
+
+    Every run of `ngram_range[0]` to `ngram_range[1]` consecutive moves, e.g.
+    "e2e4 e7e5 g1f3", is hashed with CRC-32 into one of `n_features`
+    columns, so no vocabulary is built and the width is fixed whatever the
+    number of games. CRC-32 doesn't depend on the process, unlike `hash`, so
+    batches built by different workers line up. Colliding n-grams share a
+    column.
+
+    Like `MoveCounters`, the n-grams are fed one move at a time: call
+    `add_move` with the board before each mainline move is played, then
+    `end_game`. `to_csr` returns the rows of the games added since the last
+    call, which keeps memory bounded by the batch size.
+
+    :param n_features: The number of columns.
+    :param ngram_range: The smallest and largest number of moves per n-gram.
+    :param notation: "uci", or "san", which reads better but costs a SAN
+    conversion per move, about as much as the rest of the replay.
+    """
+
+    def __init__(
+        self,
+        n_features: int = 2**20,
+        ngram_range: Tuple[int, int] = (1, 2),
+        notation: str = "uci",
+    ):
+        if notation not in NOTATIONS:
+            raise ValueError(
+                f"Unknown notation {notation!r}, expected one of {NOTATIONS}"
+            )
+        self.n_features = n_features
+        self.min_n, self.max_n = ngram_range
+        self.notation = notation
+        self.window = deque(maxlen=self.max_n)
+        self.indptr = array("q", [0])
+        self.indices = array("q")
+
+    def add_move(self, board: chess.Board, move: chess.Move) -> None:
+        """
+        Adds the n-grams ending with a move, before it is played.
+
+        :param board: The board before the move.
+        :param move: The move about to be played.
+        """
+        self.window.append(board.san(move) if self.notation == "san" else move.uci())
+        moves = list(self.window)
+        for n in range(self.min_n, min(self.max_n, len(moves)) + 1):
+            ngram = " ".join(moves[-n:]).encode()
+            self.indices.append(zlib.crc32(ngram) % self.n_features)
+
+    def end_game(self) -> None:
+        """
+        Closes the row of the current game.
+        """
+        self.indptr.append(len(self.indices))
+        self.window.clear()
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    def to_csr(self) -> "sp.csr_matrix":
+        """
+        Returns the n-gram counts of the games added since the last call, and
+        empties the batch.
+
+        :return: A matrix of shape (games, n_features).
+        """
+        if sp is None:
+            raise ImportError("scipy is required for the n-gram matrix")
+
+        indices = np.frombuffer(self.indices, dtype=np.int64).astype(np.int32)
+        matrix = sp.csr_matrix(
+            (
+                np.ones(len(indices), dtype=np.float32),
+                indices,
+                np.frombuffer(self.indptr, dtype=np.int64),
+            ),
+            shape=(len(self), self.n_features),
+        )
+        # Repeated n-grams of a game add up.
+        matrix.sum_duplicates()
+
+        self.indptr = array("q", [0])
+        self.indices = array("q")
+        return matrix
@@ -1,13 +1,28 @@
 from time import sleep
+from typing import TYPE_CHECKING
 
 import chess
 import requests
+from src.features.eco import EcoTrie
+from src.features.explorer_cache import ExplorerCache
+from src.features.position_memo import (
+    PositionMemo,
+    position_fen,
+    position_key,
+    position_san,
+)
+from src.features.profiling import active_stats, timed
+
+if TYPE_CHECKING:
+    from src.features.opening_table import OpeningTable
 
 # Define the base URL as a constant
 BASE_URL = "https://explorer.lichess.ovh/{database}"
 
 
-def get_opening_name(fen, database="lichess", until="2012", sleep_time=5):
+def get_opening_name(
+    fen, database="lichess", until="2012", sleep_time=5, cache: ExplorerCache = None
+):
     """
     Fetch the opening name based on FEN notation from Lichess API.
 
@@ -15,15 +30,43 @@ def get_opening_name(fen, database="lichess", until="2012", sleep_time=5):
     :param database: The database to query, default is 'lichess'.
     :param until: The cut-off year for data, default is '2012'.
     :param sleep_time: Duration before making a request, default is 5 seconds.
+    :param cache: Optional explorer cache. Hits return without sleeping or
+    making a request, and successful answers are stored in it.
     :return: tuple containing the opening name and the full data.
     """
-    sleep(sleep_time)
+    stats = active_stats()
+    if cache is not None:
+        cached = cache.get(fen, database, until)
+        if stats is not None:
+            stats.count(
+                "explorer.cache_hits" if cached is not None else "explorer.cache_misses"
+            )
+        if cached is not None:
+            return cached
+
+    with timed(stats, "explorer.sleep"):
+        sleep(sleep_time)
     url = BASE_URL.format(database=database)
-    response = requests.get(f"{url}?fen={fen}&until={until}")
+    with timed(stats, "explorer.request"):
+        response = requests.get(f"{url}?fen={fen}&until={until}")
 
     # Ensure the response is valid
     response.raise_for_status()
+    name, data = parse_explorer_response(response)
 
+    if cache is not None and data:
+        cache.set(fen, database, until, name, data)
+
+    return name, data
+
+
+def parse_explorer_response(response):
+    """
+    Extract the opening name and the full data from an explorer response.
+
+    :param response: A successful response from the Lichess explorer.
+    :return: tuple containing the opening name and the full data.
+    """
     # Parse the JSON response
     try:
         data = response.json()
@@ -43,13 +86,30 @@ def get_opening_name(fen, database="lichess", until="2012", sleep_time=5):
     return name, data
 
 
-def get_opening_features(game):
+def get_opening_features(
+    game,
+    cache: ExplorerCache = None,
+    opening_book: EcoTrie = None,
+    opening_table: "OpeningTable" = None,
+    position_memo: PositionMemo = None,
+):
     """
     Get opening features from a game.
+
+    :param game: A chess game object.
+    :param cache: Optional explorer cache shared by every lookup.
+    :param opening_book: Optional offline opening book. When given, positions
+    are looked up in it instead of the Lichess explorer.
+    :param opening_table: Optional table of pre-resolved explorer answers for
+    the corpus. When given, positions are looked up in it instead of the
+    Lichess explorer.
+    :param position_memo: Optional memo of the FEN and SAN of positions,
+    shared across games.
     """
     board = game.board()
     main_moves = list(game.mainline_moves())
     total_moves = len(main_moves)
+    book_positions = opening_book.walk(main_moves) if opening_book is not None else None
 
     # Initial states
     (
@@ -64,12 +124,32 @@ def get_opening_features(game):
     ) = (None, None, None, None, None, None, None, None)
 
     for i, move in enumerate(main_moves):
-        fen = board.fen()
-        opening, data = (
-            (None, {"moves": [None]})
-            if i == 0
-            else get_opening_name(fen=fen, database="master", sleep_time=2)
+        # The book needs no FEN, and hashing would cost more than the SAN it
+        # saves.
+        key = (
+            position_key(board)
+            if position_memo is not None and book_positions is None
+            else None
         )
+        if book_positions is not None:
+            opening, data = next(book_positions)
+        elif opening_table is not None:
+            opening, data = (
+                (None, {"moves": [None]})
+                if i == 0
+                else opening_table.lookup(position_fen(board, position_memo, key))
+            )
+        else:
+            opening, data = (
+                (None, {"moves": [None]})
+                if i == 0
+                else get_opening_name(
+                    fen=position_fen(board, position_memo, key),
+                    database="master",
+                    sleep_time=2,
+                    cache=cache,
+                )
+            )
 
         if opening:
             opening_name = opening
@@ -94,8 +174,8 @@ def get_opening_features(game):
         opening_novelty_piece = opening_novelty_piece.symbol().upper()
 
         opening_novelty_square = chess.square_name(move.to_square)
-        opening_novelty_move = board.san(move)
-        opening_novelty_player = fen.split(" ")[1] + "p"
+        opening_novelty_move = position_san(board, move, position_memo, key)
+        opening_novelty_player = "wp" if board.turn == chess.WHITE else "bp"
 
         opening_moves_after_novelty = total_moves - opening_last_known_move
 
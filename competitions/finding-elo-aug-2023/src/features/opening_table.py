@@ -0,0 +1,175 @@
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple
+
+from chess.pgn import Game
+from src.data.pgn_index import PgnIndex
+from src.features.explorer_cache import normalize_fen
+from src.features.explorer_client import ExplorerClient
+from tqdm import tqdm
+
+
+class PositionNode:
+    """
+    A position reached in the corpus, stored as its normalized FEN, with the
+    number of games reaching it.
+    """
+
+    __slots__ = ("children", "fen", "count")
+
+    def __init__(self, fen: Optional[str]):
+        self.children: Dict[str, "PositionNode"] = {}
+        self.fen = fen
+        self.count = 0
+
+
+class OpeningTable:
+    """
+    Explorer answers for the unique opening positions of a corpus.
+
+    Every game is added to a move trie up to `horizon` plies, so shared
+    openings are stored once. `resolve` then queries each unique position
+    (by normalized FEN, so transpositions are merged) at most once, level by
+    level, most frequent first. Positions after one the explorer knows no
+    moves from are never queried, since `get_opening_features` stops there.
+    Feature extraction then reads the answers from `lookup` instead of
+    calling the explorer per game and per ply.
+
+    Positions that are beyond the horizon, or were left out by the request
+    budget, look like positions the explorer has no moves for.
+
+    Only what the features read is kept of each answer: the opening name and
+    the UCI moves, like `EcoTrie`. Pickled copies, e.g. the ones sent to the
+    workers of `pgn_to_dataframe`, leave the trie out, since `lookup` doesn't
+    need it.
+
+    :param horizon: The number of plies of each game to include.
+    """
+
+    def __init__(self, horizon: int = 30):
+        self.horizon = horizon
+        self.root = PositionNode(None)
+        self.answers: Dict[str, Tuple[Optional[str], Dict[str, List[str]]]] = {}
+
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        state["root"] = PositionNode(None)
+        return state
+
+    @property
+    def key(self) -> str:
+        """
+        Identifies the answers of this table in a `FeatureCache`: a digest of
+        every resolved position.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(json.dumps(sorted(self.answers.items())).encode())
+        return f"table:{digest.hexdigest()}"
+
+    @classmethod
+    def from_pgn(cls, pgn_file: str, horizon: int = 30) -> "OpeningTable":
+        """
+        Builds the table from every game of a PGN file.
+
+        :param pgn_file: The file path of the PGN file.
+        :param horizon: The number of plies of each game to include.
+        :return: The opening table, not resolved yet.
+        """
+        table = cls(horizon)
+        index = PgnIndex.open(pgn_file)
+        for game in tqdm(
+            index.read_games(), total=len(index), desc="Collecting positions"
+        ):
+            table.add_game(game)
+        return table
+
+    def add_game(self, game: Game) -> None:
+        """
+        Adds the opening positions of a game to the trie.
+
+        :param game: A chess game object.
+        """
+        node = self.root
+        board = game.board()
+        moves = list(game.mainline_moves())
+
+        # The position after the last move is never looked up.
+        for move in moves[: min(self.horizon, len(moves) - 1)]:
+            board.push(move)
+            uci = move.uci()
+            child = node.children.get(uci)
+            if child is None:
+                child = node.children[uci] = PositionNode(normalize_fen(board.fen()))
+            child.count += 1
+            node = child
+
+    def __len__(self) -> int:
+        return len({fen for level in self._levels() for fen in self._fens(level)})
+
+    def _levels(self):
+        level = list(self.root.children.values())
+        while level:
+            yield level
+            level = [child for node in level for child in node.children.values()]
+
+    @staticmethod
+    def _fens(level: List[PositionNode]) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for node in level:
+            counts[node.fen] = counts.get(node.fen, 0) + node.count
+        return counts
+
+    def resolve(self, client: ExplorerClient, budget: Optional[int] = None) -> int:
+        """
+        Queries the explorer for the positions that feature extraction will need.
+
+        Positions whose request fails are left unresolved, along with the
+        positions after them, and are retried by the next call.
+
+        :param client: The explorer client used for the requests. Its cache,
+        if any, is used as well.
+        :param budget: The maximum number of positions to resolve. Default is
+        None, which resolves all of them.
+        :return: The number of positions resolved.
+        """
+        resolved = 0
+        level = list(self.root.children.values())
+
+        while level and (budget is None or resolved < budget):
+            counts = self._fens(level)
+            pending = sorted(
+                (fen for fen in counts if fen not in self.answers),
+                key=counts.get,
+                reverse=True,
+            )
+            if budget is not None:
+                pending = pending[: budget - resolved]
+
+            # The move counters don't change the answer, so any valid ones do.
+            queries = {f"{fen} 0 1": fen for fen in pending}
+            for query, (name, data) in client.resolve_many(queries).items():
+                if not data:
+                    continue
+                moves = [move["uci"] for move in data.get("moves", [])]
+                self.answers[queries[query]] = name, {"moves": moves}
+            resolved += len(pending)
+
+            # Only positions reached from a known position are looked up.
+            level = [
+                child
+                for node in level
+                if self.answers.get(node.fen, (None, {"moves": []}))[1]["moves"]
+                for child in node.children.values()
+            ]
+
+        return resolved
+
+    def lookup(self, fen: str) -> Tuple[Optional[str], Dict[str, List[str]]]:
+        """
+        Returns the explorer answer of a position.
+
+        :param fen: The FEN notation string.
+        :return: tuple containing the opening name and the moves known after
+        the position. Unknown positions have no name and no moves.
+        """
+        return self.answers.get(normalize_fen(fen), (None, {"moves": []}))
@@ -0,0 +1,213 @@
+from typing import Dict, Optional, Tuple
+
+import chess
+from src.data.move_store import GameLike
+from src.features.constants import (
+    BISHOP_STARTING_SQUARES,
+    KNIGHT_STARTING_SQUARES,
+    QUEEN_STARTING_SQUARES,
+    ROOK_STARTING_SQUARES,
+)
+from src.features.game import MoveCounters
+
+PHASES = ("opening", "middlegame", "endgame")
+
+DEVELOPMENT_SQUARES = {
+    piece_type: squares
+    for piece_type, squares in (
+        (chess.KNIGHT, KNIGHT_STARTING_SQUARES),
+        (chess.BISHOP, BISHOP_STARTING_SQUARES),
+        (chess.ROOK, ROOK_STARTING_SQUARES),
+        (chess.QUEEN, QUEEN_STARTING_SQUARES),
+    )
+}
+
+
+class PhaseSegmenter:
+    """
+    Splits a game into opening, middlegame and endgame while it is replayed.
+
+    The material and development counters behind the phase rules are
+    updated from each move instead of being recounted from the board, and
+    every move is also counted in a `MoveCounters` of its phase, so the
+    boundaries and the per-phase features come out of a single replay.
+
+    The middlegame starts on the first ply where both kings have castled and
+    at least `min_developed` knights, bishops, rooks or queens (of either
+    side) have left their starting squares. It ends on the first ply where
+    both queens are gone and fewer than `max_endgame_pieces` pieces are left;
+    later plies are the endgame. Plies are numbered from 1.
+
+    Call `count_move` with the board before each mainline move is played and
+    `count_check` with the board after it, as with `MoveCounters`.
+
+    :param board: The starting position of the game.
+    :param min_developed: The number of developed pieces the middlegame needs.
+    :param max_endgame_pieces: The endgame starts below this many pieces,
+    kings and pawns included.
+    """
+
+    __slots__ = (
+        "min_developed",
+        "max_endgame_pieces",
+        "material",
+        "total_pieces",
+        "undeveloped",
+        "developed",
+        "castled",
+        "ply",
+        "phase",
+        "middlegame_start",
+        "middlegame_end",
+        "counters",
+        "last_phase",
+    )
+
+    def __init__(
+        self,
+        board: chess.Board,
+        min_developed: int = 4,
+        max_endgame_pieces: int = 10,
+    ):
+        self.min_developed = min_developed
+        self.max_endgame_pieces = max_endgame_pieces
+
+        # The board is only scanned once, for the starting position.
+        self.material = {
+            color: [0]
+            + [len(board.pieces(piece_type, color)) for piece_type in chess.PIECE_TYPES]
+            for color in chess.COLORS
+        }
+        self.total_pieces = chess.popcount(board.occupied)
+        self.undeveloped = {
+            square
+            for piece_type, squares in DEVELOPMENT_SQUARES.items()
+            for color in chess.COLORS
+            for square in squares[color]
+            if board.piece_at(square) == chess.Piece(piece_type, color)
+        }
+        self.developed = 0
+        self.castled = {chess.WHITE: False, chess.BLACK: False}
+
+        self.ply = 0
+        self.phase = 0
+        self.middlegame_start: Optional[int] = None
+        self.middlegame_end: Optional[int] = None
+        self.counters = [MoveCounters() for _ in PHASES]
+        self.last_phase = 0
+
+    def count_move(self, board: chess.Board, move: chess.Move) -> None:
+        """
+        Counts a move before it is played and updates the current phase.
+
+        :param board: The board before the move.
+        :param move: The move about to be played.
+        """
+        turn = board.turn
+        self.ply += 1
+
+        if board.is_castling(move):
+            self.castled[turn] = True
+        else:
+            if board.is_en_passant(move):
+                captured = chess.PAWN
+            else:
+                captured = board.piece_type_at(move.to_square)
+            if captured:
+                self.material[not turn][captured] -= 1
+                self.total_pieces -= 1
+                self.undeveloped.discard(move.to_square)
+            if move.promotion:
+                self.material[turn][chess.PAWN] -= 1
+                self.material[turn][move.promotion] += 1
+
+        if move.from_square in self.undeveloped:
+            self.undeveloped.discard(move.from_square)
+            self.developed += 1
+
+        if (
+            self.phase == 0
+            and all(self.castled.values())
+            and self.developed >= self.min_developed
+        ):
+            self.phase = 1
+            self.middlegame_start = self.ply
+
+        self.last_phase = self.phase
+        self.counters[self.phase].count_move(board, move)
+
+        if (
+            self.phase < 2
+            and not self.material[chess.WHITE][chess.QUEEN]
+            and not self.material[chess.BLACK][chess.QUEEN]
+            and self.total_pieces < self.max_endgame_pieces
+        ):
+            self.phase = 2
+            self.middlegame_end = self.ply
+
+    def count_check(self, board: chess.Board) -> None:
+        """
+        Counts a check given by the last counted move, in that move's phase.
+
+        :param board: The board after the move.
+        """
+        self.counters[self.last_phase].count_check(board)
+
+    def boundaries(self) -> Tuple[Optional[int], Optional[int]]:
+        """
+        Returns the first and last ply of the middlegame.
+
+        A middlegame that never reaches the endgame lasts until the end of the
+        game. The end is also set for games that reach the endgame without a
+        middlegame.
+        """
+        if self.middlegame_start and not self.middlegame_end:
+            return self.middlegame_start, self.ply
+        return self.middlegame_start, self.middlegame_end
+
+    def features(self) -> Dict[str, Optional[int] | bool]:
+        """
+        Builds the phase boundary columns and the counters of every phase,
+        prefixed with the phase name, e.g. `middlegame_wp_total_checks`.
+        """
+        middlegame_start, middlegame_end = self.boundaries()
+        features = {
+            "middlegame_start": middlegame_start,
+            "middlegame_end": middlegame_end,
+        }
+        for name, counters in zip(PHASES, self.counters):
+            features[f"{name}_total_moves"] = counters.total_moves
+            features.update(
+                {f"{name}_{col}": value for col, value in counters.counts().items()}
+            )
+        return features
+
+
+def segment_game(game: GameLike, **kwargs) -> PhaseSegmenter:
+    """
+    Replays a game once through a `PhaseSegmenter`.
+
+    :param game: A chess game object, or a `GameView` of a compiled move store.
+    :param kwargs: Passed on to `PhaseSegmenter`.
+    :return: The segmenter, after the last move.
+    """
+    board = game.board()
+    segmenter = PhaseSegmenter(board, **kwargs)
+
+    for move in game.mainline_moves():
+        segmenter.count_move(board, move)
+        board.push(move)
+        segmenter.count_check(board)
+
+    return segmenter
+
+
+def get_phase_features(game: GameLike) -> Dict[str, Optional[int] | bool]:
+    """
+    Extracts the phase boundaries, and the piece moves, checks, captures,
+    promotions and castling of each phase, in a single replay of the game.
+
+    :param game: A chess game object, or a `GameView` of a compiled move store.
+    :return: A dictionary containing the extracted features.
+    """
+    return segment_game(game).features()
@@ -1,7 +1,12 @@
 # Functions to extract key data from each game
 def get_player_ratings(game):
     """Get player Elo ratings from PGN headers"""
-    white_rating = game.headers["WhiteElo"]
-    black_rating = game.headers["BlackElo"]
+    return get_ratings_from_headers(game.headers)
+
+
+def get_ratings_from_headers(headers):
+    """Get player Elo ratings from parsed PGN headers, without a game object"""
+    white_rating = headers["WhiteElo"]
+    black_rating = headers["BlackElo"]
 
     return {"wp_rating": white_rating, "bp_rating": black_rating}
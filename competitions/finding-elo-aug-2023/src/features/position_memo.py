@@ -0,0 +1,176 @@
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, TypeVar
+
+import chess
+import chess.polyglot
+from src.features.profiling import active_stats
+
+T = TypeVar("T")
+
+# The values of the memos unpickled by this process, by token. Every copy of
+# a memo that a process unpickles, e.g. one per task sent to a worker, shares
+# the same values.
+_SHARED: Dict[str, OrderedDict] = {}
+
+
+class PositionMemo:
+    """
+    Bounded memo of values derived from chess positions.
+
+    Keys start with the Zobrist hash of the position, followed by whatever
+    else the value depends on, e.g. `(zobrist_hash, "san", move)`. Once the
+    memo holds `maxsize` values, the least recently used ones are evicted.
+
+    The memo only pays off for values that cost more than hashing the
+    position, about 20 microseconds with python-chess, such as `board.fen()`
+    (about 60), and only when positions repeat often enough: the FEN lookup
+    breaks even at a hit rate of about a third. SAN and castling moves are
+    cheaper to recompute than to look up unless the hash is already at hand.
+
+    Hits and misses are counted here and, as `<name>.hits` and
+    `<name>.misses`, in the active `PipelineStats`.
+
+    The memo lives in one process. Instances can be pickled: the copies a
+    worker process unpickles share their values, without the parent's.
+
+    :param maxsize: The maximum number of values kept.
+    :param name: The prefix of the counters in the pipeline stats.
+    """
+
+    def __init__(self, maxsize: int = 100_000, name: str = "position_memo"):
+        self.maxsize = maxsize
+        self.name = name
+        self.values: OrderedDict[Hashable, object] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Identifies the copies of this memo unpickled by a process.
+        self.token = uuid.uuid4().hex
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        del state["values"]
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        self.values = _SHARED.setdefault(self.token, OrderedDict())
+
+    def get(self, key: Hashable, default: Optional[T] = None) -> Optional[T]:
+        """
+        Looks up a value, marking it as recently used.
+
+        :param key: The key, starting with the Zobrist hash of the position.
+        :param default: Returned on a miss.
+        :return: The value, or the default.
+        """
+        stats = active_stats()
+        if key in self.values:
+            self.values.move_to_end(key)
+            self.hits += 1
+            if stats is not None:
+                stats.count(f"{self.name}.hits")
+            return self.values[key]
+
+        self.misses += 1
+        if stats is not None:
+            stats.count(f"{self.name}.misses")
+        return default
+
+    def set(self, key: Hashable, value: object) -> None:
+        """
+        Stores a value, evicting the least recently used ones if full.
+        """
+        self.values[key] = value
+        self.values.move_to_end(key)
+        while len(self.values) > self.maxsize:
+            self.values.popitem(last=False)
+
+    def memoize(self, key: Hashable, compute: Callable[[], T]) -> T:
+        """
+        Returns the value of a key, computing and storing it on a miss.
+
+        :param key: The key, starting with the Zobrist hash of the position.
+        :param compute: Computes the value.
+        :return: The value.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the hit and miss counters of this process, the hit rate and
+        the number of values kept.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self.values),
+        }
+
+    def clear(self) -> None:
+        self.values.clear()
+        self.hits = self.misses = 0
+
+
+_MISSING = object()
+
+
+def position_key(board: chess.Board) -> int:
+    """
+    Returns the Zobrist hash of a position. Compute it once per position and
+    pass it to each lookup of that position.
+    """
+    return chess.polyglot.zobrist_hash(board)
+
+
+def position_fen(
+    board: chess.Board, memo: Optional[PositionMemo] = None, key: Optional[int] = None
+) -> str:
+    """
+    Returns `board.fen()`, memoized if a memo is given.
+
+    The Zobrist hash doesn't cover the halfmove clock and fullmove number,
+    so they are part of the key and the FEN is always exact.
+
+    :param board: The position.
+    :param memo: Optional position memo.
+    :param key: The Zobrist hash of the position, if already computed.
+    :return: The FEN notation string.
+    """
+    if memo is None:
+        return board.fen()
+    if key is None:
+        key = position_key(board)
+    return memo.memoize(
+        (key, "fen", board.halfmove_clock, board.fullmove_number), board.fen
+    )
+
+
+def position_san(
+    board: chess.Board,
+    move: chess.Move,
+    memo: Optional[PositionMemo] = None,
+    key: Optional[int] = None,
+) -> str:
+    """
+    Returns `board.san(move)`, memoized if a memo and the Zobrist hash of the
+    position are given. Hashing costs more than SAN, so it is never done here.
+
+    :param board: The position.
+    :param move: A legal move in the position.
+    :param memo: Optional position memo.
+    :param key: The Zobrist hash of the position.
+    :return: The move in standard algebraic notation.
+    """
+    if memo is None or key is None:
+        return board.san(move)
+    return memo.memoize((key, "san", move), lambda: board.san(move))
@@ -0,0 +1,118 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import ContextManager, Dict, Iterator, Optional
+
+import pandas as pd
+
+_active: Optional["PipelineStats"] = None
+
+
+class PipelineStats:
+    """
+    Cumulative wall time and counters of a feature extraction run.
+
+    Timers are named after the stage they measure, e.g. `parse`, `write`,
+    `features.opening` or `explorer.request`; nested timers are included in
+    their parents. Counters hold events such as `explorer.cache_hits`.
+
+    Code deep in the call stack, like the explorer lookups, records into the
+    stats that were activated with `activate`, so they don't need to be
+    passed down explicitly. Stats from worker processes are combined with
+    `merge`.
+    """
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = defaultdict(float)
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.counters: Dict[str, int] = defaultdict(int)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+            self.calls[name] += 1
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] += n
+
+    def merge(self, other: "PipelineStats") -> None:
+        for name, seconds in other.seconds.items():
+            self.seconds[name] += seconds
+        for name, calls in other.calls.items():
+            self.calls[name] += calls
+        for name, n in other.counters.items():
+            self.counters[name] += n
+
+    @contextmanager
+    def activate(self) -> Iterator["PipelineStats"]:
+        """
+        Makes these the stats returned by `active_stats` while in the block.
+        """
+        global _active
+        previous, _active = _active, self
+        try:
+            yield self
+        finally:
+            _active = previous
+
+    def postfix(self) -> Dict[str, str]:
+        """
+        Returns the timers, in seconds, and the counters, formatted for
+        `tqdm.set_postfix`.
+        """
+        postfix = {name: f"{seconds:.1f}s" for name, seconds in self.seconds.items()}
+        postfix.update({name: str(n) for name, n in self.counters.items()})
+        return postfix
+
+    def report(self) -> pd.DataFrame:
+        """
+        Returns one row per timer and counter.
+
+        Timers have their total and mean seconds; counters only their value.
+        """
+        rows = [
+            {
+                "metric": name,
+                "seconds": seconds,
+                "calls": self.calls[name],
+                "mean_ms": 1000 * seconds / self.calls[name],
+            }
+            for name, seconds in self.seconds.items()
+        ]
+        rows += [{"metric": name, "calls": n} for name, n in self.counters.items()]
+        return pd.DataFrame(rows, columns=["metric", "seconds", "calls", "mean_ms"])
+
+    def dump(self, path: str) -> None:
+        """
+        Writes the report to a `.json` or `.csv` file.
+        """
+        report = self.report()
+        if path.endswith(".json"):
+            report.to_json(path, orient="records", indent=2)
+        else:
+            report.to_csv(path, index=False)
+
+
+def active_stats() -> Optional[PipelineStats]:
+    """
+    Returns the stats activated by the running pipeline, if any.
+    """
+    return _active
+
+
+def timed(stats: Optional[PipelineStats], name: str) -> ContextManager:
+    """
+    Times a block into `stats`, or does nothing when `stats` is None.
+    """
+    return nullcontext() if stats is None else stats.timer(name)
+
+
+def activated(stats: Optional[PipelineStats]) -> ContextManager:
+    """
+    Activates `stats` for a block, or does nothing when `stats` is None.
+    """
+    return nullcontext() if stats is None else stats.activate()
@@ -0,0 +1,320 @@
+import hashlib
+import json
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import chess
+import numpy as np
+import pandas as pd
+from src.data.move_store import DEFAULT_TAGS, GameLike, GameView, encode_move
+from src.features.evaluation import get_evaluation_features
+from src.features.feature_cache import FeatureCache
+from src.features.game import MoveCounters, get_game_features
+from src.features.opening import get_opening_features
+from src.features.phases import PhaseSegmenter, get_phase_features
+from src.features.players import get_player_ratings
+from src.features.profiling import PipelineStats, timed
+from src.features.schema import (
+    PIECES,
+    PLAYERS,
+    RESULTS,
+    SQUARES,
+    Dtype,
+    FrameBuilder,
+    counter_dtype,
+)
+from tqdm import tqdm
+
+
+class FeatureGroup:
+    """
+    A named set of feature columns computed together from a game.
+
+    :param name: The name of the group, used as its cache key.
+    :param extractor: The function computing the group from a game. It must
+    return the declared columns, in order.
+    :param columns: The names of the columns.
+    :param version: Bump it whenever the extractor changes, so cached values
+    are recomputed.
+    :param options: The keyword arguments of the extractor that can be set
+    per run, e.g. the opening book. Those that change the values must have a
+    `key` attribute identifying them, see `options_key`.
+    :param dtypes: The output dtype of each column, see `FrameBuilder`.
+    Columns without one are kept as Python objects.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        extractor: Callable[..., Dict],
+        columns: Sequence[str],
+        version: int = 1,
+        options: Sequence[str] = (),
+        dtypes: Optional[Dict[str, Dtype]] = None,
+    ):
+        self.name = name
+        self.extractor = extractor
+        self.columns = list(columns)
+        self.version = version
+        self.options = tuple(options)
+        self.dtypes = {col: (dtypes or {}).get(col, "object") for col in self.columns}
+
+    def compute(self, game: GameLike, options: Optional[Dict] = None) -> Dict:
+        """
+        Computes the group for a game.
+
+        :param game: A chess game object, or a `GameView` of a compiled move store.
+        :param options: Run options; those listed in `options` are passed on.
+        :return: A dictionary with the declared columns.
+        """
+        options = options or {}
+        kwargs = {key: options[key] for key in self.options if key in options}
+        features = self.extractor(game, **kwargs)
+        if list(features) != self.columns:
+            raise ValueError(
+                f"Feature group {self.name} returned {list(features)}, "
+                f"declared {self.columns}"
+            )
+        return features
+
+    def options_key(self, options: Optional[Dict] = None) -> str:
+        """
+        Identifies the run options that the values of the group depend on, so
+        a `FeatureCache` doesn't mix values computed with different ones.
+
+        Options with a `key` attribute, like `EcoTrie`, `OpeningTable` and
+        `EnginePool`, are told apart by it. The others, e.g. caches and memos,
+        only make the group faster and are left out.
+
+        :param options: Run options.
+        :return: A digest of the keys of the options set, or "" if none is.
+        """
+        options = options or {}
+        keys = {}
+        for name in self.options:
+            key = getattr(options.get(name), "key", None)
+            if key is not None:
+                keys[name] = key
+        if not keys:
+            return ""
+        return hashlib.blake2b(
+            json.dumps(keys, sort_keys=True).encode(), digest_size=16
+        ).hexdigest()
+
+    def __repr__(self) -> str:
+        return f"<FeatureGroup {self.name} v{self.version}>"
+
+
+REGISTRY: Dict[str, FeatureGroup] = {}
+
+
+def register_feature_group(group: FeatureGroup) -> FeatureGroup:
+    """
+    Adds a feature group to the registry, replacing any group with its name.
+    """
+    REGISTRY[group.name] = group
+    return group
+
+
+def get_feature_groups(names: Optional[Iterable[str]] = None) -> List[FeatureGroup]:
+    """
+    Looks up registered feature groups by name. Default is every group.
+    """
+    if names is None:
+        return list(REGISTRY.values())
+    return [REGISTRY[name] for name in names]
+
+
+def get_dtypes(groups: Iterable[FeatureGroup]) -> Dict[str, Dtype]:
+    """
+    Combines the column dtypes of several feature groups, in column order.
+    """
+    return {col: dtype for group in groups for col, dtype in group.dtypes.items()}
+
+
+def extract_features(
+    game: GameLike,
+    groups: Iterable[FeatureGroup],
+    options: Optional[Dict] = None,
+    stats: Optional[PipelineStats] = None,
+) -> Dict:
+    """
+    Computes several feature groups for a game, without caching.
+
+    :param game: A chess game object, or a `GameView` of a compiled move store.
+    :param groups: The feature groups, in column order.
+    :param options: Run options passed on to the groups that accept them.
+    :param stats: Optional stats collecting the time of each group, as
+    `features.<group name>`.
+    :return: A dictionary with the columns of every group.
+    """
+    features = {}
+    for group in groups:
+        with timed(stats, f"features.{group.name}"):
+            features.update(group.compute(game, options))
+    return features
+
+
+def game_content_hash(game: GameLike) -> str:
+    """
+    Hashes the content of a game: its mainline moves and the tags kept by a
+    `MoveStore`. The hash doesn't depend on the PGN formatting, comments or
+    variations, and is the same for a game and its `GameView`.
+
+    :param game: A chess game object, or a `GameView` of a compiled move store.
+    :return: The hex digest.
+    """
+    if isinstance(game, GameView):
+        codes = game.store.move_codes(game.game_idx)
+    else:
+        codes = [encode_move(move) for move in game.mainline_moves()]
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(
+        json.dumps([game.headers.get(tag, "") for tag in DEFAULT_TAGS]).encode()
+    )
+    digest.update(np.asarray(codes, dtype="<u2").tobytes())
+    return digest.hexdigest()
+
+
+def materialize(
+    games: Iterable[GameLike],
+    groups: Iterable[FeatureGroup],
+    cache: FeatureCache,
+    batch_size: int = 1_000,
+    **options,
+) -> pd.DataFrame:
+    """
+    Builds a feature table, computing only the groups missing from the cache.
+
+    Games are processed in batches. For each group, the cached values of the
+    batch are fetched in one query, only the games without them (or with an
+    outdated group version) are computed, and the new values are stored.
+    Adding a group to an existing table therefore costs one pass of that
+    group, plus hashing the games. Values computed with other run options,
+    e.g. another opening book or engine, are not reused.
+
+    :param games: Chess game objects, or a `MoveStore` and its `GameView`s.
+    :param groups: The feature groups, in column order.
+    :param cache: The feature cache.
+    :param batch_size: The number of games per cache query.
+    :param options: Run options passed on to the groups that accept them,
+    e.g. `opening_book`.
+    :return: One row per game, with the columns of every group.
+    """
+    groups = list(groups)
+    games = iter(tqdm(games, desc="Materializing features"))
+    rows = FrameBuilder(get_dtypes(groups))
+    options_keys = {group.name: group.options_key(options) for group in groups}
+
+    for batch in iter(lambda: list(islice(games, batch_size)), []):
+        hashes = [game_content_hash(game) for game in batch]
+        batch_rows = [{} for _ in batch]
+
+        for group in groups:
+            cached = cache.get_many(
+                group.name, group.version, hashes, options_keys[group.name]
+            )
+            computed = {}
+            for game, game_hash, row in zip(batch, hashes, batch_rows):
+                values = cached.get(game_hash) or computed.get(game_hash)
+                if values is None:
+                    features = group.compute(game, options)
+                    values = computed[game_hash] = list(features.values())
+                row.update(zip(group.columns, values))
+            if computed:
+                cache.set_many(
+                    group.name, group.version, computed, options_keys[group.name]
+                )
+
+        for row in batch_rows:
+            rows.append(row)
+
+    return rows.to_frame()
+
+
+GAME_COLUMNS = list(MoveCounters().features("*"))
+PHASE_COLUMNS = list(PhaseSegmenter(chess.Board()).features())
+
+register_feature_group(
+    FeatureGroup(
+        "players",
+        get_player_ratings,
+        ["wp_rating", "bp_rating"],
+        dtypes={"wp_rating": "Int16", "bp_rating": "Int16"},
+    )
+)
+register_feature_group(
+    FeatureGroup(
+        "game",
+        get_game_features,
+        GAME_COLUMNS,
+        # A game without moves that is won by white has -1 black moves.
+        dtypes={
+            "result": RESULTS,
+            "total_moves": "uint16",
+            "wp_total_moves": "int16",
+            "bp_total_moves": "int16",
+        }
+        | {col: counter_dtype(col) for col in GAME_COLUMNS[4:]},
+    )
+)
+register_feature_group(
+    FeatureGroup(
+        "opening",
+        get_opening_features,
+        [
+            "opening_name",
+            "opening_last_move",
+            "opening_last_known_move",
+            "opening_moves_after_novelty",
+            "opening_novelty_player",
+            "opening_novelty_piece",
+            "opening_novelty_square",
+            "opening_novelty_move",
+        ],
+        options=("cache", "opening_book", "opening_table", "position_memo"),
+        dtypes={
+            "opening_name": "category",
+            "opening_last_move": "UInt16",
+            "opening_last_known_move": "UInt16",
+            "opening_moves_after_novelty": "UInt16",
+            "opening_novelty_player": PLAYERS,
+            "opening_novelty_piece": PIECES,
+            "opening_novelty_square": SQUARES,
+            "opening_novelty_move": "category",
+        },
+    )
+)
+register_feature_group(
+    FeatureGroup(
+        "phases",
+        get_phase_features,
+        PHASE_COLUMNS,
+        dtypes={"middlegame_start": "UInt16", "middlegame_end": "UInt16"}
+        | {col: counter_dtype(col) for col in PHASE_COLUMNS[2:]},
+    )
+)
+register_feature_group(
+    FeatureGroup(
+        "evaluation",
+        get_evaluation_features,
+        [
+            "wp_acpl",
+            "bp_acpl",
+            "wp_mistakes",
+            "bp_mistakes",
+            "wp_blunders",
+            "bp_blunders",
+        ],
+        options=("engine_pool",),
+        dtypes={
+            "wp_acpl": "Float32",
+            "bp_acpl": "Float32",
+            "wp_mistakes": "uint16",
+            "bp_mistakes": "uint16",
+            "wp_blunders": "uint16",
+            "bp_blunders": "uint16",
+        },
+    )
+)
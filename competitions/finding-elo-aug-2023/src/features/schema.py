@@ -0,0 +1,171 @@
+from typing import Dict, Mapping, Union
+
+import chess
+import numpy as np
+import pandas as pd
+from pandas.api.extensions import ExtensionDtype
+from pandas.api.types import pandas_dtype
+
+Dtype = Union[str, np.dtype, ExtensionDtype]
+
+RESULTS = pd.CategoricalDtype(["1-0", "0-1", "1/2-1/2", "*"])
+PLAYERS = pd.CategoricalDtype(["wp", "bp"])
+PIECES = pd.CategoricalDtype(["P", "N", "B", "R", "Q", "K"])
+SQUARES = pd.CategoricalDtype(chess.SQUARE_NAMES)
+
+
+def counter_dtype(column: str) -> str:
+    """
+    Picks the dtype of a `MoveCounters` column: castling flags are bools,
+    captures and promotions (at most 23 per player) fit in a byte, and move
+    and check counts in two.
+    """
+    if column.endswith("_castles"):
+        return "bool"
+    if column.endswith(("_captures", "_promotions")):
+        return "uint8"
+    return "uint16"
+
+
+class FrameBuilder:
+    """
+    Builds a typed DataFrame from extracted rows, one row at a time.
+
+    Every column has a preallocated numpy buffer of its declared dtype, and
+    each row is written into the buffers as it is appended, so no list of
+    rows is kept and `to_frame` doesn't convert anything. Buffers double when
+    full.
+
+    Declared dtypes are pandas dtypes:
+    - numpy dtypes such as "int16", "uint8" or "bool" reject missing values;
+    - nullable dtypes such as "Int16" or "UInt16" accept None;
+    - categoricals with fixed categories reject unknown values, and
+      "category" collects the categories as they come. Category codes are
+      kept across `to_frame` calls, so consecutive frames only ever add
+      categories;
+    - anything else, e.g. "object", stores the values as they are.
+
+    Integer columns also accept numeric strings, e.g. ratings read from PGN
+    headers; nullable ones store other strings, like "?", as missing.
+
+    :param dtypes: The dtype of each column, in column order.
+    :param capacity: The number of rows to allocate for up front.
+    """
+
+    def __init__(self, dtypes: Mapping[str, Dtype], capacity: int = 1_024):
+        self.dtypes = {col: pandas_dtype(dtype) for col, dtype in dtypes.items()}
+        self.categories: Dict[str, Dict[str, int]] = {
+            col: {}
+            for col, dtype in self.dtypes.items()
+            if isinstance(dtype, pd.CategoricalDtype)
+        }
+        for col, categories in self.categories.items():
+            if self.dtypes[col].categories is not None:
+                categories.update(
+                    (value, code)
+                    for code, value in enumerate(self.dtypes[col].categories)
+                )
+        self.n_rows = 0
+        self._allocate(max(capacity, 1))
+
+    def _allocate(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.buffers: Dict[str, np.ndarray] = {}
+        self.masks: Dict[str, np.ndarray] = {}
+        for col, dtype in self.dtypes.items():
+            if col in self.categories:
+                buffer_dtype = np.int32
+            elif isinstance(dtype, ExtensionDtype):
+                buffer_dtype = getattr(dtype, "numpy_dtype", object)
+            else:
+                buffer_dtype = dtype
+            self.buffers[col] = np.empty(capacity, dtype=buffer_dtype)
+            self.masks[col] = np.zeros(capacity, dtype=bool)
+
+    def _grow(self) -> None:
+        buffers, masks, n_rows = self.buffers, self.masks, self.n_rows
+        self._allocate(self.capacity * 2)
+        for col in self.dtypes:
+            self.buffers[col][:n_rows] = buffers[col][:n_rows]
+            self.masks[col][:n_rows] = masks[col][:n_rows]
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def append(self, row: Mapping[str, object]) -> None:
+        """
+        Writes a row into the buffers.
+
+        :param row: The values of the row, by column. Every declared column
+        must be present; extra keys are ignored.
+        """
+        if self.n_rows == self.capacity:
+            self._grow()
+        i = self.n_rows
+
+        for col, dtype in self.dtypes.items():
+            value = row[col]
+            buffer = self.buffers[col]
+            nullable = isinstance(dtype, ExtensionDtype) or dtype == object
+
+            if value is None:
+                if not nullable:
+                    raise ValueError(f"Missing value in non-nullable column {col}")
+                self.masks[col][i] = True
+                if buffer.dtype == object or col in self.categories:
+                    buffer[i] = None if buffer.dtype == object else -1
+                continue
+
+            self.masks[col][i] = False
+            if col in self.categories:
+                categories = self.categories[col]
+                code = categories.get(value)
+                if code is None:
+                    if dtype.categories is not None:
+                        raise ValueError(f"Unknown category {value!r} in column {col}")
+                    code = categories[value] = len(categories)
+                buffer[i] = code
+                continue
+
+            try:
+                buffer[i] = value
+            except ValueError:
+                if not nullable:
+                    raise ValueError(f"Invalid value {value!r} in column {col}")
+                self.masks[col][i] = True
+
+        self.n_rows += 1
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Returns the rows appended since the last call as a DataFrame with the
+        declared dtypes, and empties the builder.
+        """
+        n_rows = self.n_rows
+        columns = {}
+
+        for col, dtype in self.dtypes.items():
+            values = self.buffers[col][:n_rows].copy()
+            if col in self.categories:
+                columns[col] = pd.Categorical.from_codes(
+                    values, categories=list(self.categories[col])
+                )
+            elif hasattr(dtype, "numpy_dtype"):
+                mask = self.masks[col][:n_rows].copy()
+                columns[col] = dtype.construct_array_type()(values, mask)
+            elif isinstance(dtype, ExtensionDtype):
+                columns[col] = pd.array(values, dtype=dtype)
+            else:
+                columns[col] = values
+
+        self.n_rows = 0
+        return pd.DataFrame(columns, copy=False)
+
+
+def apply_dtypes(df: pd.DataFrame, dtypes: Mapping[str, Dtype]) -> pd.DataFrame:
+    """
+    Casts the columns of a DataFrame read back from an untyped output, such
+    as CSV, to their declared dtypes. Columns without a declared dtype are
+    left as they are.
+    """
+    return df.astype({col: dtype for col, dtype in dtypes.items() if col in df})
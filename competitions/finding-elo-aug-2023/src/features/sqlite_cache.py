@@ -0,0 +1,61 @@
+import sqlite3
+from typing import Dict, Iterator, List
+
+# Queries stay below SQLite's limit on the number of parameters.
+MAX_QUERY_PARAMETERS = 500
+
+
+class SqliteCache:
+    """
+    Base of the persistent caches stored in SQLite.
+
+    The database runs in WAL mode with a busy timeout, so several processes
+    can share the same file. The connection is opened on first use, and
+    instances can be pickled: they reopen it in the process that unpickles
+    them. Subclasses set `schema` and count their `hits` and `misses`.
+
+    :param path: The file path of the SQLite database.
+    """
+
+    schema = ""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        return state
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(
+                self.path, timeout=60, isolation_level=None
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(self.schema)
+        return self._connection
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the hit and miss counters of this process.
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def chunked(keys: List, size: int = MAX_QUERY_PARAMETERS) -> Iterator[List]:
+    """
+    Splits the keys of an `IN (...)` query into chunks of at most `size`.
+    """
+    for start in range(0, len(keys), size):
+        yield keys[start : start + size]
@@ -1,4 +1,39 @@
+from typing import List, Tuple
+
+from src.data.compressed import count_games_compressed, is_compressed
+from src.data.pgn_index import PgnIndex
+
+
 def count_games_in_pgn(pgn_file):
-    with open(pgn_file, "r") as file:
-        content = file.readlines()
-    return sum(1 for line in content if line.startswith("[Event "))
+    if is_compressed(pgn_file):
+        return count_games_compressed(pgn_file)
+    return len(PgnIndex.open(pgn_file))
+
+
+def split_pgn(
+    pgn_file: str, n_shards: int, start_game: int = 0
+) -> List[Tuple[int, int]]:
+    """
+    Splits a PGN file into byte ranges that start and end on game boundaries.
+
+    The split points come from the game index of the file, so every range
+    holds about the same number of games. Ranges that would be empty are
+    dropped.
+
+    Parameters:
+    pgn_file (str):
+        The file path of the PGN file to be split.
+    n_shards (int):
+        The number of ranges to aim for.
+    start_game (int):
+        The position of the first game to include. Default is 0.
+
+    Returns:
+    List[Tuple[int, int]]: The (start, end) byte offsets of each range, in file order.
+    """
+
+    index = PgnIndex.open(pgn_file)
+    return [
+        index.byte_range(first_game, stop_game)
+        for first_game, stop_game in index.split(n_shards, start=start_game)
+    ]
@@ -0,0 +1,108 @@
+import logging
+from typing import Dict, Optional, TextIO, Union
+
+import chess
+from chess.pgn import SKIP, BaseVisitor, Headers, SkipType, read_game
+from src.features.game import MoveCounters
+from src.features.headers import SKIPPED, HeaderPredicate
+from src.features.ngrams import MoveNgrams
+from src.features.players import get_ratings_from_headers
+
+LOGGER = logging.getLogger("chess.pgn")
+
+FeatureRow = Dict[str, Union[str, int, bool]]
+
+
+class GameFeatureVisitor(BaseVisitor[Union[FeatureRow, object]]):
+    """
+    PGN visitor that computes the player rating and game features while the
+    movetext is parsed.
+
+    `chess.pgn.read_game` normally builds a `GameNode` for every move, and
+    `get_game_features` then replays the mainline from those nodes. This
+    visitor instead updates `MoveCounters` from the parser's own board as
+    each move is read, skips variations, and returns the feature row
+    directly, so no node is ever allocated. The row is the same as
+    `extract_game_data(game, include_opening_cols=False)`.
+
+    :param predicate: Optional header filter. Rejected games skip their
+    movetext and return `SKIPPED`.
+    :param ngrams: Optional move n-grams, which get a row for every game
+    that isn't skipped, from the same moves as the counters.
+    """
+
+    def __init__(
+        self,
+        predicate: Optional[HeaderPredicate] = None,
+        ngrams: Optional[MoveNgrams] = None,
+    ):
+        self.predicate = predicate
+        self.ngrams = ngrams
+        self.headers = Headers()
+        self.counters = MoveCounters()
+        self.moved = False
+        self.skipped = False
+
+    def begin_headers(self) -> Headers:
+        return self.headers
+
+    def visit_header(self, tagname: str, tagvalue: str) -> None:
+        self.headers[tagname] = tagvalue
+
+    def end_headers(self) -> Optional[SkipType]:
+        if self.predicate is not None and not self.predicate(self.headers):
+            self.skipped = True
+            return SKIP
+        return None
+
+    def begin_variation(self) -> SkipType:
+        return SKIP
+
+    def visit_move(self, board: chess.Board, move: chess.Move) -> None:
+        self.counters.count_move(board, move)
+        if self.ngrams is not None:
+            self.ngrams.add_move(board, move)
+        self.moved = True
+
+    def visit_board(self, board: chess.Board) -> None:
+        # Also called for the starting position and after unparsable moves.
+        if self.moved:
+            self.counters.count_check(board)
+            self.moved = False
+
+    def visit_result(self, result: str) -> None:
+        if self.headers.get("Result", "*") == "*":
+            self.headers["Result"] = result
+
+    def handle_error(self, error: Exception) -> None:
+        # Same as `GameBuilder`: log and keep the moves parsed so far.
+        LOGGER.error("%s while parsing %r", error, self.headers)
+
+    def result(self) -> Union[FeatureRow, object]:
+        if self.skipped:
+            return SKIPPED
+
+        if self.ngrams is not None:
+            self.ngrams.end_game()
+        return {
+            **get_ratings_from_headers(self.headers),
+            **self.counters.features(self.headers["Result"]),
+        }
+
+
+def read_game_features(
+    handle: TextIO,
+    predicate: Optional[HeaderPredicate] = None,
+    ngrams: Optional[MoveNgrams] = None,
+) -> Union[FeatureRow, object, None]:
+    """
+    Reads the next game and returns its feature row without building the game.
+
+    :param handle: The PGN file opened in text mode.
+    :param predicate: Optional header filter.
+    :param ngrams: Optional move n-grams, which get a row for the game unless
+    it is rejected.
+    :return: The feature row, `SKIPPED` if the game was rejected by the
+    filter, or None at the end of the file.
+    """
+    return read_game(handle, Visitor=lambda: GameFeatureVisitor(predicate, ngrams))
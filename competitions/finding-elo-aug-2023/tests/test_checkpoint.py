@@ -0,0 +1,138 @@
+import json
+import os
+
+import pytest
+from src.data.checkpoint import CHECKPOINT_SUFFIX, read_checkpoint, write_checkpoint
+from src.data.pgn_index import PgnIndex
+from src.data.sinks import CsvSink, ParquetSink
+from src.data.synthetic import write_synthetic_pgn
+from src.features import main
+from src.features.headers import rating_between
+from src.features.main import PipelineOptions, find_resume_point, pgn_to_dataframe
+
+SAVE_INTERVAL = 10
+
+
+@pytest.fixture(scope="module")
+def pgn_file(tmp_path_factory):
+    return write_synthetic_pgn(
+        str(tmp_path_factory.mktemp("pgn") / "games.pgn"), 95, plies=(0, 80)
+    )
+
+
+def make_test_sink(save_location):
+    if save_location.endswith(".parquet"):
+        # Small parts, so the run is checkpointed every other save.
+        return ParquetSink(save_location, part_rows=2 * SAVE_INTERVAL)
+    return CsvSink(save_location)
+
+
+def run(pgn_file, save_location, header_filter=rating_between(1900, 2700)):
+    return pgn_to_dataframe(
+        pgn_file,
+        include_opening_cols=False,
+        save_interval=SAVE_INTERVAL,
+        save_location=save_location,
+        sink=make_test_sink(save_location),
+        options=PipelineOptions(header_filter=header_filter),
+    )
+
+
+def fail_on_call(function, n):
+    calls = []
+
+    def wrapper(*args, **kwargs):
+        calls.append(None)
+        if len(calls) == n:
+            raise OSError("Interrupted")
+        return function(*args, **kwargs)
+
+    return wrapper
+
+
+def test_checkpoint_round_trip(tmp_path, pgn_file):
+    save_location = str(tmp_path / "out.csv")
+    index = PgnIndex.open(pgn_file)
+    write_checkpoint(save_location, pgn_file, 20, index.offset(20), 1234)
+
+    assert os.listdir(tmp_path) == [os.path.basename(save_location) + CHECKPOINT_SUFFIX]
+    checkpoint = read_checkpoint(save_location, pgn_file)
+    assert checkpoint["games_processed"] == 20
+    assert checkpoint["pgn_offset"] == index.offset(20)
+    assert checkpoint["output_size"] == 1234
+
+    other_pgn = write_synthetic_pgn(str(tmp_path / "other.pgn"), 5)
+    assert read_checkpoint(save_location, other_pgn) is None
+
+
+def test_checkpoint_of_a_modified_or_corrupt_pgn_is_ignored(tmp_path, pgn_file):
+    pgn_copy = str(tmp_path / "games.pgn")
+    with open(pgn_file) as source, open(pgn_copy, "w") as target:
+        target.write(source.read())
+    save_location = str(tmp_path / "out.csv")
+
+    write_checkpoint(save_location, pgn_copy, 20, 0, 0)
+    with open(pgn_copy, "a") as pgn:
+        pgn.write("\n")
+    assert read_checkpoint(save_location, pgn_copy) is None
+
+    write_checkpoint(save_location, pgn_copy, 20, 0, 0)
+    with open(save_location + CHECKPOINT_SUFFIX, "w") as checkpoint:
+        checkpoint.write('{"games_processed": ')
+    assert read_checkpoint(save_location, pgn_copy) is None
+
+
+@pytest.mark.parametrize("extension", [".csv", ".parquet"])
+def test_find_resume_point_drops_rows_after_the_checkpoint(
+    tmp_path, pgn_file, extension
+):
+    save_location = str(tmp_path / f"out{extension}")
+    index = PgnIndex.open(pgn_file)
+    frame = pgn_to_dataframe(pgn_file, False, save_to_file=False)
+    sink = make_test_sink(save_location)
+
+    sink.write(frame[:20])
+    sink.close()
+    write_checkpoint(save_location, pgn_file, 20, index.offset(20), sink.size())
+    sink.write(frame[20:40])
+    sink.close()
+
+    resumed = make_test_sink(save_location)
+    assert find_resume_point(pgn_file, resumed, index) == (20, index.offset(20))
+    assert resumed.count_rows() == 20
+
+    # Without a checkpoint, the saved rows are counted instead.
+    os.remove(save_location + CHECKPOINT_SUFFIX)
+    assert find_resume_point(pgn_file, resumed, index) == (20, index.offset(20))
+
+
+@pytest.mark.parametrize("extension", [".csv", ".parquet"])
+@pytest.mark.parametrize("interruption", ["write", "checkpoint", "extraction"])
+def test_resumed_run_matches_an_uninterrupted_one(
+    tmp_path, monkeypatch, pgn_file, extension, interruption
+):
+    expected = run(pgn_file, str(tmp_path / f"expected{extension}"))
+    save_location = str(tmp_path / f"out{extension}")
+    header_filter = rating_between(1900, 2700)
+
+    with monkeypatch.context() as patch:
+        if interruption == "write":
+            # The fourth save fails, and the run ends before its checkpoint.
+            sink_class = type(make_test_sink(save_location))
+            patch.setattr(sink_class, "write", fail_on_call(sink_class.write, 4))
+        elif interruption == "checkpoint":
+            # The process dies between saving the rows and the checkpoint.
+            patch.setattr(
+                main, "write_checkpoint", fail_on_call(main.write_checkpoint, 2)
+            )
+        else:
+            # The process dies in the middle of a save interval.
+            header_filter = fail_on_call(header_filter, 3 * SAVE_INTERVAL + 5)
+        assert run(pgn_file, save_location, header_filter) is None
+
+    with open(save_location + CHECKPOINT_SUFFIX) as checkpoint:
+        assert 0 < json.load(checkpoint)["games_processed"] < 95
+
+    resumed = run(pgn_file, save_location)
+    assert resumed.equals(expected)
+    assert make_test_sink(save_location).count_rows() == len(expected)
@@ -0,0 +1,98 @@
+import bz2
+import gzip
+import os
+from functools import partial
+
+import pytest
+from src.data import compressed
+from src.data.compressed import CompressedPgnReader, count_games_compressed
+from src.data.pgn_index import PgnIndex
+from src.data.synthetic import write_synthetic_pgn
+from src.features import main
+from src.features.main import pgn_to_dataframe
+
+N_GAMES = 120
+# The small sizes end reads mid-game, so games span several reads.
+CHUNK_SIZES = [64, 1_000, 1 << 20]
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == ".gz":
+        return gzip.compress(data)
+    if codec == ".bz2":
+        return bz2.compress(data)
+    zstandard = pytest.importorskip("zstandard")
+    return zstandard.ZstdCompressor().compress(data)
+
+
+@pytest.fixture(scope="module")
+def pgn_file(tmp_path_factory):
+    return write_synthetic_pgn(
+        str(tmp_path_factory.mktemp("pgn") / "games.pgn"), N_GAMES, plies=(0, 80)
+    )
+
+
+@pytest.fixture(params=[".gz", ".bz2", ".zst"])
+def compressed_file(request, pgn_file):
+    path = pgn_file + request.param
+    if not os.path.exists(path):
+        with open(pgn_file, "rb") as pgn, open(path, "wb") as output:
+            output.write(compress(pgn.read(), request.param))
+    return path
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_chunks_hold_whole_games(pgn_file, compressed_file, chunk_size):
+    reader = CompressedPgnReader(compressed_file, chunk_size=chunk_size, max_chunks=2)
+    chunks, positions = [], []
+    for text in reader:
+        chunks.append(text)
+        positions.append(reader.position)
+
+    with open(pgn_file) as pgn:
+        assert "".join(chunks) == pgn.read()
+    assert all(text.startswith("[Event ") for text in chunks)
+    assert positions == sorted(positions)
+    assert positions[-1] == os.path.getsize(compressed_file)
+    assert count_games_compressed(compressed_file) == N_GAMES
+
+
+@pytest.mark.parametrize("skip", [0, 1, 37, N_GAMES])
+def test_skip_games(pgn_file, compressed_file, skip):
+    index = PgnIndex.open(pgn_file)
+    reader = CompressedPgnReader(compressed_file, skip_games=skip, chunk_size=1_000)
+
+    with open(pgn_file) as pgn:
+        pgn.seek(index.offset(skip))
+        assert "".join(reader) == pgn.read()
+
+
+def test_stops_early(compressed_file):
+    reader = CompressedPgnReader(compressed_file, chunk_size=64, max_chunks=1)
+    for _ in reader:
+        break
+    assert not reader._thread.is_alive()
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_same_frame_as_plain_pgn(monkeypatch, pgn_file, compressed_file, n_jobs):
+    monkeypatch.setattr(
+        main, "CompressedPgnReader", partial(CompressedPgnReader, chunk_size=1_000)
+    )
+    expected = pgn_to_dataframe(pgn_file, False, save_to_file=False)
+    df = pgn_to_dataframe(compressed_file, False, save_to_file=False, n_jobs=n_jobs)
+    assert df.equals(expected)
+
+
+def test_decompression_errors_are_raised(tmp_path, pgn_file):
+    path = str(tmp_path / "games.pgn.gz")
+    with open(pgn_file, "rb") as pgn, open(path, "wb") as output:
+        output.write(gzip.compress(pgn.read())[:-100])
+
+    with pytest.raises(EOFError):
+        list(CompressedPgnReader(path, chunk_size=1_000))
+
+
+def test_unsupported_codec():
+    with pytest.raises(ValueError):
+        compressed.open_decompressed(None, "games.pgn.xz")
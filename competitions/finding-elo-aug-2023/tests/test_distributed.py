@@ -0,0 +1,78 @@
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from src.data.shard_manifest import (
+    LEASE_DIR,
+    ShardLease,
+    pending_shards,
+    read_manifest,
+    write_json,
+)
+from src.data.sinks import make_sink
+from src.data.synthetic import write_synthetic_pgn
+from src.features.distributed import merge_shards, plan_shards
+from src.features.main import get_output_dtypes, pgn_to_dataframe
+from src.features.schema import apply_dtypes
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+@pytest.mark.parametrize("extension", [".parquet", ".csv"])
+def test_workers_match_a_single_process_run(tmp_path, extension):
+    pgn_file = write_synthetic_pgn(str(tmp_path / "games.pgn"), 150)
+    work_dir = str(tmp_path / "run")
+
+    manifest = plan_shards(
+        pgn_file,
+        work_dir,
+        shard_games=10,
+        include_opening_cols=False,
+        output_extension=extension,
+    )
+    assert len(manifest["shards"]) == 15
+    with pytest.raises(ValueError):
+        merge_shards(work_dir, str(tmp_path / f"early{extension}"))
+
+    # A worker that crashed holding the first shard.
+    crashed = ShardLease(work_dir, 0, "crashed-worker")
+    write_json(crashed.path, {"owner": crashed.owner, "expires": time.time() - 1})
+
+    workers = [
+        subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "src.features.distributed",
+                "work",
+                work_dir,
+                "--poll-seconds",
+                "0.1",
+            ],
+            cwd=ROOT,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+        for _ in range(3)
+    ]
+    processed = 0
+    for worker in workers:
+        stdout, _ = worker.communicate(timeout=300)
+        assert worker.returncode == 0, stdout
+        processed += int(stdout.split("Processed ")[-1].split()[0])
+
+    assert processed == 15
+    assert pending_shards(work_dir, read_manifest(work_dir)) == []
+    assert os.listdir(os.path.join(work_dir, LEASE_DIR)) == []
+
+    save_location = str(tmp_path / f"merged{extension}")
+    assert merge_shards(work_dir, save_location) == 150
+
+    dtypes = get_output_dtypes(False)
+    merged = apply_dtypes(make_sink(save_location).read(), dtypes)
+    expected = pgn_to_dataframe(pgn_file, False, save_to_file=False)
+    assert merged.equals(apply_dtypes(expected, dtypes))
@@ -0,0 +1,94 @@
+import sys
+import time
+
+import chess
+import pytest
+from src.benchmarks.fake_uci import material
+from src.features.engine_pool import MATE_SCORE, EnginePool
+from src.features.evaluation_cache import EvaluationCache
+
+FAKE_ENGINE = [sys.executable, "-m", "src.benchmarks.fake_uci"]
+
+MOVES = "e2e4 e7e5 g1f3 b8c6 f1b5 a7a6 b5c6 d7c6 e1g1 f7f6 d2d4 e5d4 f3d4 c6c5"
+
+
+def positions(moves: str = MOVES):
+    board = chess.Board()
+    boards = [board.copy()]
+    for uci in moves.split():
+        board.push_uci(uci)
+        boards.append(board.copy())
+    return boards
+
+
+def white_material(board: chess.Board) -> int:
+    score = material(board)
+    return score if board.turn == chess.WHITE else -score
+
+
+def idle_engines(pool: EnginePool):
+    _, engines = pool._running()
+    return list(engines._queue)
+
+
+@pytest.fixture
+def pool():
+    pool = EnginePool(FAKE_ENGINE, n_engines=2, depth=1)
+    yield pool
+    pool.close()
+
+
+def test_scores(pool):
+    boards = positions()
+    mated = chess.Board("rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3")
+
+    scores = pool.evaluate(boards + [mated])
+
+    assert scores == [white_material(board) for board in boards] + [-MATE_SCORE]
+    assert len(idle_engines(pool)) == 2
+
+
+def test_cache_hits(pool, tmp_path):
+    boards = positions()
+    # The start position appears twice, and is only evaluated once.
+    scores = pool.evaluate(boards + boards[:1])
+    assert pool.stats() == {"hits": 0, "misses": len(boards)}
+
+    assert pool.evaluate(boards) == scores[:-1]
+    assert pool.stats() == {"hits": len(boards), "misses": len(boards)}
+
+    cache = EvaluationCache(str(tmp_path / "evaluations.sqlite"))
+    with EnginePool(FAKE_ENGINE, n_engines=1, depth=1, cache=cache) as first:
+        first.evaluate(boards)
+    with EnginePool(FAKE_ENGINE, n_engines=1, depth=1, cache=cache) as second:
+        assert second.evaluate(boards) == scores[:-1]
+        assert second.stats() == {"hits": len(boards), "misses": 0}
+    cache.close()
+
+
+def test_restarts_dead_engines(pool):
+    pool.evaluate(positions()[:1])
+    dead = idle_engines(pool)
+    for engine in dead:
+        engine.transport.kill()
+    while not all(engine.returncode.done() for engine in dead):
+        time.sleep(0.01)
+
+    boards = positions()[1:]
+    scores = pool.evaluate(boards)
+
+    # Each dead engine fails one position and is replaced.
+    assert scores.count(None) == 2
+    assert len(idle_engines(pool)) == 2
+    assert pool.evaluate(boards) == [white_material(board) for board in boards]
+
+
+def test_restarts_engines_that_time_out():
+    with EnginePool(
+        FAKE_ENGINE, n_engines=2, depth=1, options={"Sleep": 60_000}, timeout=0.1
+    ) as pool:
+        idle_engines(pool)
+        started = time.monotonic()
+        assert pool.evaluate(positions()[:4]) == [None] * 4
+        assert time.monotonic() - started < 10
+        assert len(idle_engines(pool)) == 2
@@ -0,0 +1,168 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from src.features.explorer_cache import ExplorerCache
+from src.features.explorer_client import (
+    ExplorerClient,
+    TokenBucket,
+    retry_after_seconds,
+)
+
+START = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+E4 = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
+D4 = "rnbqkbnr/pppppppp/8/8/3P4/8/PPP1PPPP/RNBQKBNR b KQkq - 0 1"
+
+
+class StubExplorer(BaseHTTPRequestHandler):
+    """
+    Answers like the explorer, after the failures scripted for each FEN.
+    """
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        fen = query["fen"][0]
+        server = self.server
+        with server.lock:
+            server.requests.append((urlparse(self.path).path, fen, query["until"][0]))
+            failures = server.failures.get(fen, [])
+            failure = failures.pop(0) if failures else None
+
+        if failure is not None:
+            status, headers = failure
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            return
+
+        body = json.dumps({"opening": {"name": f"Opening {fen[:8]}"}, "moves": []})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubExplorer)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.failures = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(server, **kwargs):
+    kwargs.setdefault("rate", 1_000)
+    kwargs.setdefault("backoff", 0.01)
+    return ExplorerClient(
+        base_url=f"http://127.0.0.1:{server.server_port}/{{database}}", **kwargs
+    )
+
+
+def test_resolve_many(server):
+    client = make_client(server)
+    results = client.resolve_many([START, E4, START, D4])
+
+    assert results == {
+        fen: (
+            f"Opening {fen[:8]}",
+            {"opening": {"name": f"Opening {fen[:8]}"}, "moves": []},
+        )
+        for fen in (START, E4, D4)
+    }
+    # Duplicates are fetched once, from the configured database and year.
+    assert sorted(server.requests) == sorted(
+        ("/master", fen, "2012") for fen in (START, E4, D4)
+    )
+    assert client.requests_sent == 3
+
+
+def test_retries_rate_limits_and_server_errors(server):
+    past = format_datetime(datetime.now(timezone.utc) - timedelta(hours=1), usegmt=True)
+    server.failures = {
+        START: [(429, {"Retry-After": "0"}), (503, {})],
+        E4: [(429, {"Retry-After": past}), (502, {}), (500, {})],
+    }
+    client = make_client(server)
+    results = client.resolve_many([START, E4, D4])
+
+    assert {fen: name for fen, (name, _) in results.items()} == {
+        fen: f"Opening {fen[:8]}" for fen in (START, E4, D4)
+    }
+    assert client.requests_sent == 3 + 2 + 3
+
+
+def test_gives_up_after_max_retries(server):
+    server.failures = {START: [(503, {})] * 3}
+    client = make_client(server, max_retries=2)
+
+    assert client.resolve_many([START]) == {START: (None, {})}
+    assert client.requests_sent == 3
+    assert client.failures == 1
+
+
+def test_failures_do_not_sink_the_batch(server, tmp_path):
+    server.failures = {E4: [(404, {})], D4: [(503, {})] * 3}
+    cache = ExplorerCache(str(tmp_path / "explorer.sqlite"))
+    client = make_client(server, max_retries=2, cache=cache)
+    results = client.resolve_many([START, E4, D4])
+
+    assert results[START][0] == f"Opening {START[:8]}"
+    assert results[E4] == results[D4] == (None, {})
+    assert client.failures == 2
+    # Only the answer is cached, so the failed positions are asked again.
+    assert make_client(server, cache=cache).resolve_many([START, E4, D4]) == {
+        fen: (
+            f"Opening {fen[:8]}",
+            {"opening": {"name": f"Opening {fen[:8]}"}, "moves": []},
+        )
+        for fen in (START, E4, D4)
+    }
+    cache.close()
+
+
+def test_cached_positions_are_not_requested(server, tmp_path):
+    cache = ExplorerCache(str(tmp_path / "explorer.sqlite"))
+    first = make_client(server, cache=cache).resolve_many([START, E4])
+
+    client = make_client(server, cache=cache)
+    results = client.resolve_many([START, E4, D4])
+
+    assert {fen: results[fen] for fen in first} == first
+    assert D4 in results
+    assert client.requests_sent == 1
+    assert len(server.requests) == 3 and server.requests[-1][1] == D4
+    cache.close()
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds(None, 2.0) == 2.0
+    assert retry_after_seconds("", 2.0) == 2.0
+    assert retry_after_seconds("7", 2.0) == 7.0
+    assert retry_after_seconds("not a date", 2.0) == 2.0
+
+    future = datetime.now(timezone.utc) + timedelta(seconds=120)
+    assert 100 < retry_after_seconds(format_datetime(future, usegmt=True), 2.0) <= 120
+    past = datetime.now(timezone.utc) - timedelta(seconds=120)
+    assert retry_after_seconds(format_datetime(past, usegmt=True), 2.0) == 0.0
+
+
+def test_token_bucket_refills_after_a_pause():
+    bucket = TokenBucket(rate=10, capacity=5)
+    bucket.pause(60)
+
+    assert bucket.tokens == 0
+    assert bucket.updated == bucket.paused_until > time.monotonic() + 59
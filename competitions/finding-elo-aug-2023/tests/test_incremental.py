@@ -0,0 +1,80 @@
+import pytest
+from src.data.synthetic import generate_games
+from src.features.main import PipelineOptions, get_output_dtypes, pgn_to_dataframe
+from src.features.schema import apply_dtypes
+
+
+def write_games(pgn_file, games, mode="w"):
+    with open(pgn_file, mode) as pgn:
+        for game in games:
+            print(game, file=pgn, end="\n\n")
+
+
+def run_incremental(pgn_file, save_location):
+    """
+    Runs an incremental conversion, returning its output and the Event tags
+    of the games it read.
+    """
+    events = []
+
+    def header_filter(headers):
+        events.append(headers["Event"])
+        return True
+
+    df = pgn_to_dataframe(
+        pgn_file,
+        include_opening_cols=False,
+        save_interval=10,
+        save_location=save_location,
+        options=PipelineOptions(header_filter=header_filter),
+        incremental=True,
+    )
+    return df, events
+
+
+def full_run(pgn_file):
+    df = pgn_to_dataframe(pgn_file, include_opening_cols=False, save_to_file=False)
+    return apply_dtypes(df, get_output_dtypes(False))
+
+
+@pytest.mark.parametrize("extension", [".csv", ".parquet"])
+def test_appended_games_match_a_full_run(tmp_path, extension):
+    games = list(generate_games(95, plies=(0, 80)))
+    pgn_file = str(tmp_path / "games.pgn")
+    save_location = str(tmp_path / f"out{extension}")
+
+    write_games(pgn_file, games[:60])
+    df, events = run_incremental(pgn_file, save_location)
+    assert df.equals(full_run(pgn_file))
+    assert len(events) == 60
+
+    write_games(pgn_file, games[60:], mode="a")
+    df, events = run_incremental(pgn_file, save_location)
+    assert events == [str(i) for i in range(61, 96)]
+    assert df.equals(full_run(pgn_file))
+
+    # Nothing new: nothing is read and the output stays the same.
+    df, events = run_incremental(pgn_file, save_location)
+    assert events == []
+    assert len(df) == 95
+
+
+@pytest.mark.parametrize("extension", [".csv", ".parquet"])
+@pytest.mark.parametrize("change", ["rewritten", "truncated"])
+def test_changed_pgn_is_rebuilt(tmp_path, extension, change):
+    games = list(generate_games(60, plies=(0, 80)))
+    pgn_file = str(tmp_path / "games.pgn")
+    save_location = str(tmp_path / f"out{extension}")
+
+    write_games(pgn_file, games)
+    run_incremental(pgn_file, save_location)
+
+    if change == "rewritten":
+        # Another dump, with more games, written over the old one.
+        write_games(pgn_file, generate_games(70, seed=1, plies=(0, 80)))
+    else:
+        write_games(pgn_file, games[:40])
+    df, events = run_incremental(pgn_file, save_location)
+
+    assert len(events) == (70 if change == "rewritten" else 40)
+    assert df.equals(full_run(pgn_file))